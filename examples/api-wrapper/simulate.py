@@ -22,3 +22,11 @@ for i in range(10):
     robot.move_relative(x=-50, y=-50, z=-50)
     # position will continue to update while simulating
     print(robot.position)
+
+# the simulated uArm estimates how long each command would take on a real uArm
+print('simulated seconds: {0}'.format(robot.sim_clock.now))
+print(robot.sim_clock.summary())
+
+# set a time scale to make commands take time, here ten times faster than a real uArm
+robot.sim_clock.time_scale = 0.1
+robot.move_to(x=150, y=0, z=50)
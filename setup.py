@@ -40,6 +40,10 @@ setup(
     url="https://github.com/andysigler/uArm-Python-Wrapper",
     keywords="uarm4py uarmForPython uarm ufactory uarmForPython swift swiftpro swiftForPython swift4py",
     install_requires=requirements,
+    extras_require={
+        # vectorized kinematics, and the reachability grid behind can_move_to()
+        'numpy': ['numpy>=1.13'],
+    },
     long_description=long_description,
     license='BSD',
     zip_safe=False
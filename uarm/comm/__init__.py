@@ -7,6 +7,7 @@
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
 import time
+import socket
 import threading
 from queue import Queue
 import serial
@@ -18,6 +19,17 @@ from .threaded import ReaderThread
 connect_ports = []
 
 
+def is_url(port):
+    """
+    Whether the port is a pyserial URL, like socket://host:port or rfc2217://host:port
+    """
+    return isinstance(port, str) and '://' in port
+
+
+def is_network_url(port):
+    return is_url(port) and port.split('://', 1)[0] in ('socket', 'rfc2217')
+
+
 class UArmReader(LineReader):
     TERMINATOR = b'\n'
 
@@ -34,11 +46,12 @@ class UArmReader(LineReader):
             packet, self.buffer = self.buffer.split(self.TERMINATOR, 1)
             self.handle_packet(packet)
 
-    def handle_line(self, line):
+    def handle_line(self, line, timestamp=None):
         logger.verbose('recv: {}'.format(line))
         if self.rx_que.full():
             self.rx_que.get()
-        self.rx_que.put(line.strip())
+        # (line, time.monotonic_ns() when the line was read)
+        self.rx_que.put((line.strip(), timestamp if timestamp is not None else time.monotonic_ns()))
         if self.rx_con_c is not None:
             with self.rx_con_c:
                 self.rx_con_c.notifyAll()
@@ -79,6 +92,10 @@ class Serial(object):
     def baudrate(self):
         return self._baudrate
 
+    @property
+    def is_network(self):
+        return is_network_url(self._port)
+
     def connect(self, port=None, baudrate=None, timeout=None):
         if self.connected:
             logger.warn('serial is open, no need reconnect')
@@ -91,7 +108,14 @@ class Serial(object):
             self._port = select_port(self._filters, connect_ports)
             if self._port is None:
                 raise Exception('can not found port, please connect the port via usb')
-        self.com = serial.Serial(port=self._port, baudrate=self._baudrate, timeout=self._timeout)
+        if is_url(self._port):
+            self.com = serial.serial_for_url(self._port, baudrate=self._baudrate, timeout=self._timeout)
+            sock = getattr(self.com, '_socket', None)
+            if sock is not None:
+                # lines are short and every command waits for its ack, do not let Nagle hold them back
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.com = serial.Serial(port=self._port, baudrate=self._baudrate, timeout=self._timeout)
         if not self.com.isOpen():
             raise Exception('serial open failed')
         connect_ports.append(self._port)
@@ -149,7 +173,7 @@ class Serial(object):
     def read(self):
         if not self.rx_que.empty():
             try:
-                return self.rx_que.get_nowait()
+                return self.rx_que.get_nowait()[0]
             except:
                 pass
 
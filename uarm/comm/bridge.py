@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2018, UFACTORY, Inc.
+# All rights reserved.
+#
+# Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
+
+import argparse
+import socket
+import threading
+import serial
+from ..utils.log import logger
+
+BRIDGE_TCP_PORT = 8700
+
+
+class SerialBridge(object):
+    def __init__(self, port, baudrate=115200, host='127.0.0.1', tcp_port=BRIDGE_TCP_PORT):
+        """
+        Expose a local serial port over TCP, connect to it with Swift(port='socket://host:tcp_port')
+        The serial port stays open between clients, so the arm is not reset when a client reconnects.
+        One client is served at a time, a new client replaces the previous one.
+        :param port: local serial port of the arm
+        :param baudrate: baudrate of the serial port
+        :param host: address to listen on, use '0.0.0.0' to accept clients from other hosts
+        :param tcp_port: TCP port to listen on
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.host = host
+        self.tcp_port = tcp_port
+        self.com = None
+        self._server = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._alive = False
+        self._serial_thread = None
+
+    @property
+    def alive(self):
+        return self._alive
+
+    @property
+    def address(self):
+        """
+        (host, port) the bridge listens on, the port is known after start() when tcp_port is 0
+        """
+        if self._server is None:
+            return self.host, self.tcp_port
+        return self._server.getsockname()[:2]
+
+    def start(self):
+        """
+        Open the serial port and start listening
+        :return: self
+        """
+        if self._alive:
+            return self
+        self.com = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=1)
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.tcp_port))
+        self._server.listen(1)
+        # wake up regularly, so stop() from another thread ends serve_forever()
+        self._server.settimeout(0.5)
+        self._alive = True
+        self._serial_thread = threading.Thread(target=self._loop_serial, name='uarm-bridge-serial', daemon=True)
+        self._serial_thread.start()
+        logger.info('bridge {} on {}:{}'.format(self.port, *self.address))
+        return self
+
+    def _loop_serial(self):
+        # serial -> client, bytes read while no client is connected are dropped
+        while self._alive:
+            try:
+                data = self.com.read(self.com.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                logger.error('bridge serial error: {}'.format(e))
+                self._alive = False
+                break
+            if not data:
+                continue
+            with self._client_lock:
+                client = self._client
+            if client is None:
+                continue
+            try:
+                client.sendall(data)
+            except OSError:
+                self._drop_client(client)
+
+    def _drop_client(self, client):
+        with self._client_lock:
+            if self._client is client:
+                self._client = None
+        try:
+            client.close()
+        except OSError:
+            pass
+
+    def _serve_client(self, client):
+        # client -> serial
+        while self._alive:
+            try:
+                data = client.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            try:
+                self.com.write(data)
+            except (serial.SerialException, OSError) as e:
+                logger.error('bridge serial error: {}'.format(e))
+                self._alive = False
+                break
+        self._drop_client(client)
+
+    def serve_forever(self):
+        """
+        Start, then accept clients until stop() is called or the process is interrupted
+        """
+        self.start()
+        try:
+            while self._alive:
+                try:
+                    client, address = self._server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                client.settimeout(None)
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                logger.info('bridge client {}:{}'.format(*address[:2]))
+                with self._client_lock:
+                    previous, self._client = self._client, client
+                if previous is not None:
+                    try:
+                        previous.close()
+                    except OSError:
+                        pass
+                threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._alive = False
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.close()
+            except OSError:
+                pass
+        if self._serial_thread is not None and self._serial_thread is not threading.current_thread():
+            self._serial_thread.join(2)
+        if self.com is not None and self.com.is_open:
+            self.com.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Expose a uArm serial port over TCP')
+    parser.add_argument('port', type=str, help='serial port of the arm, like /dev/ttyACM0')
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="use 0.0.0.0 to accept other hosts")
+    parser.add_argument('--tcp-port', type=int, default=BRIDGE_TCP_PORT)
+    args = parser.parse_args()
+    SerialBridge(args.port, baudrate=args.baudrate, host=args.host, tcp_port=args.tcp_port).serve_forever()
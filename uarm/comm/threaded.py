@@ -8,6 +8,7 @@
 
 import serial
 import threading
+import time
 from ..utils.log import logger
 
 
@@ -67,6 +68,8 @@ class ReaderThread(threading.Thread):
                 # read all that is there or wait for one byte (blocking)
                 # data = self.serial.read(self.serial.in_waiting or 1)
                 data = self.serial.readline()
+                # stamp the line as soon as it is read, before any queueing
+                timestamp = time.monotonic_ns()
             except serial.SerialException as e:
                 # probably some I/O problem such as disconnected USB serial
                 # adapters -> exit
@@ -81,7 +84,7 @@ class ReaderThread(threading.Thread):
                     try:
                         # self.protocol.data_received(data)
                         line = ''.join(map(chr, data)).rstrip()
-                        self.protocol.handle_line(line)
+                        self.protocol.handle_line(line, timestamp)
                     except Exception as e:
                         error = e
                         break
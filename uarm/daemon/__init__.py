@@ -0,0 +1,4 @@
+from .client import ArmClient
+from .client import attach
+from .server import ArmDaemon
+from .server import socket_path
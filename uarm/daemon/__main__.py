@@ -0,0 +1,41 @@
+import argparse
+import logging
+import os
+import signal
+
+from .server import ArmDaemon
+from .server import UARM_DAEMON_DEFAULT_NAME
+from .server import socket_path
+
+
+parser = argparse.ArgumentParser(
+  description='Hold the serial connection to each uArm, and serve them over Unix domain sockets')
+parser.add_argument(
+  'arms', nargs='+', type=str,
+  help='serial port of each arm, optionally named like name=/dev/ttyACM0')
+parser.add_argument('--directory', type=str, default=None)
+parser.add_argument('--factory', type=str, default='wrapper', choices=['wrapper', 'api'])
+parser.add_argument('--authkey', type=str, default=None)
+parser.add_argument('--verbose', action='store_true')
+args = parser.parse_args()
+
+if args.verbose:
+  logging.basicConfig(level=logging.DEBUG)
+
+arms = {}
+for arm in args.arms:
+  name, _, port = arm.rpartition('=')
+  if not name:
+    name = UARM_DAEMON_DEFAULT_NAME if len(args.arms) == 1 else os.path.basename(port)
+  arms[name] = {'port': port, 'connect': True}
+
+daemon = ArmDaemon(
+  arms,
+  factory=args.factory,
+  directory=args.directory,
+  authkey=args.authkey.encode() if args.authkey else None)
+signal.signal(signal.SIGTERM, lambda *_: daemon.close())
+daemon.start()
+for name in arms:
+  print('Serving {0} on {1}'.format(name, socket_path(name, daemon.directory)))
+daemon.serve_forever()
@@ -0,0 +1,67 @@
+import logging
+from multiprocessing.connection import Client
+
+from uarm.fleet.proxy import ArmProxy
+from uarm.fleet.worker import FLEET_MSG_STOP
+from .server import UARM_DAEMON_DEFAULT_NAME
+from .server import socket_path
+
+
+logger = logging.getLogger('uarm.daemon.client')
+
+UARM_DAEMON_ATTACH_TIMEOUT = 5
+UARM_DAEMON_DETACH_TIMEOUT = 2
+
+
+class ArmClient(ArmProxy):
+
+  def __init__(self,
+               name=UARM_DAEMON_DEFAULT_NAME,
+               directory=None,
+               authkey=None,
+               timeout=UARM_DAEMON_ATTACH_TIMEOUT):
+    '''
+    Attach to an arm held by a running ArmDaemon, without resetting it
+    The client offers the methods and properties of the arm in the daemon,
+    plus call_async() for pipelined calls and subscribe() for reports
+    :param name: name of the arm in the daemon
+    :param directory: socket directory of the daemon
+    :param authkey: bytes, the key the daemon was started with
+    :param timeout: maximum seconds to wait for the daemon to describe the arm
+    '''
+    self._path = socket_path(name, directory)
+    try:
+      conn = Client(self._path, family='AF_UNIX', authkey=authkey)
+    except (IOError, OSError) as e:
+      raise RuntimeError(
+        'Unable to attach to uArm daemon at {0}: {1}'.format(self._path, e))
+    super().__init__(conn)
+    self.wait_ready(timeout)
+
+  @property
+  def path(self):
+    return self._path
+
+  def detach(self, timeout=UARM_DAEMON_DETACH_TIMEOUT):
+    '''
+    Close the connection to the daemon, the arm stays connected
+    '''
+    try:
+      self._request(FLEET_MSG_STOP).result(timeout)
+    except Exception:
+      pass
+    self.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.detach()
+
+
+def attach(name=UARM_DAEMON_DEFAULT_NAME, directory=None, authkey=None):
+  '''
+  Helper method for attaching to an arm held by a running ArmDaemon
+  :return: instance of ArmClient
+  '''
+  return ArmClient(name=name, directory=directory, authkey=authkey)
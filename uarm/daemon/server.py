@@ -0,0 +1,180 @@
+import logging
+import os
+import socket
+import tempfile
+import threading
+from multiprocessing.connection import Listener
+
+from uarm.fleet.worker import FLEET_MSG_READY
+from uarm.fleet.worker import MessageSender
+from uarm.fleet.worker import create_arm
+from uarm.fleet.worker import describe_arm
+from uarm.fleet.worker import serve
+
+
+logger = logging.getLogger('uarm.daemon.server')
+
+
+UARM_DAEMON_DIRECTORY = os.path.join(tempfile.gettempdir(), 'uarm')
+UARM_DAEMON_SOCKET_NAME = '{0}.sock'
+UARM_DAEMON_DEFAULT_NAME = 'uarm'
+
+
+def socket_path(name=UARM_DAEMON_DEFAULT_NAME, directory=None):
+  '''
+  Path of the Unix domain socket an arm is served on
+  :param name: name of the arm in the daemon
+  :param directory: socket directory, default is UARM_DAEMON_DIRECTORY
+  '''
+  return os.path.join(
+    directory or UARM_DAEMON_DIRECTORY, UARM_DAEMON_SOCKET_NAME.format(name))
+
+
+def _remove_stale_socket(path):
+  if not os.path.exists(path):
+    return
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    s.connect(path)
+  except (IOError, OSError):
+    # nobody is listening, left behind by a daemon that did not exit cleanly
+    os.remove(path)
+    return
+  finally:
+    s.close()
+  raise RuntimeError('A uArm daemon is already serving {0}'.format(path))
+
+
+class _ServedArm(object):
+
+  def __init__(self, name, arm, path, authkey):
+    self.name = name
+    self.arm = arm
+    self.path = path
+    self.description = describe_arm(arm)
+    # calls from different clients are run one at a time
+    self.lock = threading.RLock()
+    self.clients = set()
+    self.listener = Listener(path, family='AF_UNIX', authkey=authkey)
+    os.chmod(path, 0o600)
+    self.thread = threading.Thread(
+      target=self._accept_loop, name='uarm-daemon-{0}'.format(name), daemon=True)
+
+  def _accept_loop(self):
+    while True:
+      try:
+        conn = self.listener.accept()
+      except (IOError, OSError, EOFError):
+        break
+      except Exception as e:
+        # failed authentication, keep serving the other clients
+        logger.warning('Client of {0} rejected: {1}'.format(self.name, e))
+        continue
+      threading.Thread(
+        target=self._client, args=(conn,), daemon=True).start()
+
+  def _client(self, conn):
+    # each client has its own sending thread, a slow client only delays itself
+    sender = MessageSender(conn, name='uarm-daemon-{0}-sender'.format(self.name))
+    self.clients.add(conn)
+    logger.debug('Client attached to {0}'.format(self.name))
+    try:
+      sender.send((FLEET_MSG_READY,) + self.description)
+      serve(conn, self.arm, sender, lock=self.lock)
+    except (IOError, OSError, EOFError):
+      pass
+    finally:
+      sender.close()
+      self.clients.discard(conn)
+      conn.close()
+      logger.debug('Client detached from {0}'.format(self.name))
+
+  def close(self):
+    self.listener.close()
+    for conn in list(self.clients):
+      conn.close()
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+
+class ArmDaemon(object):
+
+  def __init__(self, arms, factory='wrapper', directory=None, authkey=None):
+    '''
+    Holds the connection to each arm, and serves them to clients over Unix domain sockets
+    Opening the serial port resets the arm, so scripts attach to the daemon
+    with ArmClient instead, and the arm stays connected between them
+    :param arms: dict of arm name to the kwargs of the factory, like {'uarm': {'port': '/dev/ttyACM0', 'connect': True}}
+    :param factory: 'wrapper' (uarm_create), 'api' (SwiftAPI), or a callable returning an arm
+    :param directory: socket directory, default is UARM_DAEMON_DIRECTORY
+    :param authkey: bytes, if set clients must use the same key
+    '''
+    self._configs = dict(arms)
+    self._factory = factory
+    self._directory = directory or UARM_DAEMON_DIRECTORY
+    self._authkey = authkey
+    self._served = {}
+    self._stopped = threading.Event()
+
+  @property
+  def directory(self):
+    return self._directory
+
+  @property
+  def arms(self):
+    return {name: served.arm for name, served in self._served.items()}
+
+  def clients(self, name):
+    '''
+    :return: number of clients attached to an arm
+    '''
+    return len(self._served[name].clients)
+
+  def start(self):
+    '''
+    Create and connect every arm, then start serving them
+    :return: self
+    '''
+    if not os.path.isdir(self._directory):
+      os.makedirs(self._directory, mode=0o700)
+    try:
+      for name, kwargs in self._configs.items():
+        path = socket_path(name, self._directory)
+        _remove_stale_socket(path)
+        arm = create_arm(self._factory, kwargs)
+        served = _ServedArm(name, arm, path, self._authkey)
+        self._served[name] = served
+        served.thread.start()
+        logger.debug('Serving {0} on {1}'.format(name, path))
+    except Exception:
+      self.close()
+      raise
+    return self
+
+  def serve_forever(self):
+    '''
+    Start, then block until close() is called or the process is interrupted
+    '''
+    if not self._served:
+      self.start()
+    try:
+      while not self._stopped.wait(0.5):
+        pass
+    except KeyboardInterrupt:
+      pass
+    finally:
+      self.close()
+
+  def close(self):
+    '''
+    Stop serving, and disconnect every arm
+    '''
+    self._stopped.set()
+    for served in self._served.values():
+      served.close()
+      try:
+        if served.arm.connected:
+          served.arm.disconnect()
+      except Exception:
+        pass
+    self._served = {}
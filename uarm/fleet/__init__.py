@@ -0,0 +1,28 @@
+from uarm.swift.multi import FleetController
+from .proxy import ArmProcess
+from .proxy import ArmProxy
+
+
+class ProcessFleet(FleetController):
+
+  def __init__(self, configs, factory='wrapper'):
+    '''
+    Start one worker process per arm, and control them like local arms
+    Every arm has its own interpreter, so arms do not compete for the GIL
+    :param configs: list of kwargs dicts, one for each arm, like [{'port': '/dev/ttyACM0', 'connect': True}]
+    :param factory: 'wrapper', 'api', or a picklable callable returning an arm
+    '''
+    arms = [ArmProcess(factory=factory, wait=False, **kwargs) for kwargs in configs]
+    try:
+      for arm in arms:
+        arm.wait_ready()
+    except Exception:
+      for arm in arms:
+        arm.stop()
+      raise
+    super().__init__(arms)
+
+  def close(self):
+    super().close()
+    for arm in self.swifts:
+      arm.stop()
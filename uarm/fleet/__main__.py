@@ -0,0 +1,19 @@
+import argparse
+import json
+
+from .benchmark import run_benchmark
+from .benchmark import UARM_FLEET_BENCHMARK_COMMANDS
+from .benchmark import UARM_FLEET_BENCHMARK_MODES
+
+
+parser = argparse.ArgumentParser(
+  description='Benchmark threaded versus process-per-arm fleets')
+parser.add_argument('ports', nargs='+', type=str)
+parser.add_argument('--commands', type=int, default=UARM_FLEET_BENCHMARK_COMMANDS)
+parser.add_argument(
+  '--modes', nargs='+', type=str, default=list(UARM_FLEET_BENCHMARK_MODES))
+args = parser.parse_args()
+
+configs = [{'port': port} for port in args.ports]
+results = run_benchmark(configs, modes=args.modes, commands=args.commands)
+print(json.dumps(results, indent=4))
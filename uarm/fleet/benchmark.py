@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+
+from uarm.swift.multi import FleetController
+from . import ProcessFleet
+from .worker import create_arm
+
+
+logger = logging.getLogger('uarm.fleet.benchmark')
+
+UARM_FLEET_BENCHMARK_COMMANDS = 200
+UARM_FLEET_BENCHMARK_REPORT_INTERVAL = 0.01
+UARM_FLEET_BENCHMARK_REPORT_DURATION = 2.0
+UARM_FLEET_BENCHMARK_MODES = ('threaded', 'process')
+
+
+def _percentile(values, percent):
+  if not values:
+    return None
+  values = sorted(values)
+  return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def _query_loop(arm, commands):
+  for _ in range(commands):
+    arm.get_power_status(wait=True)
+  return commands
+
+
+class _ReportStats(object):
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.arrivals = {}
+    self.latency = []
+
+  def callback(self, index, scale=1.0):
+    def _callback(value, timestamp):
+      now = time.monotonic()
+      with self.lock:
+        self.arrivals.setdefault(index, []).append(now)
+        # from reading the report on the serial port, to this callback
+        self.latency.append(now - timestamp * scale)
+    return _callback
+
+  def summary(self, interval, duration):
+    jitter = []
+    count = 0
+    for arrivals in self.arrivals.values():
+      count += len(arrivals)
+      jitter += [abs((b - a) - interval) for a, b in zip(arrivals, arrivals[1:])]
+    return {
+      'reports_per_second': round(count / duration, 1),
+      'interval_jitter_p50_ms': _ms(_percentile(jitter, 50)),
+      'interval_jitter_p99_ms': _ms(_percentile(jitter, 99)),
+      'report_latency_p50_ms': _ms(_percentile(self.latency, 50)),
+      'report_latency_p99_ms': _ms(_percentile(self.latency, 99))
+    }
+
+
+def _ms(seconds):
+  return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _create_fleet(mode, configs, factory):
+  if mode == 'process':
+    return ProcessFleet(configs, factory=factory)
+  return FleetController([create_arm(factory, kwargs) for kwargs in configs])
+
+
+def _close_fleet(mode, fleet):
+  if mode != 'process':
+    fleet.call('disconnect')
+  fleet.close()
+
+
+def benchmark_fleet(mode,
+                    configs,
+                    factory='api',
+                    commands=UARM_FLEET_BENCHMARK_COMMANDS,
+                    report_interval=UARM_FLEET_BENCHMARK_REPORT_INTERVAL,
+                    report_duration=UARM_FLEET_BENCHMARK_REPORT_DURATION):
+  '''
+  Measure command throughput and report delivery of a fleet
+  :param mode: 'threaded' (all arms in this process) or 'process' (one worker process per arm)
+  :param configs: list of kwargs dicts, one for each arm
+  :param factory: 'wrapper', 'api', or a picklable callable returning an arm
+  :param commands: number of round trips (P0000 power status queries) for each arm
+  :param report_interval: seconds between position reports, while measuring reports
+  :param report_duration: seconds to collect position reports
+  :return: dictionary of results
+  '''
+  fleet = _create_fleet(mode, configs, factory)
+  try:
+    fleet.call('waiting_ready').raise_errors()
+    # COMMANDS
+    start = time.monotonic()
+    futures, result = fleet.submit(_query_loop, [(commands,)] * len(fleet))
+    fleet.gather(futures, result).raise_errors()
+    elapsed = time.monotonic() - start
+    # REPORTS, while all arms keep sending commands
+    stats = _ReportStats()
+    for i, arm in enumerate(fleet.swifts):
+      if mode == 'process':
+        arm.subscribe('position', stats.callback(i))
+      else:
+        arm.register_report_position_callback(
+          callback=stats.callback(i, scale=1e-9), with_timestamp=True)
+    fleet.call('set_report_position', interval=report_interval).raise_errors()
+    load_commands = max(int(report_duration / 0.01), 1)
+    report_start = time.monotonic()
+    futures, result = fleet.submit(_query_loop, [(load_commands,)] * len(fleet))
+    time.sleep(report_duration)
+    fleet.gather(futures, result)
+    report_elapsed = time.monotonic() - report_start
+    fleet.call('set_report_position', interval=0)
+  finally:
+    _close_fleet(mode, fleet)
+  report = {
+    'mode': mode,
+    'arms': len(configs),
+    'commands_per_second': round(commands * len(configs) / elapsed, 1),
+    'round_trip_ms': _ms(elapsed / commands)
+  }
+  report.update(stats.summary(report_interval, report_elapsed))
+  return report
+
+
+def run_benchmark(configs, factory='api', modes=UARM_FLEET_BENCHMARK_MODES, **kwargs):
+  '''
+  Benchmark each mode with 1, 2, 4 ... up to len(configs) arms
+  :return: list of result dictionaries
+  '''
+  counts = []
+  count = 1
+  while count < len(configs):
+    counts.append(count)
+    count *= 2
+  counts.append(len(configs))
+  results = []
+  for mode in modes:
+    for count in counts:
+      logger.info('benchmark: mode={0}, arms={1}'.format(mode, count))
+      results.append(benchmark_fleet(mode, configs[:count], factory=factory, **kwargs))
+  return results
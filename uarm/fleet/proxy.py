@@ -0,0 +1,203 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future
+
+from .worker import FLEET_MSG_CALL
+from .worker import FLEET_MSG_GET
+from .worker import FLEET_MSG_READY
+from .worker import FLEET_MSG_RESULT
+from .worker import FLEET_MSG_STOP
+from .worker import FLEET_MSG_SUBSCRIBE
+from .worker import FLEET_MSG_TELEMETRY
+from .worker import FLEET_RETURN_SELF
+from .worker import worker_main
+
+
+logger = logging.getLogger('uarm.fleet.proxy')
+
+UARM_FLEET_START_TIMEOUT = 20
+UARM_FLEET_STOP_TIMEOUT = 5
+
+
+class ArmProxy(object):
+
+  def __init__(self, conn):
+    '''
+    Proxies the methods of an arm served over a multiprocessing Connection
+    Calling a method of the proxy blocks until the arm returns its result,
+    methods that return the arm itself return the proxy, so chaining works
+    Callbacks cannot cross processes, use subscribe() for reports instead
+    :param conn: a multiprocessing Connection, the other end runs worker.serve()
+    '''
+    self._conn = conn
+    self._ids = itertools.count(1)
+    self._pending = {}
+    self._pending_lock = threading.Lock()
+    self._send_lock = threading.Lock()
+    self._subscribers = {}
+    self._telemetry = {}
+    self._callables = set()
+    self._attributes = set()
+    self._ready = Future()
+    self._pending[0] = self._ready  # failures of the factory use id 0
+    self._reader = threading.Thread(target=self._read_loop, daemon=True)
+    self._reader.start()
+
+  def wait_ready(self, timeout=UARM_FLEET_START_TIMEOUT):
+    '''
+    Wait until the arm is described by the other end, raises the error of the factory if it failed
+    :return: self
+    '''
+    self._ready.result(timeout)
+    return self
+
+  def _read_loop(self):
+    while True:
+      try:
+        msg = self._conn.recv()
+      except (EOFError, IOError, OSError):
+        break
+      if msg[0] == FLEET_MSG_TELEMETRY:
+        _, name, timestamp, value = msg
+        self._telemetry[name] = (timestamp, value)
+        for callback in list(self._subscribers.get(name, [])):
+          try:
+            callback(value, timestamp)
+          except Exception as e:
+            logger.error('telemetry callback raised: {0}'.format(e))
+      elif msg[0] == FLEET_MSG_READY:
+        self._callables = set(msg[1])
+        self._attributes = set(msg[2])
+        with self._pending_lock:
+          future = self._pending.pop(0, None)
+        if future:
+          future.set_result(self)
+      elif msg[0] == FLEET_MSG_RESULT:
+        _, msg_id, ok, value = msg
+        with self._pending_lock:
+          future = self._pending.pop(msg_id, None)
+        if future is None:
+          continue
+        if not ok:
+          future.set_exception(value)
+        elif value == FLEET_RETURN_SELF:
+          future.set_result(self)
+        else:
+          future.set_result(value)
+    # the worker is gone, fail everything still waiting
+    with self._pending_lock:
+      pending, self._pending = self._pending, {}
+    for future in pending.values():
+      if not future.done():
+        future.set_exception(RuntimeError('uArm proxy connection closed'))
+
+  def _request(self, *msg):
+    future = Future()
+    msg_id = next(self._ids)
+    with self._pending_lock:
+      self._pending[msg_id] = future
+    with self._send_lock:
+      self._conn.send((msg[0], msg_id) + msg[1:])
+    return future
+
+  def call_async(self, name, *args, **kwargs):
+    '''
+    Call a method of the arm without waiting
+    Calls are run in the order they are sent, so several can be in flight at once
+    :return: concurrent.futures.Future of the result
+    '''
+    for value in kwargs.values():
+      if callable(value):
+        raise ValueError('Callbacks cannot be sent to another process, use subscribe()')
+    return self._request(FLEET_MSG_CALL, name, args, kwargs)
+
+  def call(self, name, *args, **kwargs):
+    return self.call_async(name, *args, **kwargs).result()
+
+  def get(self, name):
+    '''
+    Read an attribute or property of the arm
+    '''
+    return self._request(FLEET_MSG_GET, name).result()
+
+  def __getattr__(self, name):
+    if name.startswith('_'):
+      raise AttributeError(name)
+    if name in self._attributes:
+      return self.get(name)
+    if name in self._callables:
+      def _method(*args, **kwargs):
+        return self.call(name, *args, **kwargs)
+      _method.__name__ = name
+      return _method
+    raise AttributeError(
+      '{0} has no attribute {1}'.format(type(self).__name__, name))
+
+  def subscribe(self, name, callback):
+    '''
+    Forward a report from the worker to a callback in this process
+    :param name: 'position', 'power', 'key0', 'key1', or 'limit_switch'
+    :param callback: called with (value, timestamp), timestamp is the time.monotonic() when the report was read
+    '''
+    self._subscribers.setdefault(name, []).append(callback)
+    self._request(FLEET_MSG_SUBSCRIBE, name).result()
+    return self
+
+  def unsubscribe(self, name, callback):
+    if callback in self._subscribers.get(name, []):
+      self._subscribers[name].remove(callback)
+    return self
+
+  def telemetry(self, name):
+    '''
+    :return: (timestamp, value) of the latest forwarded report, or None
+    '''
+    return self._telemetry.get(name)
+
+  def close(self):
+    self._conn.close()
+
+
+class ArmProcess(ArmProxy):
+
+  def __init__(self, factory='wrapper', wait=True, start_timeout=UARM_FLEET_START_TIMEOUT, **kwargs):
+    '''
+    Hosts one arm in its own worker process, and proxies its methods
+    :param factory: 'wrapper' (uarm_create), 'api' (SwiftAPI), or a picklable callable returning an arm
+    :param wait: if True, wait until the arm is created in the worker, else call wait_ready() later
+    :param start_timeout: maximum seconds to wait for the arm to be created
+    :param kwargs: arguments of the factory, like port='/dev/ttyACM0', connect=True
+    '''
+    ctx = multiprocessing.get_context('spawn')
+    conn, child_conn = ctx.Pipe(duplex=True)
+    self._process = ctx.Process(
+      target=worker_main, args=(child_conn, factory, kwargs), daemon=True)
+    self._process.start()
+    child_conn.close()
+    super().__init__(conn)
+    if wait:
+      self.wait_ready(start_timeout)
+
+  @property
+  def pid(self):
+    return self._process.pid
+
+  @property
+  def alive(self):
+    return self._process.is_alive()
+
+  def stop(self, timeout=UARM_FLEET_STOP_TIMEOUT):
+    '''
+    Disconnect the arm and stop the worker process
+    '''
+    if self._process.is_alive():
+      try:
+        self._request(FLEET_MSG_STOP).result(timeout)
+      except Exception:
+        pass
+      self._process.join(timeout)
+      if self._process.is_alive():
+        self._process.terminate()
+    self._conn.close()
@@ -0,0 +1,257 @@
+import logging
+import threading
+import traceback
+from collections import deque
+from multiprocessing.reduction import ForkingPickler
+
+
+logger = logging.getLogger('uarm.fleet.worker')
+
+
+# MESSAGES (tuples sent over the pipe, the first item is the type)
+FLEET_MSG_CALL = 'call'            # (type, id, name, args, kwargs)
+FLEET_MSG_GET = 'get'              # (type, id, name)
+FLEET_MSG_SUBSCRIBE = 'subscribe'  # (type, id, telemetry name)
+FLEET_MSG_STOP = 'stop'            # (type, id)
+FLEET_MSG_READY = 'ready'          # (type, callable names, attribute names)
+FLEET_MSG_RESULT = 'result'        # (type, id, ok, value)
+FLEET_MSG_TELEMETRY = 'telemetry'  # (type, telemetry name, time.monotonic(), value)
+
+# telemetry messages waiting to be sent to one connection, the oldest are dropped beyond this
+FLEET_TELEMETRY_QUEUE_SIZE = 256
+# seconds to wait for the queued messages of a connection when it is done
+FLEET_SENDER_CLOSE_TIMEOUT = 2
+
+# the method returned the arm itself (chaining), the proxy returns itself
+FLEET_RETURN_SELF = '__uarm_fleet_self__'
+
+# telemetry name -> register method of SwiftAPI
+FLEET_TELEMETRY = {
+  'power': 'register_power_callback',
+  'position': 'register_report_position_callback',
+  'key0': 'register_key0_callback',
+  'key1': 'register_key1_callback',
+  'limit_switch': 'register_limit_switch_callback'
+}
+FLEET_RELEASE = {
+  'power': 'release_power_callback',
+  'position': 'release_report_position_callback',
+  'key0': 'release_key0_callback',
+  'key1': 'release_key1_callback',
+  'limit_switch': 'release_limit_switch_callback'
+}
+
+
+def create_arm(factory, kwargs):
+  if callable(factory):
+    return factory(**kwargs)
+  if factory == 'wrapper':
+    from uarm.wrapper import uarm_create
+    return uarm_create(**kwargs)
+  if factory == 'api':
+    from uarm.wrapper import SwiftAPI
+    return SwiftAPI(**kwargs)
+  raise ValueError('Unknown fleet arm factory: {0}'.format(factory))
+
+
+def describe_arm(arm):
+  callables = []
+  attributes = []
+  for name in dir(type(arm)):
+    if name.startswith('_'):
+      continue
+    if isinstance(getattr(type(arm), name), property):
+      attributes.append(name)
+    elif callable(getattr(type(arm), name)):
+      callables.append(name)
+  return callables, attributes
+
+
+def _error(e):
+  # exceptions must survive pickling, keep their type when possible
+  try:
+    import pickle
+    pickle.dumps(e)
+    return e
+  except Exception:
+    return RuntimeError('{0}: {1}\n{2}'.format(
+      type(e).__name__, e, traceback.format_exc()))
+
+
+class MessageSender(object):
+
+  def __init__(self, conn, telemetry_size=FLEET_TELEMETRY_QUEUE_SIZE, name='uarm-fleet-sender'):
+    '''
+    Sends the messages of one connection from its own thread, so a client
+    that reads slowly never blocks the caller, like the serial thread
+    running a report callback. Results are always sent, telemetry waits in
+    a bounded queue and the oldest is dropped when it is full
+    :param conn: a multiprocessing Connection, only written by this sender
+    :param telemetry_size: maximum number of telemetry messages waiting
+    :param name: name of the sending thread
+    '''
+    self._conn = conn
+    self._results = deque()
+    self._telemetry = deque(maxlen=telemetry_size)
+    self._cond = threading.Condition()
+    self._closing = False
+    self._error = None
+    self.dropped = 0
+    self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+    self._thread.start()
+
+  def send(self, msg):
+    '''
+    Queue a message that must not be dropped
+    Raises the IOError/OSError of the connection once sending failed
+    '''
+    self._put(self._results, msg)
+
+  def send_telemetry(self, msg):
+    '''
+    Queue a telemetry message, dropping the oldest one if too many are waiting
+    '''
+    self._put(self._telemetry, msg)
+
+  def _put(self, queue, msg):
+    # pickled here, so unpicklable values raise in the caller
+    data = ForkingPickler.dumps(msg)
+    with self._cond:
+      if self._error is not None:
+        raise self._error
+      if len(queue) == queue.maxlen:
+        self.dropped += 1
+      queue.append(data)
+      self._cond.notify()
+
+  def _run(self):
+    while True:
+      with self._cond:
+        while not (self._results or self._telemetry or self._closing):
+          self._cond.wait()
+        if self._results:
+          data = self._results.popleft()
+        elif self._telemetry:
+          data = self._telemetry.popleft()
+        else:
+          break
+      try:
+        self._conn.send_bytes(data)
+      except (IOError, OSError) as e:
+        with self._cond:
+          self._error = e
+          self._results.clear()
+          self._telemetry.clear()
+        break
+
+  def close(self, timeout=FLEET_SENDER_CLOSE_TIMEOUT):
+    '''
+    Send the queued messages, then stop the sending thread
+    :param timeout: maximum seconds to wait for the queued messages
+    '''
+    with self._cond:
+      self._closing = True
+      self._cond.notify_all()
+    if self._thread is not threading.current_thread():
+      self._thread.join(timeout)
+    if self.dropped:
+      logger.debug('Dropped {0} telemetry messages'.format(self.dropped))
+
+
+def serve(conn, arm, sender, lock=None):
+  '''
+  Answer the requests of one proxy connection until it stops or closes
+  Requests are answered in the order they arrive, so a proxy can pipeline them
+  :param conn: a multiprocessing Connection, read by this function
+  :param arm: the arm the requests are run on
+  :param sender: MessageSender writing to the connection
+  :param lock: if given, held while running each request, for arms shared by several connections
+  :return: True if the proxy sent FLEET_MSG_STOP, False if the connection closed
+  '''
+  def _forward(name):
+    def _callback(value, timestamp):
+      try:
+        # read time of the report, as time.monotonic() seconds
+        sender.send_telemetry((FLEET_MSG_TELEMETRY, name, timestamp / 1e9, value))
+      except (IOError, OSError):
+        pass
+    return _callback
+
+  subscribed = {}
+  stopped = False
+  while True:
+    try:
+      msg = conn.recv()
+    except (EOFError, IOError, OSError):
+      break
+    msg_type, msg_id = msg[0], msg[1]
+    if msg_type == FLEET_MSG_STOP:
+      stopped = True
+      try:
+        sender.send((FLEET_MSG_RESULT, msg_id, True, None))
+      except (IOError, OSError):
+        pass
+      break
+    try:
+      if lock is not None:
+        lock.acquire()
+      try:
+        if msg_type == FLEET_MSG_CALL:
+          value = getattr(arm, msg[2])(*msg[3], **msg[4])
+          if value is arm:
+            value = FLEET_RETURN_SELF
+        elif msg_type == FLEET_MSG_GET:
+          value = getattr(arm, msg[2])
+        elif msg_type == FLEET_MSG_SUBSCRIBE:
+          name = msg[2]
+          if name not in FLEET_TELEMETRY:
+            raise ValueError('Unknown telemetry: {0}'.format(name))
+          if name not in subscribed:
+            subscribed[name] = _forward(name)
+            getattr(arm, FLEET_TELEMETRY[name])(
+              callback=subscribed[name], with_timestamp=True)
+          value = None
+        else:
+          raise ValueError('Unknown fleet message: {0}'.format(msg_type))
+      finally:
+        if lock is not None:
+          lock.release()
+      sender.send((FLEET_MSG_RESULT, msg_id, True, value))
+    except (IOError, OSError):
+      break
+    except Exception as e:
+      try:
+        sender.send((FLEET_MSG_RESULT, msg_id, False, _error(e)))
+      except (IOError, OSError):
+        break
+  for name, callback in subscribed.items():
+    try:
+      getattr(arm, FLEET_RELEASE[name])(callback=callback)
+    except Exception:
+      pass
+  return stopped
+
+
+def worker_main(conn, factory, kwargs):
+  '''
+  Entry point of the worker process, hosts one arm and serves the proxy
+  :param conn: the worker's end of a duplex multiprocessing Pipe
+  :param factory: 'wrapper', 'api', or a picklable callable returning an arm
+  :param kwargs: arguments of the factory
+  '''
+  sender = MessageSender(conn)
+  try:
+    arm = create_arm(factory, kwargs)
+  except Exception as e:
+    sender.send((FLEET_MSG_RESULT, 0, False, _error(e)))
+    sender.close()
+    return
+  sender.send((FLEET_MSG_READY,) + describe_arm(arm))
+  serve(conn, arm, sender)
+  sender.close()
+  try:
+    if arm.connected:
+      arm.disconnect()
+  except Exception:
+    pass
+  conn.close()
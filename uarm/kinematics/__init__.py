@@ -0,0 +1,3 @@
+from .kinematics import Kinematics
+from .reachability import ReachabilityOracle
+from .validate import validate_kinematics
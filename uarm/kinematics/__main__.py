@@ -0,0 +1,21 @@
+import argparse
+import json
+
+from uarm import uarm_scan_and_connect
+from .validate import validate_kinematics
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--mode', type=str, default='')
+parser.add_argument('--hwid', type=str, default=None)
+parser.add_argument('--tolerance', type=float, default=None)
+args = parser.parse_args()
+
+robot = uarm_scan_and_connect(hwid=args.hwid)
+if args.mode:
+  robot.tool_mode(args.mode)
+kwargs = {}
+if args.tolerance is not None:
+  kwargs['tolerance'] = args.tolerance
+report = validate_kinematics(robot, **kwargs)
+print(json.dumps(report, indent=4))
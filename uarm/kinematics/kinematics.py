@@ -0,0 +1,202 @@
+import logging
+import math
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+from uarm.offset.measurements import UARM_MODE_OFFSETS
+
+
+logger = logging.getLogger('uarm.kinematics.kinematics')
+
+
+# LINKAGE (millimeters, same values the firmware uses for M2220/M2221)
+UARM_KINEMATICS_BASE_HEIGHT = 106.6     # base plate to shoulder joint
+UARM_KINEMATICS_BASE_STRETCH = 13.2     # base axis to shoulder joint
+UARM_KINEMATICS_LOWER_ARM = 142.07
+UARM_KINEMATICS_UPPER_ARM = 158.81
+
+# END-TOOL ("general" mode), other modes are derived from UARM_MODE_OFFSETS
+UARM_KINEMATICS_FRONT_OFFSET = 44.5
+UARM_KINEMATICS_HEIGHT_OFFSET = 74.55
+
+# JOINT LIMITS (degrees)
+UARM_KINEMATICS_BASE_LIMITS = (0.0, 180.0)
+UARM_KINEMATICS_LOWER_LIMITS = (0.0, 135.6)
+UARM_KINEMATICS_UPPER_LIMITS = (0.0, 100.7)
+# left plus right, the arms meet at 180 degrees minus this at the elbow
+UARM_KINEMATICS_LOWER_UPPER_LIMITS = (10.0, 151.0)
+
+# the firmware clamps X to this value before solving
+UARM_KINEMATICS_MIN_X = 0.1
+
+
+def _require_numpy():
+  if np is None:
+    raise RuntimeError('NumPy is required for vectorized kinematics')
+
+
+class Kinematics(object):
+
+  def __init__(self, mode='general'):
+    '''
+    Host-side model of the Swift Pro linkage, for a given end-tool mode
+    Angles are in degrees, in the firmware's order [base, left, right]
+    Coordinates are in millimeters, in the firmware's (not z-offset) frame
+    '''
+    if mode not in UARM_MODE_OFFSETS:
+      raise ValueError('Unknown uArm mode: {0}'.format(mode))
+    self._mode = mode
+    self._front = UARM_KINEMATICS_FRONT_OFFSET + UARM_MODE_OFFSETS[mode]['x']
+    self._height = UARM_KINEMATICS_HEIGHT_OFFSET - UARM_MODE_OFFSETS[mode]['z']
+    self._ratio = UARM_KINEMATICS_UPPER_ARM / UARM_KINEMATICS_LOWER_ARM
+
+  @property
+  def mode(self):
+    return self._mode
+
+  @property
+  def front_offset(self):
+    return self._front
+
+  @property
+  def height_offset(self):
+    return self._height
+
+  '''
+  SCALAR
+  '''
+
+  def base_angle(self, x, y):
+    '''
+    Angle of the base joint for a coordinate, in degrees (90 is center)
+    '''
+    return math.degrees(math.atan2(y, max(x, UARM_KINEMATICS_MIN_X))) + 90
+
+  def coordinate_to_angles(self, x, y, z):
+    '''
+    Local equivalent of M2220
+    :return: [base, left, right] in degrees, or None if the linkage cannot reach
+    '''
+    x = max(x, UARM_KINEMATICS_MIN_X)
+    base = self.base_angle(x, y)
+    stretch = math.sqrt(x * x + y * y)
+    x_in = (stretch - UARM_KINEMATICS_BASE_STRETCH - self._front)
+    x_in /= UARM_KINEMATICS_LOWER_ARM
+    z_in = (z + self._height - UARM_KINEMATICS_BASE_HEIGHT)
+    z_in /= UARM_KINEMATICS_LOWER_ARM
+    dist = math.sqrt(x_in * x_in + z_in * z_in)
+    if dist == 0:
+      return None
+    phi = math.atan2(z_in, x_in)
+    ratio_sq = self._ratio * self._ratio
+    cos_upper = (dist * dist + ratio_sq - 1) / (2 * self._ratio * dist)
+    cos_lower = (dist * dist + 1 - ratio_sq) / (2 * dist)
+    if abs(cos_upper) > 1 or abs(cos_lower) > 1:
+      return None
+    left = math.degrees(math.acos(cos_lower) + phi)
+    right = math.degrees(math.acos(cos_upper) - phi)
+    return [base, left, right]
+
+  def angles_to_coordinate(self, base, left, right):
+    '''
+    Local equivalent of M2221
+    :return: [x, y, z] in millimeters
+    '''
+    left = math.radians(left)
+    right = math.radians(right)
+    stretch = UARM_KINEMATICS_LOWER_ARM * math.cos(left)
+    stretch += UARM_KINEMATICS_UPPER_ARM * math.cos(right)
+    stretch += UARM_KINEMATICS_BASE_STRETCH + self._front
+    z = UARM_KINEMATICS_BASE_HEIGHT + UARM_KINEMATICS_LOWER_ARM * math.sin(left)
+    z -= UARM_KINEMATICS_UPPER_ARM * math.sin(right) + self._height
+    theta = math.radians(base - 90)
+    return [stretch * math.cos(theta), stretch * math.sin(theta), z]
+
+  def angles_within_limits(self, base, left, right):
+    '''
+    Test angles against the joint limits of the linkage
+    '''
+    return bool(
+      UARM_KINEMATICS_BASE_LIMITS[0] <= base <= UARM_KINEMATICS_BASE_LIMITS[1] and
+      UARM_KINEMATICS_LOWER_LIMITS[0] <= left <= UARM_KINEMATICS_LOWER_LIMITS[1] and
+      UARM_KINEMATICS_UPPER_LIMITS[0] <= right <= UARM_KINEMATICS_UPPER_LIMITS[1] and
+      UARM_KINEMATICS_LOWER_UPPER_LIMITS[0] <= left + right <= UARM_KINEMATICS_LOWER_UPPER_LIMITS[1])
+
+  def can_reach(self, x, y, z):
+    angles = self.coordinate_to_angles(x, y, z)
+    return angles is not None and self.angles_within_limits(*angles)
+
+  '''
+  VECTORIZED
+  '''
+
+  def coordinates_to_angles(self, points):
+    '''
+    Vectorized coordinate_to_angles()
+    :param points: array-like of shape (N, 3), XYZ coordinates
+    :return: array of shape (N, 3), rows are NaN where the linkage cannot reach
+    '''
+    _require_numpy()
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    x = np.maximum(points[:, 0], UARM_KINEMATICS_MIN_X)
+    y = points[:, 1]
+    z = points[:, 2]
+    base = np.degrees(np.arctan2(y, x)) + 90
+    x_in = np.hypot(x, y) - UARM_KINEMATICS_BASE_STRETCH - self._front
+    x_in /= UARM_KINEMATICS_LOWER_ARM
+    z_in = (z + self._height - UARM_KINEMATICS_BASE_HEIGHT)
+    z_in /= UARM_KINEMATICS_LOWER_ARM
+    dist = np.hypot(x_in, z_in)
+    phi = np.arctan2(z_in, x_in)
+    ratio_sq = self._ratio * self._ratio
+    with np.errstate(divide='ignore', invalid='ignore'):
+      cos_upper = (dist * dist + ratio_sq - 1) / (2 * self._ratio * dist)
+      cos_lower = (dist * dist + 1 - ratio_sq) / (2 * dist)
+    valid = (dist > 0) & (np.abs(cos_upper) <= 1) & (np.abs(cos_lower) <= 1)
+    angles = np.full(points.shape, np.nan)
+    angles[valid, 0] = base[valid]
+    angles[valid, 1] = np.degrees(np.arccos(cos_lower[valid]) + phi[valid])
+    angles[valid, 2] = np.degrees(np.arccos(cos_upper[valid]) - phi[valid])
+    return angles
+
+  def angles_to_coordinates(self, angles):
+    '''
+    Vectorized angles_to_coordinate()
+    :param angles: array-like of shape (N, 3), [base, left, right] in degrees
+    :return: array of shape (N, 3), XYZ coordinates
+    '''
+    _require_numpy()
+    angles = np.radians(np.asarray(angles, dtype=float).reshape(-1, 3))
+    stretch = UARM_KINEMATICS_LOWER_ARM * np.cos(angles[:, 1])
+    stretch += UARM_KINEMATICS_UPPER_ARM * np.cos(angles[:, 2])
+    stretch += UARM_KINEMATICS_BASE_STRETCH + self._front
+    z = UARM_KINEMATICS_BASE_HEIGHT + UARM_KINEMATICS_LOWER_ARM * np.sin(angles[:, 1])
+    z -= UARM_KINEMATICS_UPPER_ARM * np.sin(angles[:, 2]) + self._height
+    theta = angles[:, 0] - (math.pi / 2)
+    return np.stack([stretch * np.cos(theta), stretch * np.sin(theta), z], axis=1)
+
+  def angles_within_limits_array(self, angles):
+    '''
+    Vectorized angles_within_limits(), NaN rows are outside the limits
+    '''
+    _require_numpy()
+    angles = np.asarray(angles, dtype=float).reshape(-1, 3)
+    base, left, right = angles[:, 0], angles[:, 1], angles[:, 2]
+    with np.errstate(invalid='ignore'):
+      return (
+        (base >= UARM_KINEMATICS_BASE_LIMITS[0]) & (base <= UARM_KINEMATICS_BASE_LIMITS[1]) &
+        (left >= UARM_KINEMATICS_LOWER_LIMITS[0]) & (left <= UARM_KINEMATICS_LOWER_LIMITS[1]) &
+        (right >= UARM_KINEMATICS_UPPER_LIMITS[0]) & (right <= UARM_KINEMATICS_UPPER_LIMITS[1]) &
+        (left + right >= UARM_KINEMATICS_LOWER_UPPER_LIMITS[0]) &
+        (left + right <= UARM_KINEMATICS_LOWER_UPPER_LIMITS[1]))
+
+  def can_reach_array(self, points):
+    '''
+    Vectorized can_reach()
+    :param points: array-like of shape (N, 3), XYZ coordinates
+    :return: boolean array of shape (N,)
+    '''
+    return self.angles_within_limits_array(self.coordinates_to_angles(points))
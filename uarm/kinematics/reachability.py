@@ -0,0 +1,239 @@
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+from ..utils.files import replacement_file_mode
+from .kinematics import Kinematics
+
+
+logger = logging.getLogger('uarm.kinematics.reachability')
+
+
+# VOXEL STATES
+UARM_REACHABILITY_UNREACHABLE = 0
+UARM_REACHABILITY_REACHABLE = 1
+UARM_REACHABILITY_BOUNDARY = 2
+
+# GRID (millimeters, firmware frame), large enough for every tool mode
+UARM_REACHABILITY_RESOLUTION = 5
+UARM_REACHABILITY_BOUNDS = {
+  'x': (-20, 380),
+  'y': (-380, 380),
+  'z': (-200, 260)
+}
+
+# FIRMWARE ANSWERS (points near the boundary)
+UARM_REACHABILITY_CACHE_SIZE = 4096
+UARM_REACHABILITY_CACHE_DECIMAL = 1
+
+# bumped when grids are built differently, so saved grids are rebuilt
+UARM_REACHABILITY_VERSION = 2
+UARM_REACHABILITY_FILE_NAME = 'uarm_reachability_{0}_{1}mm_v{2}.npy'
+
+
+def _grid_shape(resolution):
+  return tuple(
+    int(round((UARM_REACHABILITY_BOUNDS[a][1] - UARM_REACHABILITY_BOUNDS[a][0]) / resolution))
+    for a in 'xyz')
+
+
+def build_reachability_grid(mode='general', resolution=UARM_REACHABILITY_RESOLUTION):
+  '''
+  Classify every voxel of the workspace with the kinematics model
+  A voxel is reachable only if all of its corners are within the joint limits,
+  and unreachable only if the linkage cannot reach any of its corners at all.
+  Joint limits are not trusted to say a point is unreachable, so those voxels
+  are boundary, as are voxels next to a voxel of a different state, and the
+  model only answers for points well away from the edge of the workspace
+  :param mode: end-tool mode
+  :param resolution: size of each voxel, in millimeters
+  :return: uint8 array of shape (X, Y, Z)
+  '''
+  if np is None:
+    raise RuntimeError('NumPy is required for the reachability grid')
+  shape = _grid_shape(resolution)
+  axes = [
+    UARM_REACHABILITY_BOUNDS[a][0] + np.arange(n + 1) * resolution
+    for a, n in zip('xyz', shape)
+  ]
+  corners = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+  model = Kinematics(mode)
+  angles = model.coordinates_to_angles(corners.reshape(-1, 3))
+  reach = model.angles_within_limits_array(angles)
+  reach = reach.reshape(corners.shape[:3]).astype(np.uint8)
+  solved = ~np.isnan(angles[:, 0])
+  solved = solved.reshape(corners.shape[:3]).astype(np.uint8)
+  # sum the 8 corners of each voxel
+  total = np.zeros(shape, dtype=np.uint8)
+  total_solved = np.zeros(shape, dtype=np.uint8)
+  for dx in (0, 1):
+    for dy in (0, 1):
+      for dz in (0, 1):
+        total += reach[dx:dx + shape[0], dy:dy + shape[1], dz:dz + shape[2]]
+        total_solved += solved[dx:dx + shape[0], dy:dy + shape[1], dz:dz + shape[2]]
+  grid = np.full(shape, UARM_REACHABILITY_BOUNDARY, dtype=np.uint8)
+  grid[total_solved == 0] = UARM_REACHABILITY_UNREACHABLE
+  grid[total == 8] = UARM_REACHABILITY_REACHABLE
+  # grow the boundary by one voxel, to absorb small differences to the firmware
+  edge = grid == UARM_REACHABILITY_BOUNDARY
+  for axis in range(3):
+    a = [slice(None)] * 3
+    b = [slice(None)] * 3
+    a[axis] = slice(1, None)
+    b[axis] = slice(None, -1)
+    diff = grid[tuple(a)] != grid[tuple(b)]
+    edge[tuple(a)] |= diff
+    edge[tuple(b)] |= diff
+  grid[edge] = UARM_REACHABILITY_BOUNDARY
+  return grid
+
+
+class ReachabilityOracle(object):
+
+  def __init__(self,
+               mode='general',
+               directory=None,
+               resolution=UARM_REACHABILITY_RESOLUTION,
+               cache_size=UARM_REACHABILITY_CACHE_SIZE):
+    '''
+    Answers whether a coordinate is reachable, without asking the device
+    The voxel grid is built once per mode and resolution, saved to the
+    directory as a .npy file, and memory-mapped when loaded again
+    Answers from the device (M2222) are kept in an LRU cache
+    Without NumPy no grid is built, and every new coordinate is left to the
+    device (or to the kinematics model, when estimating)
+    :param mode: end-tool mode
+    :param directory: where the grid file is saved, if None it is kept in memory
+    :param resolution: size of each voxel, in millimeters
+    :param cache_size: maximum number of device answers to remember
+    '''
+    self._mode = mode
+    self._directory = directory
+    self._resolution = resolution
+    self._cache_size = cache_size
+    self._cache = OrderedDict()
+    self._grid = None
+    self._kinematics = Kinematics(mode)
+    self._origin = tuple(UARM_REACHABILITY_BOUNDS[a][0] for a in 'xyz')
+    self._shape = _grid_shape(resolution)
+
+  @property
+  def mode(self):
+    return self._mode
+
+  @property
+  def path(self):
+    if not self._directory:
+      return None
+    file_name = UARM_REACHABILITY_FILE_NAME.format(
+      self._mode, self._resolution, UARM_REACHABILITY_VERSION)
+    return os.path.join(self._directory, file_name)
+
+  @property
+  def grid(self):
+    if self._grid is None:
+      self._grid = self._load()
+    return self._grid
+
+  def _load(self):
+    file_path = self.path
+    if file_path and os.path.exists(file_path):
+      try:
+        grid = np.load(file_path, mmap_mode='r')
+        if grid.shape == self._shape and grid.dtype == np.uint8:
+          return grid
+        logger.warning('Ignoring reachability grid with wrong shape: {0}'.format(
+          file_path))
+      except (IOError, ValueError) as e:
+        logger.warning('Unable to load reachability grid: {0}'.format(e))
+    logger.debug('Building reachability grid for mode: {0}'.format(self._mode))
+    grid = build_reachability_grid(self._mode, self._resolution)
+    if file_path:
+      self._save(grid, file_path)
+    return grid
+
+  def _save(self, grid, file_path):
+    try:
+      if not os.path.isdir(self._directory):
+        os.makedirs(self._directory)
+      fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix='.npy')
+      with os.fdopen(fd, 'wb') as f:
+        np.save(f, grid)
+      os.chmod(temp_path, replacement_file_mode(file_path))
+      os.replace(temp_path, file_path)
+    except (IOError, OSError) as e:
+      logger.warning('Unable to save reachability grid: {0}'.format(e))
+
+  def _cache_key(self, x, y, z):
+    return (
+      round(x, UARM_REACHABILITY_CACHE_DECIMAL),
+      round(y, UARM_REACHABILITY_CACHE_DECIMAL),
+      round(z, UARM_REACHABILITY_CACHE_DECIMAL))
+
+  def voxel(self, x, y, z):
+    '''
+    Look up the state of the voxel containing a coordinate
+    :return: UARM_REACHABILITY_UNREACHABLE, _REACHABLE, or _BOUNDARY
+    '''
+    index = (
+      int((x - self._origin[0]) // self._resolution),
+      int((y - self._origin[1]) // self._resolution),
+      int((z - self._origin[2]) // self._resolution))
+    for i, n in zip(index, self._shape):
+      if i < 0 or i >= n:
+        return UARM_REACHABILITY_UNREACHABLE
+    return int(self.grid[index])
+
+  def check(self, x, y, z):
+    '''
+    Answer from the grid, or from a remembered device answer near the boundary
+    False is only answered where the linkage cannot reach at all, points the
+    joint limits rule out are left for the device to answer
+    Without NumPy there is no grid, so only remembered answers are used
+    :return: True/False, or None if the device must be asked
+    '''
+    if np is None:
+      state = UARM_REACHABILITY_BOUNDARY
+    else:
+      state = self.voxel(x, y, z)
+    if state == UARM_REACHABILITY_REACHABLE:
+      return True
+    if state == UARM_REACHABILITY_UNREACHABLE:
+      return False
+    key = self._cache_key(x, y, z)
+    reachable = self._cache.get(key)
+    if reachable is not None:
+      self._cache.move_to_end(key)
+    return reachable
+
+  def estimate(self, x, y, z):
+    '''
+    Like check(), but answers boundary points with the kinematics model
+    :return: True/False
+    '''
+    reachable = self.check(x, y, z)
+    if reachable is None:
+      reachable = self._kinematics.can_reach(x, y, z)
+    return reachable
+
+  def remember(self, x, y, z, reachable):
+    '''
+    Save an answer from the device (M2222) for a coordinate
+    '''
+    key = self._cache_key(x, y, z)
+    self._cache[key] = bool(reachable)
+    self._cache.move_to_end(key)
+    while len(self._cache) > self._cache_size:
+      self._cache.popitem(last=False)
+
+  def forget(self):
+    '''
+    Clear all remembered device answers
+    '''
+    self._cache.clear()
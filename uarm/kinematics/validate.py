@@ -0,0 +1,117 @@
+import logging
+
+from .kinematics import Kinematics
+
+
+logger = logging.getLogger('uarm.kinematics.validate')
+
+
+UARM_KINEMATICS_VALIDATE_TOLERANCE = 0.5  # millimeters and degrees
+UARM_KINEMATICS_VALIDATE_POINTS = [
+  {'x': x, 'y': y, 'z': z}
+  for x in (120, 160, 200, 240, 280)
+  for y in (-120, -40, 0, 40, 120)
+  for z in (0, 50, 100, 150)
+]
+UARM_KINEMATICS_VALIDATE_ANGLES = [
+  [b, l, r]
+  for b in (45, 90, 135)
+  for l in (40, 80, 120)
+  for r in (10, 40, 70)
+  if 10 <= l + r <= 151
+]
+# coordinates QUIRKS.md and the examples say are (or are not) reachable
+UARM_KINEMATICS_VALIDATE_REACH_POINTS = [
+  {'x': 50, 'y': 0, 'z': 0},
+  {'x': 150, 'y': 0, 'z': 0},
+  {'x': 150, 'y': 0, 'z': 10},
+  {'x': 200, 'y': 0, 'z': 0}
+]
+
+
+def _max_difference(a, b):
+  return max(abs(i - j) for i, j in zip(a, b))
+
+
+def _summarize(errors, failures, tolerance):
+  count = len(errors)
+  return {
+    'count': count,
+    'max_error': round(max(errors), 3) if count else None,
+    'mean_error': round(sum(errors) / count, 3) if count else None,
+    'outside_tolerance': len([e for e in errors if e > tolerance]),
+    'failures': failures
+  }
+
+
+def validate_kinematics(robot,
+                        mode=None,
+                        points=None,
+                        angles=None,
+                        tolerance=UARM_KINEMATICS_VALIDATE_TOLERANCE):
+  '''
+  Compare the local Kinematics against the answers of the connected firmware
+  The firmware's current mode must match the mode being validated
+  :param robot: connected SwiftAPI or SwiftAPIWrapper
+  :param mode: end-tool mode, default is the robot's current tool mode
+  :param points: list of XYZ dicts to test with M2220
+  :param angles: list of [base, left, right] to test with M2221
+  :param tolerance: maximum allowed difference, in millimeters or degrees
+  :return: dictionary with "ik" and "fk" summaries, and "reach" comparing can_reach() against M2222
+  '''
+  if mode is None:
+    mode = robot.get_tool_mode() if hasattr(robot, 'get_tool_mode') else 'general'
+  if points is None:
+    points = UARM_KINEMATICS_VALIDATE_POINTS
+  if angles is None:
+    angles = UARM_KINEMATICS_VALIDATE_ANGLES
+  reach_points = UARM_KINEMATICS_VALIDATE_REACH_POINTS + list(points)
+  model = Kinematics(mode)
+
+  ik_errors = []
+  ik_failures = []
+  for p in points:
+    local = model.coordinate_to_angles(p['x'], p['y'], p['z'])
+    device = robot.coordinate_to_angles(x=p['x'], y=p['y'], z=p['z'])
+    if not isinstance(device, list) or local is None:
+      ik_failures.append({'position': p, 'local': local, 'device': device})
+      continue
+    error = _max_difference(local, device)
+    ik_errors.append(error)
+    if error > tolerance:
+      logger.debug('IK mismatch at {0}: local={1} device={2}'.format(
+        p, local, device))
+
+  fk_errors = []
+  fk_failures = []
+  for a in angles:
+    local = model.angles_to_coordinate(*a)
+    device = robot.angles_to_coordinate(angles=a)
+    if not isinstance(device, list):
+      fk_failures.append({'angles': a, 'local': local, 'device': device})
+      continue
+    error = _max_difference(local, device)
+    fk_errors.append(error)
+    if error > tolerance:
+      logger.debug('FK mismatch at {0}: local={1} device={2}'.format(
+        a, local, device))
+
+  reach_count = 0
+  reach_mismatches = []
+  for p in reach_points:
+    local = model.can_reach(p['x'], p['y'], p['z'])
+    limited = robot.check_pos_is_limit([p['x'], p['y'], p['z']])
+    if not isinstance(limited, bool):
+      continue
+    reach_count += 1
+    if local == limited:
+      reach_mismatches.append({'position': p, 'local': local, 'device': not limited})
+      logger.debug('Reach mismatch at {0}: local={1}'.format(p, local))
+
+  return {
+    'mode': mode,
+    'tolerance': tolerance,
+    'ik': _summarize(ik_errors, ik_failures, tolerance),
+    'fk': _summarize(fk_errors, fk_failures, tolerance),
+    'reach': {'count': reach_count, 'mismatches': reach_mismatches}
+  }
@@ -0,0 +1,8 @@
+from .linear import LinearPlanner
+from .linear import segment_length
+from .arc import ArcPlanner
+from .timing import VirtualClock
+from .timing import move_duration
+from .program import CompiledProgram
+from .program import Param
+from .program import Program
@@ -0,0 +1,160 @@
+import logging
+import math
+from collections import OrderedDict
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+
+logger = logging.getLogger('uarm.motion.arc')
+
+
+# millimeters between an arc and the chords that replace it
+UARM_ARC_TOLERANCE = 0.1
+UARM_ARC_MIN_SEGMENTS_PER_TURN = 8
+UARM_ARC_MAX_SEGMENTS = 4096
+
+UARM_ARC_CACHE_SIZE = 256
+UARM_ARC_CACHE_DECIMAL = 3 # same as round_position()
+
+
+def _sweep(start_angle, end_angle, clockwise, turns):
+  # same start and end angle is a full circle, like G2/G3
+  if clockwise:
+    sweep = (start_angle - end_angle) % (2 * math.pi)
+  else:
+    sweep = (end_angle - start_angle) % (2 * math.pi)
+  if sweep < 1e-9:
+    sweep = 2 * math.pi
+  sweep += 2 * math.pi * max(int(turns), 0)
+  return -sweep if clockwise else sweep
+
+
+class ArcPlanner(object):
+
+  def __init__(self, tolerance=UARM_ARC_TOLERANCE, cache_size=UARM_ARC_CACHE_SIZE):
+    '''
+    Splits arcs, circles and helices in the XY plane into chords
+    The radius may change along the arc (a spiral), and Z moves along with
+    the angle (a helix). Chords are as long as the tolerance allows, measured
+    at the largest radius, and all points are calculated at once
+    The tolerance is kept even when chords are shorter than the speed's
+    segment_length(), the uArm then slows down instead of leaving the arc
+    Split arcs are kept in an LRU cache, for arcs that repeat
+    :param tolerance: default millimeters between the arc and its chords
+    :param cache_size: maximum number of split arcs to remember
+    '''
+    self.tolerance = tolerance
+    self._cache_size = cache_size
+    self._cache = OrderedDict()
+    self._hits = 0
+    self._misses = 0
+
+  @property
+  def cache_info(self):
+    return {
+      'hits': self._hits,
+      'misses': self._misses,
+      'size': len(self._cache),
+      'max_size': self._cache_size
+    }
+
+  def forget(self):
+    self._cache.clear()
+    return self
+
+  def _segment_count(self, sweep, radius, length, min_length, tolerance):
+    if radius <= tolerance:
+      step = math.pi / 2
+    else:
+      # the sagitta of a chord spanning step radians is radius * (1 - cos(step / 2))
+      step = 2 * math.acos(1 - tolerance / radius)
+    count = int(math.ceil(abs(sweep) / step))
+    turns = abs(sweep) / (2 * math.pi)
+    count = max(count, int(math.ceil(turns * UARM_ARC_MIN_SEGMENTS_PER_TURN)), 1)
+    count = min(count, UARM_ARC_MAX_SEGMENTS)
+    if min_length and length / count < min_length:
+      logger.debug(
+        'Chords of {0}mm are shorter than {1}mm, the uArm will slow down'.format(
+          round(length / count, 2), round(min_length, 2)))
+    return count
+
+  def _points(self, start, end, center, sweep, count):
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    start_radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    end_radius = math.hypot(end[0] - center[0], end[1] - center[1])
+    if np is not None:
+      t = np.arange(1, count + 1) / count
+      angle = start_angle + sweep * t
+      radius = start_radius + (end_radius - start_radius) * t
+      points = np.stack([
+        center[0] + radius * np.cos(angle),
+        center[1] + radius * np.sin(angle),
+        start[2] + (end[2] - start[2]) * t], axis=1)
+      points[-1] = end # no rounding error at the target
+      return np.round(points, UARM_ARC_CACHE_DECIMAL).tolist()
+    points = []
+    for i in range(1, count + 1):
+      t = i / count
+      angle = start_angle + sweep * t
+      radius = start_radius + (end_radius - start_radius) * t
+      points.append([
+        round(center[0] + radius * math.cos(angle), UARM_ARC_CACHE_DECIMAL),
+        round(center[1] + radius * math.sin(angle), UARM_ARC_CACHE_DECIMAL),
+        round(start[2] + (end[2] - start[2]) * t, UARM_ARC_CACHE_DECIMAL)])
+    points[-1] = list(end)
+    return points
+
+  def segments(self, start, end, center, clockwise=False, turns=0, min_length=0,
+               tolerance=None):
+    '''
+    Points to move through, to go from start to end around center
+    :param start: [x, y, z]
+    :param end: [x, y, z], if its XY equals start the arc is a full circle
+    :param center: [x, y] of the circle
+    :param clockwise: direction, looking down at the uArm
+    :param turns: number of extra full turns, for helices
+    :param min_length: shortest chord the uArm keeps its speed through, see segment_length()
+    :param tolerance: millimeters between the arc and its chords, default is the planner's tolerance
+    :return: list of [x, y, z], without start and ending with end
+    '''
+    if tolerance is None:
+      tolerance = self.tolerance
+    key = (
+      tuple(round(v, UARM_ARC_CACHE_DECIMAL) for v in start[:3]),
+      tuple(round(v, UARM_ARC_CACHE_DECIMAL) for v in end[:3]),
+      tuple(round(v, UARM_ARC_CACHE_DECIMAL) for v in center[:2]),
+      bool(clockwise),
+      int(turns),
+      round(min_length, UARM_ARC_CACHE_DECIMAL),
+      tolerance)
+    points = self._cache.get(key)
+    if points is not None:
+      self._hits += 1
+      self._cache.move_to_end(key)
+      return [list(p) for p in points]
+    self._misses += 1
+    start, end, center = key[0], key[1], key[2]
+    start_radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    end_radius = math.hypot(end[0] - center[0], end[1] - center[1])
+    if not start_radius or not end_radius:
+      raise ValueError('Arc center must not be its start or end: {0}'.format(
+        list(center)))
+    sweep = _sweep(
+      math.atan2(start[1] - center[1], start[0] - center[0]),
+      math.atan2(end[1] - center[1], end[0] - center[0]),
+      clockwise, turns)
+    length = math.hypot(
+      abs(sweep) * (start_radius + end_radius) / 2, end[2] - start[2])
+    count = self._segment_count(
+      sweep, max(start_radius, end_radius), length, min_length, tolerance)
+    points = tuple(
+      tuple(p) for p in self._points(start, end, center, sweep, count))
+    logger.debug('{0} chords around {1}, {2} radians'.format(
+      count, list(center), round(sweep, 3)))
+    self._cache[key] = points
+    while len(self._cache) > self._cache_size:
+      self._cache.popitem(last=False)
+    return [list(p) for p in points]
@@ -0,0 +1,162 @@
+import logging
+import math
+from collections import OrderedDict
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+from uarm.kinematics import Kinematics
+
+
+logger = logging.getLogger('uarm.motion.linear')
+
+
+# millimeters the arched path of one segment may stray from the straight line
+UARM_LINEAR_TOLERANCE = 0.5
+
+# shortest segment, in seconds at the current speed, so the serial link
+# stays ahead of the arm and the firmware never runs out of moves
+UARM_LINEAR_SEGMENT_TIME = 0.04
+UARM_LINEAR_REFERENCE_ACCELERATION = 5 # UARM_DEFAULT_ACCELERATION
+UARM_LINEAR_MAX_SEGMENTS = 512
+
+UARM_LINEAR_CACHE_SIZE = 1024
+UARM_LINEAR_CACHE_DECIMAL = 3 # same as round_position()
+
+
+def segment_length(speed, acceleration=UARM_LINEAR_REFERENCE_ACCELERATION):
+  '''
+  Shortest segment that keeps the arm moving at speed
+  To keep moving, every segment must last UARM_LINEAR_SEGMENT_TIME, and more when the acceleration
+  is lower than the default, because the arm slows down more at each junction
+  :param speed: millimeters/second
+  :param acceleration: the wrapper's acceleration setting
+  :return: millimeters
+  '''
+  scale = max(1.0, UARM_LINEAR_REFERENCE_ACCELERATION / max(acceleration, 1e-6))
+  return speed * UARM_LINEAR_SEGMENT_TIME * scale
+
+
+class LinearPlanner(object):
+
+  def __init__(self,
+               mode='general',
+               tolerance=UARM_LINEAR_TOLERANCE,
+               cache_size=UARM_LINEAR_CACHE_SIZE):
+    '''
+    Splits moves into segments, so the arm travels in a straight line
+    The firmware moves each joint linearly, which bends the path into an arch.
+    The arch of a segment is estimated with the kinematics model, at its middle,
+    and segments are added until no arch is larger than the tolerance
+    Segmented moves are kept in an LRU cache, for moves that repeat
+    :param mode: end-tool mode
+    :param tolerance: millimeters each segment's path may stray from the line
+    :param cache_size: maximum number of segmented moves to remember
+    '''
+    self._mode = mode
+    self._kinematics = Kinematics(mode)
+    self.tolerance = tolerance
+    self._cache_size = cache_size
+    self._cache = OrderedDict()
+    self._hits = 0
+    self._misses = 0
+
+  @property
+  def mode(self):
+    return self._mode
+
+  @property
+  def cache_info(self):
+    return {
+      'hits': self._hits,
+      'misses': self._misses,
+      'size': len(self._cache),
+      'max_size': self._cache_size
+    }
+
+  def forget(self):
+    self._cache.clear()
+    return self
+
+  def _arch_errors(self, points):
+    # distance between the middle of each straight segment and where
+    # the firmware's joint interpolation puts the arm halfway through it
+    if np is not None:
+      points = np.asarray(points, dtype=float)
+      angles = self._kinematics.coordinates_to_angles(points)
+      arched = self._kinematics.angles_to_coordinates(
+        (angles[:-1] + angles[1:]) / 2)
+      errors = np.linalg.norm(arched - (points[:-1] + points[1:]) / 2, axis=1)
+      # unreachable points are left for the firmware to refuse
+      return float(np.nanmax(errors)) if not np.all(np.isnan(errors)) else 0.0
+    worst = 0.0
+    angles = [self._kinematics.coordinate_to_angles(*p) for p in points]
+    for i in range(len(points) - 1):
+      if angles[i] is None or angles[i + 1] is None:
+        continue
+      arched = self._kinematics.angles_to_coordinate(
+        *[(a + b) / 2 for a, b in zip(angles[i], angles[i + 1])])
+      straight = [(a + b) / 2 for a, b in zip(points[i], points[i + 1])]
+      worst = max(worst, math.sqrt(
+        sum((a - s) ** 2 for a, s in zip(arched, straight))))
+    return worst
+
+  def _divide(self, start, end, count):
+    if np is not None:
+      t = np.linspace(0.0, 1.0, count + 1)[:, None]
+      points = np.asarray(start) + (np.asarray(end) - np.asarray(start)) * t
+      return points.tolist()
+    return [
+      [s + (e - s) * i / count for s, e in zip(start, end)]
+      for i in range(count + 1)]
+
+  def _segment_count(self, start, end, min_length):
+    length = math.sqrt(sum((e - s) ** 2 for s, e in zip(start, end)))
+    if not length:
+      return 1
+    most = UARM_LINEAR_MAX_SEGMENTS
+    count = 1
+    while count < most:
+      error = self._arch_errors(self._divide(start, end, count))
+      if error <= self.tolerance:
+        break
+      # the arch shrinks with the square of the segment length
+      count = min(most, max(count + 1, int(math.ceil(
+        count * math.sqrt(error / self.tolerance)))))
+    if min_length and length / count < min_length:
+      logger.debug(
+        'Segments of {0}mm are shorter than {1}mm, the uArm will slow down'.format(
+          round(length / count, 2), round(min_length, 2)))
+    return count
+
+  def segments(self, start, end, min_length=0):
+    '''
+    Points to move through, to go from start to end in a straight line
+    :param start: [x, y, z] in the firmware's frame
+    :param end: [x, y, z] in the firmware's frame
+    :param min_length: segments shorter than this slow the arm down, see segment_length(),
+                       the tolerance is kept and shorter segments are only logged
+    :return: list of [x, y, z], without start and ending with end
+    '''
+    key = (
+      tuple(round(v, UARM_LINEAR_CACHE_DECIMAL) for v in start),
+      tuple(round(v, UARM_LINEAR_CACHE_DECIMAL) for v in end),
+      round(min_length, UARM_LINEAR_CACHE_DECIMAL),
+      self.tolerance)
+    points = self._cache.get(key)
+    if points is not None:
+      self._hits += 1
+      self._cache.move_to_end(key)
+      return [list(p) for p in points]
+    self._misses += 1
+    count = self._segment_count(key[0], key[1], min_length)
+    points = tuple(
+      tuple(round(v, UARM_LINEAR_CACHE_DECIMAL) for v in p)
+      for p in self._divide(key[0], key[1], count)[1:])
+    logger.debug('{0} segments from {1} to {2}'.format(count, start, end))
+    self._cache[key] = points
+    while len(self._cache) > self._cache_size:
+      self._cache.popitem(last=False)
+    return [list(p) for p in points]
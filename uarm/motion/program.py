@@ -0,0 +1,302 @@
+import copy
+import json
+import logging
+
+
+logger = logging.getLogger('uarm.motion.program')
+
+
+UARM_PROGRAM_VERSION = 1
+
+# calls a Program records, with the wrapper's default arguments
+UARM_PROGRAM_CALLS = {
+  'move_to': {'x': None, 'y': None, 'z': None},
+  'move_relative': {'x': None, 'y': None, 'z': None},
+  'arc_to': {
+    'x': None, 'y': None, 'z': None, 'center_x': None, 'center_y': None,
+    'clockwise': False, 'turns': 0, 'tolerance': None},
+  'circle': {
+    'center_x': None, 'center_y': None, 'turns': 1, 'z': None,
+    'clockwise': False, 'tolerance': None},
+  'rotate_to': {'angle': 90, 'sleep': None, 'wait': True},
+  'rotate_relative': {'angle': 0, 'sleep': None, 'wait': True},
+  'pump': {'enable': False, 'sleep': None},
+  'grip': {'enable': False, 'sleep': None},
+  'speed': {'speed': None},
+  'acceleration': {'acceleration': None},
+  'push_settings': {},
+  'pop_settings': {},
+  'wait_for_arrival': {},
+  'dwell': {'seconds': 0}
+}
+
+# compiled operations, in the firmware's frame (offsets already applied)
+UARM_PROGRAM_OP_MOVE = 'move'   # (op, x, y, z, speed in mm/min)
+UARM_PROGRAM_OP_WRIST = 'wrist' # (op, angle)
+UARM_PROGRAM_OP_CMD = 'cmd'     # (op, gcode)
+UARM_PROGRAM_OP_WAIT = 'wait'   # (op,) until every move has finished
+UARM_PROGRAM_OP_SLEEP = 'sleep' # (op, seconds) after every command is acknowledged
+
+
+class Param(object):
+
+  def __init__(self, name):
+    '''
+    Placeholder for a value given when the program is compiled
+    '''
+    self.name = name
+
+  def __repr__(self):
+    return 'Param({0!r})'.format(self.name)
+
+  def __eq__(self, other):
+    return isinstance(other, Param) and other.name == self.name
+
+  def __hash__(self):
+    return hash(('Param', self.name))
+
+
+def _encode(value):
+  if isinstance(value, Param):
+    return {'$param': value.name}
+  return value
+
+
+def _decode(value):
+  if isinstance(value, dict) and set(value.keys()) == {'$param'}:
+    return Param(value['$param'])
+  return value
+
+
+def resolve(value, params):
+  '''
+  Replace a Param with its value from params
+  '''
+  if not isinstance(value, Param):
+    return value
+  if value.name not in params:
+    raise ValueError('Missing program parameter: {0}'.format(value.name))
+  return params[value.name]
+
+
+class Program(object):
+
+  def __init__(self, name=None):
+    '''
+    Records calls of the SwiftAPIWrapper's fluent API without running them,
+    for SwiftAPIWrapper.compile_program() and run_program()
+    Any argument may be a Param, given a value when the program is compiled:
+      pick = Program('pick').move_to(x=Program.param('x'), y=Program.param('y'), z=10).pump(True)
+    :param name: optional name, saved when exported
+    '''
+    self.name = name
+    self._steps = []
+    self._key = None
+
+  @staticmethod
+  def param(name):
+    return Param(name)
+
+  @property
+  def steps(self):
+    '''
+    The recorded calls
+    :return: list of (call, kwargs)
+    '''
+    return [(call, dict(kwargs)) for call, kwargs in self._steps]
+
+  @property
+  def params(self):
+    '''
+    Names of every Param used by the program
+    '''
+    return sorted(set(
+      v.name for _, kwargs in self._steps
+      for v in kwargs.values() if isinstance(v, Param)))
+
+  @property
+  def absolute(self):
+    '''
+    True if the first move is a move_to() with every axis, so the program
+    does not depend on where the uArm was when it was compiled, and also
+    True without moves, which leave the position unchanged
+    That first move is compiled to a single command, which arches even when
+    SwiftAPIWrapper.linear() is enabled, because where it starts is unknown
+    '''
+    for call, kwargs in self._steps:
+      if call in ('move_to', 'move_relative', 'arc_to', 'circle'):
+        return call == 'move_to' and all(
+          kwargs[a] is not None for a in ('x', 'y', 'z'))
+    return True
+
+  @property
+  def key(self):
+    '''
+    Identifies the recorded calls, programs with the same calls have the same key
+    '''
+    if self._key is None:
+      self._key = json.dumps(self.to_dict()['steps'], sort_keys=True)
+    return self._key
+
+  def _add(self, call, kwargs):
+    arguments = dict(UARM_PROGRAM_CALLS[call])
+    arguments.update(kwargs)
+    self._steps.append((call, arguments))
+    self._key = None
+    return self
+
+  def __len__(self):
+    return len(self._steps)
+
+  def move_to(self, x=None, y=None, z=None):
+    return self._add('move_to', {'x': x, 'y': y, 'z': z})
+
+  def move_relative(self, x=None, y=None, z=None):
+    return self._add('move_relative', {'x': x, 'y': y, 'z': z})
+
+  def arc_to(self, x=None, y=None, z=None, center_x=None, center_y=None,
+             clockwise=False, turns=0, tolerance=None):
+    return self._add('arc_to', {
+      'x': x, 'y': y, 'z': z, 'center_x': center_x, 'center_y': center_y,
+      'clockwise': clockwise, 'turns': turns, 'tolerance': tolerance})
+
+  def circle(self, center_x=None, center_y=None, turns=1, z=None,
+             clockwise=False, tolerance=None):
+    return self._add('circle', {
+      'center_x': center_x, 'center_y': center_y, 'turns': turns, 'z': z,
+      'clockwise': clockwise, 'tolerance': tolerance})
+
+  def rotate_to(self, angle=90, sleep=None, wait=True):
+    return self._add('rotate_to', {'angle': angle, 'sleep': sleep, 'wait': wait})
+
+  def rotate_relative(self, angle=0, sleep=None, wait=True):
+    return self._add(
+      'rotate_relative', {'angle': angle, 'sleep': sleep, 'wait': wait})
+
+  def pump(self, enable=False, sleep=None):
+    return self._add('pump', {'enable': enable, 'sleep': sleep})
+
+  def grip(self, enable=False, sleep=None):
+    return self._add('grip', {'enable': enable, 'sleep': sleep})
+
+  def speed(self, speed):
+    return self._add('speed', {'speed': speed})
+
+  def acceleration(self, acceleration):
+    return self._add('acceleration', {'acceleration': acceleration})
+
+  def push_settings(self):
+    return self._add('push_settings', {})
+
+  def pop_settings(self):
+    return self._add('pop_settings', {})
+
+  def wait_for_arrival(self):
+    return self._add('wait_for_arrival', {})
+
+  def dwell(self, seconds):
+    '''
+    Wait a number of seconds, after the previous commands were acknowledged
+    '''
+    return self._add('dwell', {'seconds': seconds})
+
+  def extend(self, program):
+    '''
+    Append the calls of another program
+    '''
+    for call, kwargs in program._steps:
+      self._add(call, kwargs)
+    return self
+
+  def to_dict(self):
+    return {
+      'version': UARM_PROGRAM_VERSION,
+      'name': self.name,
+      'steps': [
+        [call, {k: _encode(v) for k, v in kwargs.items()}]
+        for call, kwargs in self._steps]
+    }
+
+  @classmethod
+  def from_dict(cls, data):
+    if data.get('version') != UARM_PROGRAM_VERSION:
+      raise ValueError('Unsupported program version: {0}'.format(
+        data.get('version')))
+    program = cls(name=data.get('name'))
+    for call, kwargs in data['steps']:
+      if call not in UARM_PROGRAM_CALLS:
+        raise ValueError('Unknown program call: {0}'.format(call))
+      program._add(call, {k: _decode(v) for k, v in kwargs.items()})
+    return program
+
+  def save(self, file_path):
+    '''
+    Export the program to a JSON file
+    '''
+    with open(file_path, 'w') as f:
+      f.write(json.dumps(self.to_dict(), indent=4))
+    return self
+
+  @classmethod
+  def load(cls, file_path):
+    '''
+    Import a program from a JSON file
+    '''
+    with open(file_path, 'r') as f:
+      return cls.from_dict(json.load(f))
+
+
+class CompiledProgram(object):
+
+  def __init__(self, ops, start, state, duration=0.0, name=None):
+    '''
+    Flat list of operations for one uArm state, made by SwiftAPIWrapper.compile_program()
+    :param ops: list of UARM_PROGRAM_OP_* tuples
+    :param start: the wrapper's state the program was compiled for, see SwiftAPIWrapper.compile_program()
+    :param state: the wrapper's position (None if unchanged), wrist angle, speed and acceleration after the program
+    :param duration: estimated seconds, with the simulator's timing model
+    '''
+    self.ops = ops
+    self.start = start
+    self.state = state
+    self.duration = duration
+    self.name = name
+
+  def __len__(self):
+    return len(self.ops)
+
+  def to_dict(self):
+    return {
+      'version': UARM_PROGRAM_VERSION,
+      'name': self.name,
+      'ops': [list(op) for op in self.ops],
+      'start': copy.deepcopy(self.start),
+      'state': copy.deepcopy(self.state),
+      'duration': self.duration
+    }
+
+  @classmethod
+  def from_dict(cls, data):
+    if data.get('version') != UARM_PROGRAM_VERSION:
+      raise ValueError('Unsupported program version: {0}'.format(
+        data.get('version')))
+    return cls(
+      [tuple(op) for op in data['ops']], copy.deepcopy(data['start']),
+      copy.deepcopy(data['state']), duration=data.get('duration', 0.0),
+      name=data.get('name'))
+
+  def save(self, file_path):
+    '''
+    Export the compiled program to a JSON file
+    '''
+    with open(file_path, 'w') as f:
+      f.write(json.dumps(self.to_dict(), indent=4))
+    return self
+
+  @classmethod
+  def load(cls, file_path):
+    '''
+    Import a compiled program from a JSON file
+    '''
+    with open(file_path, 'r') as f:
+      return cls.from_dict(json.load(f))
@@ -0,0 +1,109 @@
+import logging
+import math
+import time
+
+
+logger = logging.getLogger('uarm.motion.timing')
+
+
+# the wrapper's acceleration setting is not in mm/s^2, this converts it
+# for the timing model (estimated, adjust after timing a real arm)
+UARM_TIMING_ACCELERATION_FACTOR = 100
+
+
+def move_duration(distance, speed, acceleration):
+  '''
+  Seconds for a move that starts and ends at rest, with a trapezoidal speed profile
+  Short moves never reach the top speed, and have a triangular profile instead
+  :param distance: millimeters
+  :param speed: top speed, millimeters/second
+  :param acceleration: millimeters/second/second, 0 for an instant top speed
+  :return: seconds
+  '''
+  if distance <= 0 or speed <= 0:
+    return 0.0
+  if acceleration <= 0:
+    return distance / speed
+  # distance spent speeding up and slowing down
+  ramp = speed * speed / acceleration
+  if distance < ramp:
+    return 2 * math.sqrt(distance / acceleration)
+  return distance / speed + speed / acceleration
+
+
+def path_length(start, points):
+  '''
+  Millimeters along a path, from start through every point
+  '''
+  length = 0.0
+  for point in points:
+    length += math.sqrt(sum((p - s) ** 2 for s, p in zip(start, point)))
+    start = point
+  return length
+
+
+class VirtualClock(object):
+
+  def __init__(self, time_scale=0):
+    '''
+    Simulated time of a simulated uArm, advanced by the estimated duration of each call
+    :param time_scale: real seconds slept for each simulated second, 0 never sleeps,
+    1 is real time, and 0.1 runs ten times faster than real time
+    '''
+    self.time_scale = time_scale
+    self._now = 0.0
+    self._split = 0.0
+    self._log = []
+
+  @property
+  def now(self):
+    '''
+    Simulated seconds since the clock was created or reset
+    '''
+    return self._now
+
+  @property
+  def log(self):
+    '''
+    Every call that took simulated time
+    :return: list of dictionaries with "call", "start" and "duration" in seconds
+    '''
+    return list(self._log)
+
+  def advance(self, seconds, call=None):
+    '''
+    Add the duration of a call to the simulated time
+    :return: seconds
+    '''
+    seconds = max(float(seconds), 0.0)
+    self._log.append({'call': call, 'start': self._now, 'duration': seconds})
+    self._now += seconds
+    if self.time_scale and seconds:
+      time.sleep(seconds * self.time_scale)
+    return seconds
+
+  def split(self):
+    '''
+    Simulated seconds since the previous split, for timing a program
+    '''
+    elapsed = self._now - self._split
+    self._split = self._now
+    return elapsed
+
+  def summary(self):
+    '''
+    Estimated durations per call
+    :return: Dictionary with "total" seconds, and for each call its "count" and "total" seconds
+    '''
+    calls = {}
+    for entry in self._log:
+      stats = calls.setdefault(entry['call'], {'count': 0, 'total': 0.0})
+      stats['count'] += 1
+      stats['total'] += entry['duration']
+    return {'total': self._now, 'calls': calls}
+
+  def reset(self):
+    self._now = 0.0
+    self._split = 0.0
+    self._log = []
+    return self
@@ -128,7 +128,7 @@ class Recorder(object):
     # save list of positions to disk
     save_data = copy.deepcopy(UARM_TRAIN_SAVED_DATA)
     save_data['samples'] = _recorded_poses
-    save_data['hardware_settings'] = robot.hardware_settings
+    save_data['hardware_settings'] = dict(robot.hardware_settings)
     save_data['time']['start'] = _start_time
     save_data['time']['end'] = _end_time
     save_data['time']['duration'] = round(_end_time - _start_time, 3)
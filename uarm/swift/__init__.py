@@ -6,28 +6,26 @@
 #
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
+import asyncio
 import logging
+import math
 import time
 import re
 import os
 import threading
-try:
-    from multiprocessing.pool import ThreadPool
-except:
-    ThreadPool = None
-try:
-    import asyncio
-except:
-    asyncio = None
 from queue import Queue
 from . import protocol
-from ..comm import Serial
+from ..comm import Serial, is_network_url
 from .keys import Keys
 from .pump import Pump
 from .gripper import Gripper
 from .grove import Grove
+from .eeprom import EEPROMCache, EEPROMRecord
+from .sampler import Sampler, SampleBuffer
+from .telemetry import TelemetryPublisher, TelemetryReader
 from .utils import *
 from ..tools.threads import ThreadManage
+from ..tools.executor import CallbackExecutor, EventLoopRunner
 
 
 logger = logging.getLogger('uarm.swift')
@@ -39,7 +37,7 @@ class HandleQueue(Queue):
         self.handle = handle
 
     def put(self, item, block=True, timeout=None):
-        self.handle(item)
+        self.handle(*item)
 
     def get(self, block=True, timeout=None):
         return None
@@ -48,15 +46,34 @@ class HandleQueue(Queue):
 class Swift(Pump, Keys, Gripper, Grove):
     def __init__(self, port=None, baudrate=115200, timeout=None, **kwargs):
         super(Swift, self).__init__()
+        port = kwargs.get('dev_port', None) if kwargs.get('dev_port', None) is not None else port
+        # over a network every round trip costs milliseconds, keep the firmware buffers full and wait longer
+        network = is_network_url(port)
         self.cmd_pend = {}
         self.cmd_pend_size = kwargs.get('cmd_pend_size', 2)
         if not isinstance(self.cmd_pend_size, int) or self.cmd_pend_size < 2:
             self.cmd_pend_size = 2
         self.cmd_pend_c = threading.Condition()
-        self.cmd_timeout = kwargs.get('cmd_timeout', 2)
+        self.cmd_timeout = kwargs.get('cmd_timeout', 5 if network else 2)
+        # lost acks: the firmware answers in order, so an ack for a later command means an earlier one was lost
+        self.detect_lost_acks = bool(kwargs.get('detect_lost_acks', True))
+        self.cmd_retries = kwargs.get('cmd_retries', 2)
+        self.adaptive_timeout = bool(kwargs.get('adaptive_timeout', True))
+        self._ack_stats = {'lost': 0, 'retried': 0, 'timeouts': 0}
+        self._motion_until = 0  # time.monotonic() when every queued move is expected to be finished
+        self._seq = 0
+        # character counting: keep the firmware serial rx buffer and command queue full, never overflow them
+        self.stream_bytes = bool(kwargs.get('stream_bytes', network))
+        self.rx_buffer_size = kwargs.get('rx_buffer_size', 128)
+        self.planner_buffer_size = kwargs.get('planner_buffer_size', 16)
+        self.cmd_pend_bytes = 0
+        self._stream_stats = {'bytes_high_water': 0, 'cmds_high_water': 0, 'waits': 0, 'wait_time': 0.0}
         self._cnt_lock = threading.Lock()
         self._cnt = 1
 
+        self._timestamp_callbacks = set()  # (report_id, callback) that also get the receive timestamp
+        self.report_timestamps = {}  # report_id -> time.monotonic_ns() of the latest report
+        self._latency = {'count': 0, 'last': None, 'min': None, 'max': None, 'total': 0, 'ewma': None}
         self._report_callbacks = {
             REPORT_POWER_ID: [],
             REPORT_POSITION_ID: [],
@@ -92,6 +109,8 @@ class Swift(Pump, Keys, Gripper, Grove):
 
         self._other_que = Queue()
 
+        self.rom_cache = EEPROMCache(self)
+
         if kwargs.get('enable_handle_thread', True):
             self._rx_que = Queue()
             self._rx_con_c = threading.Condition()
@@ -103,13 +122,12 @@ class Swift(Pump, Keys, Gripper, Grove):
         else:
             self._tx_que = None
         if kwargs.get('enable_handle_report_thread', kwargs.get('enable_report_thread', False)):
-            self._report_que = Queue()
+            self._report_que = Queue(kwargs.get('callback_queue_size', 256))
             self._report_con_c = threading.Condition()
         else:
             self._report_que = None
             self._report_con_c = None
 
-        port = kwargs.get('dev_port', None) if kwargs.get('dev_port', None) is not None else port
         baudrate = kwargs.get('baud', None) if kwargs.get('baud', None) is not None else baudrate
 
         filters = kwargs.get('filters', None)
@@ -120,61 +138,42 @@ class Swift(Pump, Keys, Gripper, Grove):
         self._handle_report_thread = None
 
         self.thread_pool_size = int(kwargs.get('callback_thread_pool_size', 0))
-        self._asyncio_loop = None
-        self._asyncio_loop_alive = False
-        self._asyncio_loop_thread = None
-        self.pool = None
+        self.callback_executor = CallbackExecutor(workers=self.thread_pool_size,
+                                                  max_queue_size=kwargs.get('callback_queue_size', 256),
+                                                  policy=kwargs.get('callback_queue_policy', 'inline'),
+                                                  name='uarm-callback')
+        self.callback_loop = EventLoopRunner(loop=kwargs.get('asyncio_loop', None), name='uarm-asyncio')
 
         self._thread_manage = ThreadManage()
 
         if not kwargs.get('do_not_open', False):
             self.connect()
 
-    if asyncio:
-        def _run_asyncio_loop(self):
-            # async def _asyncio_loop():
-            #     logger.debug('asyncio thread start ...')
-            #     while self.connected:
-            #         await asyncio.sleep(0.01)
-            #     logger.debug('asyncio thread exit ...')
-
-            @asyncio.coroutine
-            def _asyncio_loop():
-                logger.debug('asyncio thread start ...')
-                while self.connected:
-                    yield from asyncio.sleep(0.01)
-                logger.debug('asyncio thread exit ...')
-
-            try:
-                asyncio.set_event_loop(self._asyncio_loop)
-                self._asyncio_loop_alive = True
-                self._asyncio_loop.run_until_complete(_asyncio_loop())
-            except Exception as e:
-                pass
-
-            self._asyncio_loop_alive = False
-
-    def run_callback(self, callback, msg, enable_callback_thread=True):
-        if self._asyncio_loop_alive and enable_callback_thread:
-            try:
-                coroutine = self._async_run_callback(callback, msg)
-                asyncio.run_coroutine_threadsafe(coroutine, self._asyncio_loop)
-            except Exception as e:
-                pass
-        elif self.pool is not None and enable_callback_thread:
-            self.pool.apply_async(callback, args=(msg,))
+    def run_callback(self, callback, *args, enable_callback_thread=True):
+        # user callbacks usually arrive wrapped as functools.partial(_handle, _callback=callback)
+        user_callback = callback.keywords.get('_callback') if isinstance(callback, functools.partial) else callback
+        if asyncio.iscoroutinefunction(user_callback):
+            if user_callback is callback:
+                self.callback_loop.submit(callback, *args)
+            else:
+                # parse the result here, then await the coroutine function on the loop
+                functools.partial(callback, _callback=functools.partial(self.callback_loop.submit, user_callback))(*args)
+        elif enable_callback_thread and self.callback_loop.external:
+            self.callback_loop.submit(callback, *args)
+        elif enable_callback_thread:
+            self.callback_executor.submit(callback, *args)
         else:
-            callback(msg)
-
-    if asyncio:
-        @staticmethod
-        @asyncio.coroutine
-        def _async_run_callback(callback, msg):
-            yield from callback(msg)
-
-        # @staticmethod
-        # async def _async_run_callback(callback, msg):
-        #     await callback(msg)
+            callback(*args)
+
+    def _run_report_callbacks(self, report_id, msg, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        self.report_timestamps[report_id] = timestamp
+        for callback in list(self._report_callbacks.get(report_id, [])):
+            if (report_id, callback) in self._timestamp_callbacks:
+                self.run_callback(callback, msg, timestamp)
+            else:
+                self.run_callback(callback, msg)
 
     def _loop_handle(self):
         logger.debug('serial result handle thread start ...')
@@ -184,21 +183,17 @@ class Swift(Pump, Keys, Gripper, Grove):
                     if self._rx_que.empty():
                         self._rx_con_c.wait(0.01)
                     else:
-                        line = self._rx_que.get_nowait()
-                        self._handle_line(line)
+                        line, timestamp = self._rx_que.get_nowait()
+                        self._handle_line(line, timestamp)
             except:
                 pass
-        if self._asyncio_loop:
-            self._asyncio_loop.stop()
         if self._report_con_c:
             with self._report_con_c:
                 self._report_con_c.notifyAll()
 
         self.power_status = False
         try:
-            if REPORT_POWER_ID in self._report_callbacks.keys():
-                for callback in self._report_callbacks[REPORT_POWER_ID]:
-                    callback(self.power_status)
+            self._run_report_callbacks(REPORT_POWER_ID, self.power_status)
         except:
             pass
         logger.debug('serial result handle thread exit ...')
@@ -212,37 +207,18 @@ class Swift(Pump, Keys, Gripper, Grove):
                     if self._report_que.empty():
                         self._report_con_c.wait(0.5)
                     else:
-                        item = self._report_que.get_nowait()
-                        if self._asyncio_loop and self._asyncio_loop_alive:
-                            try:
-                                coroutine = self._async_run_callback(self._handle_report, item)
-                                asyncio.run_coroutine_threadsafe(coroutine, self._asyncio_loop)
-                            except Exception as e:
-                                pass
-                        elif self.pool is not None:
-                            self.pool.apply_async(self._handle_report, args=(item,))
-                        else:
-                            self._handle_report(item)
-
-                        # try:
-                        #     if self.pool is not None:
-                        #         self.pool.apply_async(self._handle_report, args=(item,))
-                        #     else:
-                        #         self._handle_report(item)
-                        # except Exception as e:
-                        #     logger.error(e)
+                        line, timestamp = self._report_que.get_nowait()
+                        self._handle_report(line, timestamp)
             except:
                 pass
         try:
-            if REPORT_POWER_ID in self._report_callbacks.keys():
-                for callback in self._report_callbacks[REPORT_POWER_ID]:
-                    callback(self.power_status)
+            self._run_report_callbacks(REPORT_POWER_ID, self.power_status)
         except:
             pass
         logger.debug('serial report handle thread exit ...')
         self._handle_report_thread = None
 
-    def _handle_line(self, line):
+    def _handle_line(self, line, timestamp=None):
         if len(line) < 2:
             return
         if line.startswith('$'):
@@ -251,19 +227,22 @@ class Swift(Pump, Keys, Gripper, Grove):
             try:
                 cnt = int(ret[0])
                 ret[1] = ret[1].upper()
-                if cnt in self.cmd_pend.keys():
-                    self.cmd_pend[cnt].finish(ret[1:])
+                cmd = self.cmd_pend.get(cnt)
+                if cmd is not None:
+                    if self.detect_lost_acks:
+                        self._check_lost_acks(cmd)
+                    cmd.finish(ret[1:], timestamp)
             except:
                 pass
         elif line.startswith('@'):
             if self._handle_report_thread:
                 if self._report_que.full():
                     self._report_que.get()
-                self._report_que.put(line)
+                self._report_que.put((line, timestamp))
                 with self._report_con_c:
                     self._report_con_c.notifyAll()
             else:
-                self._handle_report(line)
+                self._handle_report(line, timestamp)
         else:
             self._other_que.queue.clear()
             self._other_que.put(line)
@@ -281,7 +260,7 @@ class Swift(Pump, Keys, Gripper, Grove):
                 self._error = line
                 logger.error(line)
 
-    def _handle_report(self, line):
+    def _handle_report(self, line, timestamp=None):
         # print('report:', line)
         ret = line.split(' ')
         if ret[0] == protocol.REPORT_POWER_PREFIX:
@@ -290,9 +269,7 @@ class Swift(Pump, Keys, Gripper, Grove):
                 self.power_status = True
             elif ret[1] == 'V0':
                 self.power_status = False
-            if REPORT_POWER_ID in self._report_callbacks.keys():
-                for callback in self._report_callbacks[REPORT_POWER_ID]:
-                    callback(self.power_status)
+            self._run_report_callbacks(REPORT_POWER_ID, self.power_status, timestamp)
         elif ret[0] == protocol.REPORT_STOP_MOVE_PREFIX:
             ret[1] = ret[1].upper()
             if ret[1] == 'V1':
@@ -301,40 +278,29 @@ class Swift(Pump, Keys, Gripper, Grove):
                 self.is_moving = False
         elif ret[0] == protocol.REPORT_POSITION_PREFIX:
             self.report_position = list(map(lambda i: float(i[1:]), ret[1:]))
-            if REPORT_POSITION_ID in self._report_callbacks.keys():
-                for callback in self._report_callbacks[REPORT_POSITION_ID]:
-                    callback(self.report_position)
+            self._run_report_callbacks(REPORT_POSITION_ID, self.report_position, timestamp)
         elif ret[0] == protocol.REPORT_KEYS_PREFIX:
             # key_status == 1: short press
             # key_status == 2: long press
             if ret[1] == 'B0':
                 self._key0_status = ret[2][1:]
-                if REPORT_KEY0_ID in self._report_callbacks.keys():
-                    for callback in self._report_callbacks[REPORT_KEY0_ID]:
-                        callback(self._key0_status)
+                self._run_report_callbacks(REPORT_KEY0_ID, self._key0_status, timestamp)
             elif ret[1] == 'B1':
                 self._key1_status = ret[2][1:]
-                if REPORT_KEY1_ID in self._report_callbacks.keys():
-                    for callback in self._report_callbacks[REPORT_KEY1_ID]:
-                        callback(self._key1_status)
+                self._run_report_callbacks(REPORT_KEY1_ID, self._key1_status, timestamp)
         elif ret[0] == protocol.REPORT_LIMIT_SWITCH_PREFIX:
             ret[2] = ret[2].upper()
             if ret[2] == 'V1':
                 self._limit_switch_status = True
             elif ret[2] == 'V0':
                 self._limit_switch_status = False
-            if REPORT_LIMIT_SWITCH_ID in self._report_callbacks.keys():
-                for callback in self._report_callbacks[REPORT_LIMIT_SWITCH_ID]:
-                    callback(self._limit_switch_status)
+            self._run_report_callbacks(REPORT_LIMIT_SWITCH_ID, self._limit_switch_status, timestamp)
         elif ret[0] == protocol.REPORT_GROVE_PREFIX:
             pin = ret[1][1:]
             # grove_type = ret[2][1:]
             # report_grove_id = REPORT_GROVE + '_' + grove_type + '_' + pin
             report_grove_id = REPORT_GROVE + '_' + pin
-            if report_grove_id in self._report_callbacks.keys():
-                for callback in self._report_callbacks[report_grove_id]:
-                    # print('grove report = {}'.format(ret))
-                    callback(ret[2:])
+            self._run_report_callbacks(report_grove_id, ret[2:], timestamp)
 
     @property
     def connected(self):
@@ -392,13 +358,7 @@ class Swift(Pump, Keys, Gripper, Grove):
 
     def connect(self, port=None, baudrate=None, timeout=None):
         self.serial.connect(port, baudrate, timeout)
-        if self.thread_pool_size == 1 and asyncio is not None:
-            self._asyncio_loop = asyncio.new_event_loop()
-            self._asyncio_loop_thread = threading.Thread(target=self._run_asyncio_loop, daemon=True)
-            self._thread_manage.append(self._asyncio_loop_thread)
-            self._asyncio_loop_thread.start()
-        elif self.thread_pool_size > 1 and ThreadPool is not None:
-            self.pool = ThreadPool(self.thread_pool_size)
+        self.callback_executor.start()
         if self._report_que is not None:
             self._handle_report_thread = threading.Thread(target=self._loop_handle_report, daemon=True)
             self._handle_report_thread.start()
@@ -423,7 +383,10 @@ class Swift(Pump, Keys, Gripper, Grove):
         self._key1_status = False
         self.report_position = []
         self.is_moving = False
+        self._motion_until = 0
         self.cmd_pend = {}
+        self.cmd_pend_bytes = 0
+        self.rom_cache.invalidate()
 
         self._error = None
 
@@ -439,12 +402,8 @@ class Swift(Pump, Keys, Gripper, Grove):
 
     def clean(self):
         self._thread_manage.join(1)
-        if self.pool:
-            try:
-                self.pool.close()
-                self.pool.join()
-            except:
-                pass
+        self.callback_executor.shutdown(timeout=1)
+        self.callback_loop.shutdown(timeout=1)
 
     class Cmd:
         def __init__(self, owner, cnt, msg, timeout, callback=None, debug=True, enable_callback_thread=True):
@@ -454,34 +413,66 @@ class Swift(Pump, Keys, Gripper, Grove):
             self.debug = debug
             self.enable_callback_thread = enable_callback_thread
             self.ret = Queue()
-            self.timeout = timeout if isinstance(timeout, (int, float)) else self.owner.cmd_timeout
+            self.idempotent = msg.split(' ', 1)[0] in protocol.IDEMPOTENT_CMDS
+            self.timeout = timeout if isinstance(timeout, (int, float)) else self.owner._default_timeout(self.idempotent)
             self.callback = callback
             self.timer = None
+            self.seq = 0  # order of writing, unlike cnt it does not wrap
+            self.retries = 0
+            self.lost = False  # an ack for a later command arrived first
             self.start_time = time.time()
             self.count = 1
+            self.size = 0  # bytes on the serial line, including the terminator
+            self.tx_ns = None  # time.monotonic_ns() when written
+            self.rx_ns = None  # time.monotonic_ns() when the reply was read
 
         def start(self):
-            self.timer = threading.Timer(self.timeout, self.timeout_cb)
+            self.timer = threading.Timer(self.timeout, self.timeout_cb, args=(self.retries,))
             self.timer.start()
             self.start_time = time.time()
 
-        def timeout_cb(self):
-            self.delete()
+        def timeout_cb(self, attempt=None):
+            # the timer of an attempt that was already retried
+            if attempt is not None and attempt != self.retries:
+                return
+            if not self.delete():
+                return
+            if self.idempotent and self.retries < self.owner.cmd_retries and self.owner.connected:
+                # the ack of the newest query cannot be detected as lost by a later ack, send it again here
+                self.retries += 1
+                self.owner._ack_stats['retried'] += 1
+                self.owner._write_cmd(self)
+                return
+            self.owner._ack_stats['timeouts'] += 1
             # if self.debug:
             #     logger.warn('{} cmd "#{} {}" timeout'.format(self.owner.port, self.cnt, self.msg))
             self.ret.put(protocol.TIMEOUT)
 
         def delete(self):
-            try:
-                del self.owner.cmd_pend[self.cnt]
-            except:
-                pass
             with self.owner.cmd_pend_c:
+                # finish and timeout may both get here, only release the bytes once
+                removed = self.owner.cmd_pend.get(self.cnt) is self
+                if removed:
+                    del self.owner.cmd_pend[self.cnt]
+                    self.owner.cmd_pend_bytes -= self.size
                 self.owner.cmd_pend_c.notifyAll()
-
-        def finish(self, msg):
+                return removed
+
+        @property
+        def latency(self):
+            """
+            Seconds from writing the command to reading its reply, or None
+            """
+            if self.tx_ns is None or self.rx_ns is None:
+                return None
+            return (self.rx_ns - self.tx_ns) / 1e9
+
+        def finish(self, msg, timestamp=None):
             self.timer.cancel()
-            self.delete()
+            if not self.delete():
+                return
+            self.rx_ns = timestamp if timestamp is not None else time.monotonic_ns()
+            self.owner._update_latency(self)
             if callable(self.callback):
                 self.owner.run_callback(self.callback, msg, enable_callback_thread=self.enable_callback_thread)
             self.ret.put(msg)
@@ -491,6 +482,95 @@ class Swift(Pump, Keys, Gripper, Grove):
                 time.sleep(0.002)
             return self.ret.get()
 
+    def _can_stream(self, size):
+        if not self.cmd_pend:
+            return True
+        if not self.stream_bytes:
+            return len(self.cmd_pend) < self.cmd_pend_size
+        return len(self.cmd_pend) < self.planner_buffer_size and self.cmd_pend_bytes + size <= self.rx_buffer_size
+
+    def _update_latency(self, cmd):
+        latency = cmd.latency
+        if latency is None or latency < 0:
+            return
+        stats = self._latency
+        stats['count'] += 1
+        stats['last'] = latency
+        stats['total'] += latency
+        stats['min'] = latency if stats['min'] is None else min(stats['min'], latency)
+        stats['max'] = latency if stats['max'] is None else max(stats['max'], latency)
+        stats['ewma'] = latency if stats['ewma'] is None else stats['ewma'] * 0.9 + latency * 0.1
+
+    def _check_lost_acks(self, cmd):
+        # every command written before cmd is still waiting, its ack (or the command itself) was lost
+        with self.cmd_pend_c:
+            lost = sorted([c for c in self.cmd_pend.values() if c.seq < cmd.seq], key=lambda c: c.seq)
+        for c in lost:
+            c.lost = True
+            c.timer.cancel()
+            if not c.delete():
+                continue
+            self._ack_stats['lost'] += 1
+            if c.idempotent and c.retries < self.cmd_retries:
+                c.retries += 1
+                self._ack_stats['retried'] += 1
+                logger.debug('ack of cmd "#{} {}" lost, retry {}'.format(c.cnt, c.msg, c.retries))
+                # write from another thread, the window may be full until this thread handles more acks
+                threading.Thread(target=self._write_cmd, args=(c,), daemon=True).start()
+            else:
+                logger.warning('ack of cmd "#{} {}" lost'.format(c.cnt, c.msg))
+                c.ret.put(protocol.TIMEOUT)
+
+    def _latency_timeout(self):
+        # a few times the usual round trip, once enough round trips are known
+        if self._latency['count'] < 10:
+            return self.cmd_timeout
+        return min(self.cmd_timeout, max(0.2, self._latency['ewma'] * 10))
+
+    def _default_timeout(self, idempotent=False):
+        if not self.adaptive_timeout:
+            return self.cmd_timeout
+        # when the firmware command queue is full, a command also waits for the moves queued before it
+        queued = max(self._motion_until - time.monotonic(), 0)
+        return (self._latency_timeout() if idempotent else self.cmd_timeout) + queued
+
+    def _motion_timeout(self, distance, speed, default=10):
+        now = time.monotonic()
+        # speed is the F value before the speed factor, mm/min as the wrapper sends it
+        duration = distance * 60.0 / speed if speed > 0 else 0
+        queued = max(self._motion_until - now, 0)
+        self._motion_until = now + queued + duration
+        if not self.adaptive_timeout or speed <= 0:
+            return default
+        return self._latency_timeout() + queued + duration * 1.5 + 0.5
+
+    @property
+    def ack_stats(self):
+        """
+        Acks lost (detected by a later ack arriving first), queries sent again, and commands timed out
+        """
+        return dict(self._ack_stats)
+
+    @property
+    def latency_stats(self):
+        """
+        Command round trip in seconds, from writing a command to reading its reply
+        """
+        stats = dict(self._latency)
+        stats['avg'] = stats['total'] / stats['count'] if stats['count'] else None
+        return stats
+
+    @property
+    def stream_stats(self):
+        with self.cmd_pend_c:
+            stats = dict(self._stream_stats)
+            stats.update({
+                'stream_bytes': self.stream_bytes,
+                'pending_bytes': self.cmd_pend_bytes,
+                'pending_cmds': len(self.cmd_pend),
+            })
+            return stats
+
     @catch_exception
     def send_cmd_async(self, msg=None, timeout=None, callback=None, debug=True, enable_callback_thread=True):
         if not isinstance(msg, str) or not msg:
@@ -506,24 +586,42 @@ class Swift(Pump, Keys, Gripper, Grove):
             if len(data):
                 speed = float(data[0][1:])
                 msg = msg.replace(data[0], 'F{}'.format(speed * self._speed_factor))
+        cmd = self.Cmd(self, self._cnt, msg, timeout, callback, debug=debug, enable_callback_thread=enable_callback_thread)
+        self._write_cmd(cmd)
+        return cmd
+
+    @catch_exception
+    def _write_cmd(self, cmd):
         with self._cnt_lock:
+            cmd.cnt = self._cnt
+            ser_msg = '#{cnt} {msg}'.format(cnt=self._cnt, msg=cmd.msg)
+            cmd.size = len(ser_msg) + 1
             with self.cmd_pend_c:
-                while len(self.cmd_pend) >= self.cmd_pend_size:
-                    self.cmd_pend_c.wait(0.01)
-            cmd = self.Cmd(self, self._cnt, msg, timeout, callback, debug=debug, enable_callback_thread=enable_callback_thread)
-            self.cmd_pend[self._cnt] = cmd
+                if not self._can_stream(cmd.size):
+                    wait_start = time.time()
+                    self._stream_stats['waits'] += 1
+                    while not self._can_stream(cmd.size):
+                        self.cmd_pend_c.wait(0.01)
+                    self._stream_stats['wait_time'] += time.time() - wait_start
+                self.cmd_pend[self._cnt] = cmd
+                self.cmd_pend_bytes += cmd.size
+                if self.cmd_pend_bytes > self._stream_stats['bytes_high_water']:
+                    self._stream_stats['bytes_high_water'] = self.cmd_pend_bytes
+                if len(self.cmd_pend) > self._stream_stats['cmds_high_water']:
+                    self._stream_stats['cmds_high_water'] = len(self.cmd_pend)
+                self._seq += 1
+                cmd.seq = self._seq
             # self.serial.write({
             #     'cmd': cmd,
             #     'msg': '#{cnt} {msg}'.format(cnt=self._cnt, msg=msg)
             # })
             cmd.start()
-            ser_msg = '#{cnt} {msg}'.format(cnt=self._cnt, msg=msg)
             logger.debug(ser_msg)
+            cmd.tx_ns = time.monotonic_ns()
             self.serial.write(ser_msg)
             self._cnt += 1
             if self._cnt == 10000:
                 self._cnt = 1
-        return cmd
 
     @catch_exception
     def send_cmd_sync(self, msg=None, timeout=None, no_cnt=False, debug=True):
@@ -672,7 +770,7 @@ class Swift(Pump, Keys, Gripper, Grove):
             self.send_cmd_async(cmd, timeout=timeout, callback=functools.partial(_handle, _callback=callback))
 
     @catch_exception
-    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=10, callback=None, cmd='G0'):
+    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=None, callback=None, cmd='G0'):
         def _handle(_ret, _callback=None):
             _ret = _ret[0] if _ret != protocol.TIMEOUT else _ret
             if callable(_callback):
@@ -697,7 +795,9 @@ class Swift(Pump, Keys, Gripper, Grove):
             except:
                 speed = self._position[3]
             cmd = protocol.SET_POSITION_RELATIVE.format(x, y, z, speed)
+            distance = math.sqrt(x * x + y * y + z * z)
         else:
+            last = self._position[:3]
             try:
                 self._position[0] = float(x)
             except:
@@ -715,8 +815,11 @@ class Swift(Pump, Keys, Gripper, Grove):
             except:
                 pass
             cmd = protocol.SET_POSITION.format(cmd, *self._position)
+            distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(self._position[:3], last)))
+            speed = self._position[3]
+        motion_timeout = self._motion_timeout(distance, speed)
         if timeout is None:
-            timeout = 10
+            timeout = motion_timeout
         if wait:
             ret = self.send_cmd_sync(cmd, timeout=timeout)
             return _handle(ret)
@@ -1128,6 +1231,7 @@ class Swift(Pump, Keys, Gripper, Grove):
 
         if data_type is None:
             data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        self.rom_cache.written(address, data_type)
         cmd = protocol.SET_EEPROM.format(address, data_type, data)
         if wait:
             ret = self.send_cmd_sync(cmd, timeout=timeout)
@@ -1153,9 +1257,11 @@ class Swift(Pump, Keys, Gripper, Grove):
         else:
             self.send_cmd_async(cmd, timeout=timeout, callback=functools.partial(_handle, _callback=callback))
 
-    def _register_report_callback(self, report_id, callback):
+    def _register_report_callback(self, report_id, callback, with_timestamp=False):
         if report_id not in self._report_callbacks.keys():
             self._report_callbacks[report_id] = []
+        if callable(callback) and with_timestamp:
+            self._timestamp_callbacks.add((report_id, callback))
         if callable(callback) and callback not in self._report_callbacks[report_id]:
             self._report_callbacks[report_id].append(callback)
             return True
@@ -1168,17 +1274,19 @@ class Swift(Pump, Keys, Gripper, Grove):
         if report_id in self._report_callbacks.keys():
             if callback is None:
                 self._report_callbacks[report_id].clear()
+                self._timestamp_callbacks = set(item for item in self._timestamp_callbacks if item[0] != report_id)
             elif callback in self._report_callbacks[report_id]:
                 self._report_callbacks[report_id].remove(callback)
+                self._timestamp_callbacks.discard((report_id, callback))
 
-    def register_power_callback(self, callback=None):
-        return self._register_report_callback(REPORT_POWER_ID, callback)
+    def register_power_callback(self, callback=None, with_timestamp=False):
+        return self._register_report_callback(REPORT_POWER_ID, callback, with_timestamp=with_timestamp)
 
     def release_power_callback(self, callback=None):
         return self._release_report_callback(REPORT_POWER_ID, callback)
 
-    def register_report_position_callback(self, callback=None):
-        return self._register_report_callback(REPORT_POSITION_ID, callback)
+    def register_report_position_callback(self, callback=None, with_timestamp=False):
+        return self._register_report_callback(REPORT_POSITION_ID, callback, with_timestamp=with_timestamp)
 
     def release_report_position_callback(self, callback=None):
         return self._release_report_callback(REPORT_POSITION_ID, callback)
@@ -1226,6 +1334,7 @@ class Swift(Pump, Keys, Gripper, Grove):
                     while self.connected and self.is_moving and time.time() - start_time < timeout:
                         self.get_is_moving(timeout=1, debug=False)
                     if not self.is_moving:
+                        self._motion_until = 0
                         return protocol.OK
                     else:
                         self.is_moving = False
@@ -1246,6 +1355,7 @@ class Swift(Pump, Keys, Gripper, Grove):
                 while self.connected and self.is_moving:
                     self.get_is_moving(timeout=1, debug=False)
                 self.is_moving = False
+                self._motion_until = 0
             return protocol.OK
 
     @catch_exception
@@ -0,0 +1,240 @@
+import struct
+import threading
+from collections import OrderedDict
+from . import protocol
+
+
+# little-endian AVR layout of the types understood by M2211/M2212
+EEPROM_DATA_TYPE_FORMAT = {
+    protocol.EEPROM_DATA_TYPE_BYTE: '<B',
+    protocol.EEPROM_DATA_TYPE_INTEGER: '<h',
+    protocol.EEPROM_DATA_TYPE_FLOAT: '<f',
+}
+
+
+def _data_type_size(data_type):
+    if data_type not in EEPROM_DATA_TYPE_FORMAT:
+        raise ValueError('Unknown EEPROM data type: {}'.format(data_type))
+    return struct.calcsize(EEPROM_DATA_TYPE_FORMAT[data_type])
+
+
+def _overlaps(address_a, size_a, address_b, size_b):
+    return address_a < address_b + size_b and address_b < address_a + size_a
+
+
+class EEPROMRecord(object):
+    def __init__(self, fields):
+        """
+        Layout of a small struct, stored as consecutive typed fields
+        :param fields: list of (name, data_type) tuples, in the order they are stored
+        """
+        self.fields = []
+        offset = 0
+        for name, data_type in fields:
+            self.fields.append((name, data_type, offset))
+            offset += _data_type_size(data_type)
+        self.size = offset
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.fields]
+
+    def items(self, address):
+        return [(address + offset, data_type) for _, data_type, offset in self.fields]
+
+
+class EEPROMCache(object):
+    def __init__(self, arm, timeout=None):
+        """
+        Write-back cache in front of the device EEPROM (M2211/M2212)
+        Reads that miss the cache are sent as one pipelined batch, writes are kept
+        as dirty entries until sync() sends them as one pipelined batch.
+        The number of commands in flight is bounded by the arm's cmd_pend_size.
+        :param arm: instance of Swift
+        :param timeout: timeout of each EEPROM command, default is use the default cmd timeout
+        """
+        self.arm = arm
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._values = {}  # (address, data_type) -> value
+        self._dirty = OrderedDict()  # (address, data_type) -> value, in write order
+
+    @property
+    def dirty(self):
+        with self._lock:
+            return len(self._dirty) > 0
+
+    def invalidate(self, address=None, size=1):
+        """
+        Forget cached values, dirty writes are kept
+        :param address: start address, default is None (forget everything)
+        :param size: number of bytes from the start address
+        """
+        with self._lock:
+            if address is None:
+                self._values.clear()
+                return
+            for key in list(self._values.keys()):
+                if _overlaps(key[0], _data_type_size(key[1]), address, size):
+                    del self._values[key]
+
+    def written(self, address, data_type=None):
+        """
+        A value was written to the device without the cache (set_rom_data), forget cached values
+        and drop pending writes that overlap it, so sync() does not overwrite it with older data
+        :param address: 0 - 64K byte
+        :param data_type: 4: EEPROM_DATA_TYPE_FLOAT, 2: EEPROM_DATA_TYPE_INTEGER, 1: EEPROM_DATA_TYPE_BYTE
+        """
+        if data_type is None:
+            data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        size = _data_type_size(data_type)
+        with self._lock:
+            for key in list(self._dirty.keys()):
+                if _overlaps(key[0], _data_type_size(key[1]), address, size):
+                    del self._dirty[key]
+            self.invalidate(address, size)
+
+    def discard(self):
+        """
+        Drop all dirty writes without sending them
+        """
+        with self._lock:
+            for key in self._dirty.keys():
+                self._values.pop(key, None)
+            self._dirty.clear()
+
+    def _parse(self, ret, data_type):
+        if ret == protocol.TIMEOUT or not isinstance(ret, list) or ret[0] != protocol.OK or len(ret) < 2:
+            return protocol.TIMEOUT if ret == protocol.TIMEOUT else None
+        if data_type == protocol.EEPROM_DATA_TYPE_FLOAT:
+            return float(ret[1][1:])
+        return int(ret[1][1:])
+
+    def _send_batch(self, cmds):
+        pending = []
+        for msg in cmds:
+            pending.append(self.arm.send_cmd_async(msg, timeout=self.timeout, debug=False))
+        return [cmd.get_ret() if isinstance(cmd, self.arm.Cmd) else protocol.TIMEOUT for cmd in pending]
+
+    def _overlaps_dirty(self, items):
+        for address, data_type in items:
+            if (address, data_type) in self._dirty:
+                continue
+            for dirty_address, dirty_type in self._dirty.keys():
+                if _overlaps(address, _data_type_size(data_type), dirty_address, _data_type_size(dirty_type)):
+                    return True
+        return False
+
+    def _read_many(self, items, refresh=False):
+        with self._lock:
+            # a read that overlaps a pending write of another type must see the written bytes
+            if self._overlaps_dirty(items):
+                self.sync()
+            misses = [key for key in items if refresh or key not in self._values]
+            misses = list(OrderedDict.fromkeys(misses))
+            if misses:
+                rets = self._send_batch([protocol.GET_EEPROM.format(a, t) for a, t in misses])
+                for key, ret in zip(misses, rets):
+                    value = self._parse(ret, key[1])
+                    if isinstance(value, (int, float)):
+                        self._values[key] = value
+            return [self._values.get(key, protocol.TIMEOUT) for key in items]
+
+    def read(self, address, data_type=None, refresh=False):
+        """
+        Read a single value, from the cache when possible
+        :param address: 0 - 64K byte
+        :param data_type: 4: EEPROM_DATA_TYPE_FLOAT, 2: EEPROM_DATA_TYPE_INTEGER, 1: EEPROM_DATA_TYPE_BYTE
+        :param refresh: True/False, default is False, if True always read from the device
+        :return: int or float value or 'TIMEOUT'
+        """
+        if data_type is None:
+            data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        return self._read_many([(address, data_type)], refresh=refresh)[0]
+
+    def read_range(self, address, count, data_type=None, refresh=False):
+        """
+        Read consecutive values of the same type, missing values are read in one pipelined batch
+        :param address: start address
+        :param count: number of values
+        :param data_type: 4: EEPROM_DATA_TYPE_FLOAT, 2: EEPROM_DATA_TYPE_INTEGER, 1: EEPROM_DATA_TYPE_BYTE
+        :param refresh: True/False, default is False, if True always read from the device
+        :return: list of int or float values ('TIMEOUT' for values that could not be read)
+        """
+        if data_type is None:
+            data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        size = _data_type_size(data_type)
+        return self._read_many([(address + i * size, data_type) for i in range(count)], refresh=refresh)
+
+    def write(self, address, data, data_type=None):
+        """
+        Write a single value to the cache, it is sent to the device on the next sync()
+        :param address: 0 - 64K byte
+        :param data: data
+        :param data_type: 4: EEPROM_DATA_TYPE_FLOAT, 2: EEPROM_DATA_TYPE_INTEGER, 1: EEPROM_DATA_TYPE_BYTE
+        """
+        if data_type is None:
+            data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        key = (address, data_type)
+        data = float(data) if data_type == protocol.EEPROM_DATA_TYPE_FLOAT else int(data)
+        with self._lock:
+            if self._values.get(key) == data and key not in self._dirty:
+                return
+            self.invalidate(address, _data_type_size(data_type))
+            self._values[key] = data
+            self._dirty.pop(key, None)
+            self._dirty[key] = data
+
+    def write_range(self, address, data, data_type=None):
+        """
+        Write consecutive values of the same type to the cache
+        :param address: start address
+        :param data: list of values
+        :param data_type: 4: EEPROM_DATA_TYPE_FLOAT, 2: EEPROM_DATA_TYPE_INTEGER, 1: EEPROM_DATA_TYPE_BYTE
+        """
+        if data_type is None:
+            data_type = protocol.EEPROM_DATA_TYPE_BYTE
+        size = _data_type_size(data_type)
+        for i, value in enumerate(data):
+            self.write(address + i * size, value, data_type=data_type)
+
+    def sync(self):
+        """
+        Send all dirty writes to the device as one pipelined batch
+        :return: 'OK' or the first failed result, failed writes stay dirty
+        """
+        with self._lock:
+            if not self._dirty:
+                return protocol.OK
+            items = list(self._dirty.items())
+            rets = self._send_batch([protocol.SET_EEPROM.format(a, t, v) for (a, t), v in items])
+            result = protocol.OK
+            for (key, value), ret in zip(items, rets):
+                ret = ret[0] if ret != protocol.TIMEOUT else ret
+                if ret == protocol.OK:
+                    if self._dirty.get(key) == value:
+                        del self._dirty[key]
+                elif result == protocol.OK:
+                    result = ret
+            return result
+
+    def read_record(self, address, record, refresh=False):
+        """
+        Read all fields of a record in one pipelined batch
+        :param address: start address of the record
+        :param record: instance of EEPROMRecord
+        :param refresh: True/False, default is False, if True always read from the device
+        :return: dict of field name to value
+        """
+        return dict(zip(record.names, self._read_many(record.items(address), refresh=refresh)))
+
+    def write_record(self, address, record, values):
+        """
+        Write the fields of a record to the cache, it is sent to the device on the next sync()
+        :param address: start address of the record
+        :param record: instance of EEPROMRecord
+        :param values: dict of field name to value, missing fields are not written
+        """
+        for name, data_type, offset in record.fields:
+            if name in values:
+                self.write(address + offset, values[name], data_type=data_type)
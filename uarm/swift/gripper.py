@@ -32,11 +32,14 @@ class Gripper(object):
             if check:
                 start = time.time()
                 timeout = timeout if isinstance(timeout, (int, float)) and timeout > 0 else self.cmd_timeout
+                interval = 0.01
                 while time.time() - start < timeout:
                     catch = self.get_gripper_catch()
                     if isinstance(catch, int) and (catch == 2 or catch == 0):
                         break
-                    time.sleep(0.3)
+                    # poll fast at first, then back off to at most 0.3s
+                    time.sleep(interval)
+                    interval = min(interval * 2, 0.3)
             return _handle(ret)
         else:
             self.send_cmd_async(cmd, timeout=timeout, callback=functools.partial(_handle, _callback=callback))
@@ -16,14 +16,14 @@ class Keys(object):
     def __init__(self):
         pass
 
-    def register_key0_callback(self, callback=None):
-        return self._register_report_callback(REPORT_KEY0_ID, callback)
+    def register_key0_callback(self, callback=None, with_timestamp=False):
+        return self._register_report_callback(REPORT_KEY0_ID, callback, with_timestamp=with_timestamp)
 
     def release_key0_callback(self, callback=None):
         return self._release_report_callback(REPORT_KEY0_ID, callback)
 
-    def register_key1_callback(self, callback=None):
-        return self._register_report_callback(REPORT_KEY1_ID, callback)
+    def register_key1_callback(self, callback=None, with_timestamp=False):
+        return self._register_report_callback(REPORT_KEY1_ID, callback, with_timestamp=with_timestamp)
 
     def release_key1_callback(self, callback=None):
         return self._release_report_callback(REPORT_KEY1_ID, callback)
@@ -7,11 +7,187 @@
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# the last part of a scheduled start is spun instead of slept, sleep() may overshoot by a few ms
+SPIN_BEFORE_START = 0.002
+# default seconds an arm waits at a barrier for the others, after its own flush
+BARRIER_TIMEOUT = 60
+
+
+def wait_until(start_at):
+    """
+    Wait until a time.monotonic() timestamp
+    """
+    while True:
+        remaining = start_at - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_BEFORE_START:
+            time.sleep(remaining - SPIN_BEFORE_START)
+
+
+class FleetResult(object):
+    def __init__(self, size):
+        """
+        Per-arm results of one fleet call, in the order of the arms
+        """
+        self.results = [None] * size
+        self.errors = {}
+        self.started = [None] * size  # time.monotonic() when each arm started the call
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def start_spread(self):
+        """
+        Seconds between the first and the last arm starting the call
+        """
+        started = [t for t in self.started if t is not None]
+        return max(started) - min(started) if started else 0
+
+    def raise_errors(self):
+        if self.errors:
+            index, error = sorted(self.errors.items())[0]
+            raise RuntimeError('arm {} failed: {!r} ({} arms failed)'.format(index, error, len(self.errors)))
+        return self
+
+
+class FleetController(object):
+    def __init__(self, swifts):
+        """
+        Run commands on many arms concurrently, with one worker thread per arm
+        Calls on the same arm run in the order they are submitted
+        :param swifts: list of Swift, SwiftAPI or SwiftAPIWrapper
+        """
+        self.swifts = list(swifts)
+        self._workers = [ThreadPoolExecutor(max_workers=1) for _ in self.swifts]
+
+    def __len__(self):
+        return len(self.swifts)
+
+    def close(self):
+        for worker in self._workers:
+            worker.shutdown(wait=True)
+
+    @staticmethod
+    def start_time(delay=0.05):
+        """
+        :param delay: seconds from now, long enough for every worker to be ready
+        :return: a time.monotonic() timestamp to pass as start_at
+        """
+        return time.monotonic() + delay
+
+    def _run(self, index, func, args, kwargs, start_at, result):
+        if start_at is not None:
+            wait_until(start_at)
+        result.started[index] = time.monotonic()
+        return func(self.swifts[index], *args, **kwargs)
+
+    def _gather(self, futures, result, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for index, future in futures:
+            try:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                result.results[index] = future.result(remaining)
+            except Exception as e:
+                result.errors[index] = e
+        return result
+
+    def submit(self, func, args_list=None, kwargs_list=None, arms=None, start_at=None):
+        """
+        Submit func(arm, *args, **kwargs) to the worker of each arm, without waiting
+        :param func: callable, gets the arm as first argument
+        :param args_list: list of args tuples, one for each arm, default is no args
+        :param kwargs_list: list of kwargs dicts, one for each arm, default is no kwargs
+        :param arms: indexes of the arms, default is all arms
+        :param start_at: time.monotonic() timestamp, all arms start the call at this time
+        :return: (futures, result), pass both to gather()
+        """
+        arms = list(range(len(self.swifts))) if arms is None else list(arms)
+        result = FleetResult(len(self.swifts))
+        futures = []
+        for i, index in enumerate(arms):
+            args = args_list[i] if args_list else ()
+            kwargs = kwargs_list[i] if kwargs_list else {}
+            future = self._workers[index].submit(self._run, index, func, args, kwargs, start_at, result)
+            futures.append((index, future))
+        return futures, result
+
+    def gather(self, futures, result, timeout=None):
+        """
+        Wait for submitted calls
+        :return: FleetResult, errors are collected, not raised
+        """
+        return self._gather(futures, result, timeout)
+
+    def call(self, cmd, *args, arms=None, start_at=None, join_timeout=None, **kwargs):
+        """
+        Call the same method with the same arguments on each arm, concurrently
+        :param cmd: method name, like 'set_position'
+        :param arms: indexes of the arms, default is all arms
+        :param start_at: time.monotonic() timestamp, all arms start the call at this time
+        :param join_timeout: maximum time to wait for all arms
+        :return: FleetResult
+        """
+        if arms is not None:
+            arms = list(arms)
+        size = len(self.swifts) if arms is None else len(arms)
+        return self.call_each(cmd, [args] * size, [kwargs] * size, arms=arms, start_at=start_at,
+                              join_timeout=join_timeout)
+
+    def call_each(self, cmd, args_list=None, kwargs_list=None, arms=None, start_at=None, join_timeout=None):
+        """
+        Call the same method with different arguments on each arm, concurrently
+        Example (coordinated move, all arms start within a few ms):
+            fleet.call_each('set_position', kwargs_list=[{'x': 200}, {'x': 180}],
+                            start_at=fleet.start_time(), wait=True)
+        :param cmd: method name
+        :param args_list: list of args tuples, one for each arm
+        :param kwargs_list: list of kwargs dicts, one for each arm
+        :param join_timeout: maximum time to wait for all arms
+        :return: FleetResult
+        """
+        def _call(swift, *args, **kwargs):
+            return getattr(swift, cmd)(*args, **kwargs)
+        futures, result = self.submit(_call, args_list, kwargs_list, arms=arms, start_at=start_at)
+        return self.gather(futures, result, join_timeout)
+
+    def barrier(self, flush=True, wait=True, timeout=BARRIER_TIMEOUT):
+        """
+        Make every arm wait for the others: calls submitted after the barrier start only when all arms reached it
+        If the flush of one arm raises, the barrier is broken and the other arms fail with BrokenBarrierError
+        :param flush: if True, each arm first waits for its queued motion to stop (flush_cmd(wait_stop=True))
+        :param wait: if True, also block the caller until all arms reached the barrier
+        :param timeout: maximum time to wait at the barrier, the barrier is broken on timeout,
+            default is BARRIER_TIMEOUT seconds, None waits forever
+        :return: FleetResult if wait is True else (futures, result)
+        """
+        sync = threading.Barrier(len(self.swifts), timeout=timeout)
+
+        def _barrier(swift):
+            if flush:
+                try:
+                    swift.flush_cmd(wait_stop=True)
+                except Exception:
+                    sync.abort()
+                    raise
+            sync.wait()
+            return time.monotonic()
+        futures, result = self.submit(_barrier)
+        if not wait:
+            return futures, result
+        return self.gather(futures, result)
 
 
 class MultiSwiftAPI(object):
     def __init__(self, swifts):
         self.swifts = swifts
+        self.fleet = FleetController(swifts)
         self.multi_cmd_sync('waiting_ready')
 
     def multi_reset(self, speed=10000):
@@ -20,11 +196,8 @@ class MultiSwiftAPI(object):
 
     def multi_cmd_sync(self, cmd, *args, **kwargs):
         kwargs.pop('wait', False)
-        for swift in self.swifts:
-            swift_cmd = getattr(swift, cmd)
-            swift_cmd(*args, wait=False, **kwargs)
+        self.fleet.call(cmd, *args, wait=False, **kwargs).raise_errors()
         self.multi_flush_cmd(kwargs.get('timeout', None))
 
     def multi_flush_cmd(self, timeout=None):
-        for swift in self.swifts:
-            swift.flush_cmd(timeout=timeout, wait_stop=True)
+        self.fleet.call('flush_cmd', timeout=timeout, wait_stop=True).raise_errors()
@@ -97,5 +97,11 @@ CHECK_MOVE_LIMIT = "M2222 X{} Y{} Z{} P{}"
 SET_BLUETOOTH = "M2234 V{}"
 SET_BLUETOOTH_NAME = "M2245 V{}"
 
+# Cmds without side effects, they are sent again when their ack is lost
+IDEMPOTENT_CMDS = (
+    "P2200", "P2201", "P2202", "P2203", "P2204", "P2205", "P2220", "P2221", "P2231", "P2232", "P2233", "P2234",
+    "P2240", "P2241", "P2400", "M2200", "M2203", "M2211", "M2220", "M2221", "M2222",
+)
+
 
 
@@ -17,8 +17,8 @@ class Pump(object):
     def __init__(self):
         pass
 
-    def register_limit_switch_callback(self, callback=None):
-        return self._register_report_callback(REPORT_LIMIT_SWITCH_ID, callback)
+    def register_limit_switch_callback(self, callback=None, with_timestamp=False):
+        return self._register_report_callback(REPORT_LIMIT_SWITCH_ID, callback, with_timestamp=with_timestamp)
 
     def release_limit_switch_callback(self, callback=None):
         return self._release_report_callback(REPORT_LIMIT_SWITCH_ID, callback)
@@ -39,11 +39,14 @@ class Pump(object):
             if check:
                 start = time.time()
                 timeout = timeout if isinstance(timeout, (int, float)) and timeout > 0 else self.cmd_timeout
+                interval = 0.01
                 while time.time() - start < timeout:
                     grabbed = self.get_pump_status()
                     if isinstance(grabbed, int) and (grabbed == 2 or grabbed == 0):
                         break
-                    time.sleep(0.3)
+                    # poll fast at first, then back off to at most 0.3s
+                    time.sleep(interval)
+                    interval = min(interval * 2, 0.3)
             return _handle(ret)
             # ret = self.send_cmd_sync(cmd, timeout=timeout)
             # return _handle(ret)
@@ -0,0 +1,256 @@
+import array
+import functools
+import logging
+import threading
+import time
+from . import protocol
+
+
+logger = logging.getLogger('uarm.swift.sampler')
+
+SAMPLE_ANALOG = 'analog'
+SAMPLE_DIGITAL = 'digital'
+SAMPLE_GROVE = 'grove'
+
+
+class SampleBuffer(object):
+    def __init__(self, capacity=1000):
+        """
+        Ring buffer of timestamped samples, the oldest samples are overwritten when full
+        :param capacity: maximum number of samples kept
+        """
+        self.capacity = max(int(capacity), 1)
+        self._times = array.array('d', bytes(8 * self.capacity))
+        self._values = array.array('d', bytes(8 * self.capacity))
+        self._start = 0
+        self._size = 0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def total(self):
+        """
+        Number of samples appended since the last clear(), including overwritten ones
+        """
+        return self._total
+
+    def append(self, timestamp, value):
+        with self._lock:
+            index = (self._start + self._size) % self.capacity
+            self._times[index] = timestamp
+            self._values[index] = value
+            if self._size < self.capacity:
+                self._size += 1
+            else:
+                self._start = (self._start + 1) % self.capacity
+            self._total += 1
+
+    def read(self, count=None):
+        """
+        Read the newest samples, oldest first
+        :param count: number of samples, default is None (all samples in the buffer)
+        :return: (times, values), two array.array('d') of the same length, times are time.monotonic() seconds
+        """
+        with self._lock:
+            count = self._size if count is None else min(int(count), self._size)
+            first = (self._start + self._size - count) % self.capacity
+            end = first + count
+            if end <= self.capacity:
+                return self._times[first:end], self._values[first:end]
+            end -= self.capacity
+            return self._times[first:] + self._times[:end], self._values[first:] + self._values[:end]
+
+    def latest(self):
+        """
+        :return: (time, value) of the newest sample, or None if empty
+        """
+        with self._lock:
+            if not self._size:
+                return None
+            index = (self._start + self._size - 1) % self.capacity
+            return self._times[index], self._values[index]
+
+    def clear(self):
+        with self._lock:
+            self._start = 0
+            self._size = 0
+            self._total = 0
+
+
+class Sampler(object):
+    def __init__(self, arm, analog=None, digital=None, grove=None, rate=10, capacity=1000, timeout=None):
+        """
+        Sample analog pins, digital pins and Grove ports at a target rate, into timestamped ring buffers
+        Analog and digital pins are queried each period as one pipelined batch (P2241/P2240),
+        the window of commands in flight is bounded by the arm's cmd_pend_size, and the answers are stored
+        when the next batch is due, stamped with the time their reply was read. Grove ports use the
+        firmware report mode (M2306), so they cost no round trips.
+        :param arm: instance of Swift
+        :param analog: list of analog pins
+        :param digital: list of digital pins
+        :param grove: list of Grove ports, they must be set up with grove_init() first
+        :param rate: target samples per second of each channel
+        :param capacity: number of samples kept for each channel
+        :param timeout: timeout of each query, default is one period
+        """
+        assert isinstance(rate, (int, float)) and rate > 0
+        self.arm = arm
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.timeout = timeout if isinstance(timeout, (int, float)) else max(self.period, 0.1)
+        self.channels = {}
+        for kind, pins in ((SAMPLE_ANALOG, analog), (SAMPLE_DIGITAL, digital), (SAMPLE_GROVE, grove)):
+            for pin in pins or []:
+                self.channels[(kind, pin)] = SampleBuffer(capacity)
+        self.overruns = 0
+        self.timeouts = 0
+        self._pending = []
+        self._grove_callbacks = {}
+        self._alive = False
+        self._thread = None
+
+    @property
+    def alive(self):
+        return self._alive
+
+    def _queries(self):
+        for kind, pin in self.channels.keys():
+            if kind == SAMPLE_ANALOG:
+                yield (kind, pin), protocol.GET_ANALOG.format(pin)
+            elif kind == SAMPLE_DIGITAL:
+                yield (kind, pin), protocol.GET_DIGITAL.format(pin)
+
+    def _on_result(self, key, ret, timestamp):
+        # the reply is stamped when it was read, convert to time.monotonic() seconds
+        timestamp /= 1e9
+        if ret[0] != protocol.OK or len(ret) < 2:
+            return
+        try:
+            value = int(ret[1][1:]) if key[0] == SAMPLE_ANALOG else int(ret[1][1])
+        except ValueError:
+            return
+        self.channels[key].append(timestamp, value)
+
+    def _on_grove(self, key, ret, timestamp):
+        # the report is stamped when it was read, convert to time.monotonic() seconds
+        timestamp /= 1e9
+        # ret is the report without its prefix and port, like ['N3', 'V583']
+        for field in ret[1:]:
+            try:
+                value = float(field[1:])
+            except ValueError:
+                continue
+            self.channels[key].append(timestamp, value)
+            return
+
+    def _loop(self):
+        logger.debug('sampler thread start ...')
+        queries = list(self._queries())
+        next_time = time.monotonic()
+        while self._alive and self.arm.connected:
+            # only sample again when the previous batch is answered, so a slow link is not flooded
+            self._prune()
+            if self._pending:
+                self.overruns += 1
+            else:
+                for key, msg in queries:
+                    cmd = self.arm.send_cmd_async(msg, timeout=self.timeout, debug=False)
+                    if isinstance(cmd, self.arm.Cmd):
+                        self._pending.append((key, cmd))
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+        self._alive = False
+        logger.debug('sampler thread exit ...')
+
+    def _prune(self):
+        # store the answered queries, the reply is in ret only after rx_ns is set
+        pending = []
+        for key, cmd in self._pending:
+            if cmd.ret.empty():
+                pending.append((key, cmd))
+            elif cmd.ret.queue[0] == protocol.TIMEOUT:
+                self.timeouts += 1
+            else:
+                self._on_result(key, cmd.ret.queue[0], cmd.rx_ns)
+        self._pending = pending
+
+    def start(self):
+        """
+        Start sampling, Grove ports are switched to report mode
+        :return: self
+        """
+        if self._alive:
+            return self
+        self._alive = True
+        for kind, pin in self.channels.keys():
+            if kind == SAMPLE_GROVE:
+                callback = functools.partial(self._on_grove, (kind, pin))
+                self._grove_callbacks[pin] = callback
+                self.arm.register_grove_callback(pin=pin, callback=callback, with_timestamp=True)
+                self.arm.set_report_grove(pin=pin, interval=self.period)
+        if any(kind != SAMPLE_GROVE for kind, _ in self.channels.keys()):
+            self._thread = threading.Thread(target=self._loop, name='uarm-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop sampling, Grove reports are switched off, samples are kept
+        :param timeout: maximum time to wait for the sampling thread
+        :return: self
+        """
+        self._alive = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self._prune()
+        self._pending = []
+        for pin, callback in self._grove_callbacks.items():
+            if self.arm.connected:
+                self.arm.set_report_grove(pin=pin, interval=0)
+            self.arm.release_grove_callback(pin=pin, callback=callback)
+        self._grove_callbacks = {}
+        return self
+
+    def buffer(self, kind, pin):
+        """
+        :param kind: 'analog', 'digital' or 'grove'
+        :param pin: pin or port
+        :return: the SampleBuffer of the channel
+        """
+        return self.channels[(kind, pin)]
+
+    def read(self, kind, pin, count=None):
+        """
+        Block read of the newest samples of a channel, oldest first
+        :param kind: 'analog', 'digital' or 'grove'
+        :param pin: pin or port
+        :param count: number of samples, default is None (all samples in the buffer)
+        :return: (times, values), two array.array('d'), times are time.monotonic() seconds
+        """
+        return self.channels[(kind, pin)].read(count)
+
+    def read_all(self, count=None):
+        """
+        Block read of every channel
+        :param count: number of samples of each channel, default is None (all samples)
+        :return: dict of (kind, pin) to (times, values)
+        """
+        return {key: buf.read(count) for key, buf in self.channels.items()}
+
+    def latest(self, kind, pin):
+        """
+        :return: (time, value) of the newest sample of a channel, or None if empty
+        """
+        return self.channels[(kind, pin)].latest()
+
+    def clear(self):
+        for buf in self.channels.values():
+            buf.clear()
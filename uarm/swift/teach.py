@@ -7,23 +7,106 @@
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
 import os
+import sys
 import time
 import math
+import array
+import struct
 import functools
 import threading
-from queue import Queue, Empty
 from . import protocol
 
 
-class Teach(object):
-    __record_thread = None
-    __play_thread = None
-    __record_list = []
-    __progress_queue = Queue()
+TEACH_MAGIC = b'UATEACH\x01'
+TEACH_HEADER = struct.Struct('<8sI')  # magic, number of points
+TEACH_KIND_MOVE = 0
+TEACH_KIND_END_EFFECTOR = 1
+TEACH_COLUMNS = ('x', 'y', 'z', 'r', 'speed')  # float32 columns, end-effector points keep on/off in x
+
+TEACH_PLAY_WINDOW = 20  # G1 segments in flight during playback
+TEACH_PLAY_SPEED = 30
+
+
+class TeachRecording(object):
+    def __init__(self):
+        """
+        Teach points stored as columns: one byte kind and float32 x, y, z, r, speed
+        Binary layout (little-endian): header (magic, count), kinds[count], then each column[count]
+        """
+        self.kinds = array.array('B')
+        self.columns = {name: array.array('f') for name in TEACH_COLUMNS}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append_move(self, x, y, z, r, speed):
+        self.kinds.append(TEACH_KIND_MOVE)
+        for name, value in zip(TEACH_COLUMNS, (x, y, z, r, speed)):
+            self.columns[name].append(value)
+
+    def append_end_effector(self, on):
+        self.kinds.append(TEACH_KIND_END_EFFECTOR)
+        for name, value in zip(TEACH_COLUMNS, (1 if on else 0, 0, 0, 0, 0)):
+            self.columns[name].append(value)
+
+    def clear(self):
+        del self.kinds[:]
+        for column in self.columns.values():
+            del column[:]
+
+    def save(self, file_path):
+        with open(file_path, 'wb') as f:
+            f.write(TEACH_HEADER.pack(TEACH_MAGIC, len(self.kinds)))
+            f.write(self.kinds.tobytes())
+            for name in TEACH_COLUMNS:
+                column = self.columns[name]
+                if sys.byteorder == 'big':
+                    column = array.array('f', column)
+                    column.byteswap()
+                f.write(column.tobytes())
 
+    @classmethod
+    def load(cls, file_path):
+        """
+        Load a binary recording, or a comma-separated text recording of older versions
+        """
+        recording = cls()
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(TEACH_MAGIC):
+            recording._parse_text(data.decode())
+            return recording
+        _, count = TEACH_HEADER.unpack_from(data)
+        offset = TEACH_HEADER.size
+        recording.kinds.frombytes(data[offset:offset + count])
+        offset += count
+        for name in TEACH_COLUMNS:
+            column = recording.columns[name]
+            column.frombytes(data[offset:offset + count * column.itemsize])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            offset += count * column.itemsize
+        return recording
+
+    def _parse_text(self, text):
+        for line in text.splitlines():
+            values = line.strip().split(',')
+            try:
+                if values[0].startswith('ee'):
+                    self.append_end_effector(int(values[1]) == 1)
+                elif len(values) >= 6:
+                    self.append_move(*map(float, values[1:6]))
+            except ValueError:
+                continue
+
+
+class Teach(object):
     def __init__(self, file_path, arm):
         self.arm = arm
         self.file_path = file_path
+        self.__record_thread = None
+        self.__play_thread = None
+        self.__recording = TeachRecording()
         self.__is_recording = False
         self.__is_playing = False
         self.__ready = False
@@ -32,6 +115,10 @@ class Teach(object):
         self.__start_position = [150, 0, 90]
         self.__cur_position = None
         self.__prev_position = None
+        self.__progress_c = threading.Condition()
+        self.__progress = [0, 0]  # [times, percent]
+        self.__progress_seq = 0
+        self.played_points = 0
 
     def set_speed(self, speed=1):
         self.__speed = speed
@@ -68,7 +155,7 @@ class Teach(object):
                 self.__pump_on = not self.__pump_on
                 self.arm.set_pump(self.__pump_on)
                 self.arm.set_gripper(self.__pump_on)
-                self.__record_list.append('ee,{}'.format(1 if self.__pump_on else 0))
+                self.__recording.append_end_effector(self.__pump_on)
         elif self.is_playing():
             if key_type == 'key0' and ret == '1':
                 self.stop_record()
@@ -89,7 +176,7 @@ class Teach(object):
             self.start_standby_mode()
         if not self.is_recording():
             self.__is_recording = True
-            self.__record_list.clear()
+            self.__recording.clear()
             self.arm.set_pump(False)
             self.arm.set_gripper(False)
             self.__pump_on = False
@@ -99,11 +186,7 @@ class Teach(object):
                 self.__cur_position = ret
                 if self.__cur_position:
                     if not self.__prev_position:
-                        self.__record_list.append('G0,{},{},{},{},{}'.format(self.__cur_position[0],
-                                                                             self.__cur_position[1],
-                                                                             self.__cur_position[2],
-                                                                             self.__cur_position[3],
-                                                                             6000))
+                        self.__recording.append_move(*self.__cur_position[:4], 6000)
                     elif abs(self.__prev_position[0] - self.__cur_position[0]) > 1 \
                             or abs(self.__prev_position[1] - self.__cur_position[1]) > 1 \
                             or abs(self.__prev_position[2] - self.__cur_position[2]) > 1:
@@ -111,11 +194,7 @@ class Teach(object):
                             self.__cur_position[1] - self.__prev_position[1], 2) + math.pow(
                             self.__cur_position[2] - self.__prev_position[2], 2))
                         speed = int(distance / interval)
-                        self.__record_list.append('G0,{},{},{},{},{}'.format(self.__cur_position[0],
-                                                                             self.__cur_position[1],
-                                                                             self.__cur_position[2],
-                                                                             self.__cur_position[3],
-                                                                             speed))
+                        self.__recording.append_move(*self.__cur_position[:4], speed)
 
             pos = self.arm.get_position()
             if pos != protocol.TIMEOUT:
@@ -132,8 +211,7 @@ class Teach(object):
         self.arm.set_gripper(False)
         self.__is_recording = False
         self.__pump_on = False
-        with open(self.file_path, 'w') as f:
-            f.write('\n'.join(self.__record_list))
+        self.__recording.save(self.file_path)
 
     def start_play(self, speed=1, times=1):
         if not self.is_playing():
@@ -149,65 +227,76 @@ class Teach(object):
     def stop_play(self):
         self.__is_playing = False
 
+    def _set_progress(self, times, progress):
+        with self.__progress_c:
+            self.__progress = [times, progress]
+            self.__progress_seq += 1
+            self.__progress_c.notify_all()
+
+    def _compile(self, recording, speed):
+        # checked once per playback, not once per point
+        is_pro = bool(self.arm.device_type and self.arm.device_type.lower() == 'swiftpro')
+        pipelined = is_pro and bool(self.arm.firmware_version) and \
+            not self.arm.firmware_version.lower().startswith(('0.', '1.', '2.', '3.'))
+        speed = speed if isinstance(speed, (int, float)) and speed > 0 else 1
+        xs, ys, zs = recording.columns['x'], recording.columns['y'], recording.columns['z']
+        steps = []
+        for i, kind in enumerate(recording.kinds):
+            if kind == TEACH_KIND_END_EFFECTOR:
+                steps.append((TEACH_KIND_END_EFFECTOR, xs[i] == 1, None))
+                continue
+            pos = [round(xs[i], 2), round(ys[i], 2), round(zs[i], 2)]
+            if pipelined:
+                # firmware >= 4.0
+                steps.append((TEACH_KIND_MOVE, pos, protocol.SET_POSITION.format('G1', *pos, TEACH_PLAY_SPEED * speed)))
+            elif is_pro:
+                # firmware < 4.0
+                steps.append((TEACH_KIND_MOVE, pos, recording.columns['speed'][i] * 60 * 10))
+            else:
+                # swift
+                steps.append((TEACH_KIND_MOVE, pos, 20))
+        return pipelined, steps
+
     def __play(self, speed=None, times=1):
         if not os.path.exists(self.file_path):
+            self.__is_playing = False
             return None
-        self.__progress_queue.queue.clear()
+        self._set_progress(0, 0)
+        self.played_points = 0
         self.arm.set_pump(on=False, wait=False)
         self.arm.set_gripper(catch=False, wait=True)
 
-        play_file = open(self.file_path, 'r')
-        lines = play_file.readlines()
-        total = len(lines)
-        play_file.close()
+        pipelined, steps = self._compile(TeachRecording.load(self.file_path), speed)
+        total = len(steps)
+        cmd_pend_size = self.arm.get_property('cmd_pend_size')
+        if pipelined:
+            self.arm.set_property('cmd_pend_size', TEACH_PLAY_WINDOW)
         t = 0
         last_pos = None
         while self.is_playing() and (times == 0 or t < times):
             count = 0
-            for line in lines:
+            for kind, pos, msg in steps:
                 if not self.is_playing():
                     break
                 try:
                     count += 1
-                    line = line.strip()
-                    values = line.split(',')
-                    # print(values)
-                    if values[0].startswith('ee'):
-                        # self.arm.flush_cmd(wait_stop=True)
-                        # time.sleep(0.1)
+                    if kind == TEACH_KIND_END_EFFECTOR:
                         if last_pos is not None:
                             self.arm.set_position(*last_pos, speed=30, wait=True, timeout=1)
                         self.arm.flush_cmd(wait_stop=True)
-                        # time.sleep(0.05)
-                        self.arm.set_pump(int(values[1]) == 1, wait=True)
-                        self.arm.set_gripper(int(values[1]) == 1, wait=True)
+                        self.arm.set_pump(pos, wait=True)
+                        self.arm.set_gripper(pos, wait=True)
                         time.sleep(0.2)
+                    elif pipelined:
+                        # blocks only while the window of G1 segments is full
+                        self.arm.send_cmd_async(msg, timeout=2, debug=False)
+                        last_pos = pos
                     else:
-                        if self.arm.device_type and self.arm.device_type.lower() == 'swiftpro':
-                            # swift-pro
-                            if self.arm.firmware_version and not self.arm.firmware_version.lower().startswith(
-                                    ('0.', '1.', '2.', '3.')):
-                                # firmware >= 4.0
-                                # self.arm.set_position(float(values[1]), float(values[2]), float(values[3]),
-                                #                       speed=30, wait=True, timeout=5)
-
-                                if self.arm.get_property('cmd_pend_size') != 20:
-                                    self.arm.set_property('cmd_pend_size', 20)
-                                self.arm.set_position(float(values[1]), float(values[2]), float(values[3]),
-                                                          speed=30, wait=False, timeout=2, cmd='G1')
-                                last_pos = [float(values[1]), float(values[2]), float(values[3])]
-                            else:
-                                # firmware < 4.0
-                                self.arm.set_position(float(values[1]), float(values[2]), float(values[3]),
-                                                      speed=float(values[5]) * 60 * 10, wait=True, timeout=5)
-                        else:
-                            # swift
-                            self.arm.set_position(float(values[1]), float(values[2]), float(values[3]),
-                                                  speed=20, wait=True, timeout=5)
+                        self.arm.set_position(*pos, speed=msg, wait=True, timeout=5)
                 except Exception as e:
                     print(e)
-                progress = round(count / total * 100, 2)
-                self.__progress_queue.put([t+1, progress])
+                self.played_points += 1
+                self._set_progress(t + 1, round(count / total * 100, 2))
             t += 1
 
         self.arm.flush_cmd()
@@ -216,21 +305,29 @@ class Teach(object):
         self.arm.set_position(self.__start_position[0], self.__start_position[1], self.__start_position[2], wait=False)
         # self.arm.flush_cmd()
         self.__is_playing = False
-        self.arm.set_property('cmd_pend_size', 5)
+        self.arm.set_property('cmd_pend_size', cmd_pend_size)
 
     def get_total_points(self):
-        play_file = open(self.file_path, "r")
-        lines = play_file.readlines()
-        total = len(lines)
-        play_file.close()
-        return total
-
-    def get_progress(self, wait=True):
-        try:
-            if self.__progress_queue is not None:
-                progress = self.__progress_queue.get(block=wait)
-                # print('progress: ', progress)
-                self.__progress_queue.task_done()
-                return progress
-        except Empty:
-            return None
+        return len(TeachRecording.load(self.file_path))
+
+    @property
+    def progress(self):
+        """
+        :return: [times, percent] of the latest played point
+        """
+        with self.__progress_c:
+            return list(self.__progress)
+
+    def get_progress(self, wait=True, timeout=None):
+        """
+        :param wait: if True, wait until the next point is played
+        :param timeout: maximum time to wait, in seconds
+        :return: [times, percent], or None if no point was played while waiting
+        """
+        with self.__progress_c:
+            if not wait:
+                return list(self.__progress)
+            seq = self.__progress_seq
+            if not self.__progress_c.wait_for(lambda: self.__progress_seq != seq, timeout):
+                return None
+            return list(self.__progress)
@@ -0,0 +1,227 @@
+import logging
+import struct
+import threading
+import time
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    shared_memory = None
+    resource_tracker = None
+
+
+logger = logging.getLogger('uarm.swift.telemetry')
+
+TELEMETRY_MAGIC = b'UATL'
+TELEMETRY_VERSION = 1
+TELEMETRY_NAME = 'uarm_telemetry_{}'
+
+# magic, layout version, reserved, sequence (odd while a write is in progress)
+TELEMETRY_HEADER = struct.Struct('<4sHHQ')
+# publish time, position report time, position x/y/z/wrist, moving, power, limit switch,
+# latency count, last, min, max, avg, ewma, lost acks, retried cmds, timeouts
+TELEMETRY_BODY = struct.Struct('<qq4d???xQ5dQQQ')
+TELEMETRY_SIZE = TELEMETRY_HEADER.size + TELEMETRY_BODY.size
+TELEMETRY_SEQ_OFFSET = 8
+
+# blocks published by this process, they stay registered with its resource tracker
+_published = set()
+
+TELEMETRY_FIELDS = (
+    'publish_ns', 'position_ns', 'x', 'y', 'z', 'wrist', 'moving', 'power', 'limit_switch',
+    'latency_count', 'latency_last', 'latency_min', 'latency_max', 'latency_avg', 'latency_ewma',
+    'acks_lost', 'cmds_retried', 'cmds_timeout',
+)
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError('multiprocessing.shared_memory is required for telemetry (Python 3.8+)')
+
+
+class TelemetryPublisher(object):
+    def __init__(self, arm, name='uarm', interval=0.05):
+        """
+        Publish the state of an arm into a shared memory block, for readers in other processes
+        Position, power and limit switch are published when their reports arrive, moving state
+        and command statistics every interval. Writes are guarded by a seqlock, so readers never
+        block the publisher and never see a half written state.
+        :param arm: instance of Swift
+        :param name: name of the arm, the block is named uarm_telemetry_{name}
+        :param interval: seconds between periodic publishes
+        """
+        _require_shared_memory()
+        self.arm = arm
+        self.name = TELEMETRY_NAME.format(name)
+        self.interval = interval
+        self._shm = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._position = [0.0, 0.0, 0.0, 0.0]
+        self._position_ns = 0
+        self._alive = False
+        self._thread = None
+
+    @property
+    def alive(self):
+        return self._alive
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def _on_position(self, value, timestamp):
+        position = list(value[:4]) + [0.0] * (4 - len(value[:4]))
+        with self._lock:
+            self._position = position
+            self._position_ns = timestamp
+        self.publish()
+
+    def _on_change(self, value, timestamp):
+        self.publish()
+
+    def publish(self):
+        """
+        Write the current state of the arm into the block
+        """
+        latency = self.arm.latency_stats
+        acks = self.arm.ack_stats
+        with self._lock:
+            if self._shm is None:
+                return
+            body = TELEMETRY_BODY.pack(
+                time.monotonic_ns(), self._position_ns, *self._position,
+                bool(self.arm.is_moving), bool(self.arm.power_status), bool(self.arm._limit_switch_status),
+                latency['count'], latency['last'] or 0.0, latency['min'] or 0.0, latency['max'] or 0.0,
+                latency['avg'] or 0.0, latency['ewma'] or 0.0,
+                acks['lost'], acks['retried'], acks['timeouts'])
+            buf = self._shm.buf
+            # odd while writing, readers retry until the sequence is even and unchanged
+            self._seq += 1
+            struct.pack_into('<Q', buf, TELEMETRY_SEQ_OFFSET, self._seq)
+            buf[TELEMETRY_HEADER.size:TELEMETRY_SIZE] = body
+            self._seq += 1
+            struct.pack_into('<Q', buf, TELEMETRY_SEQ_OFFSET, self._seq)
+
+    def _loop(self):
+        logger.debug('telemetry thread start ...')
+        while self._alive and self.arm.connected:
+            self.publish()
+            time.sleep(self.interval)
+        logger.debug('telemetry thread exit ...')
+
+    def start(self):
+        """
+        Create the block and start publishing
+        :return: self
+        """
+        if self._alive:
+            return self
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=TELEMETRY_SIZE)
+        except FileExistsError:
+            # left behind by a publisher that did not exit cleanly
+            self._shm = shared_memory.SharedMemory(name=self.name)
+            if self._shm.size < TELEMETRY_SIZE:
+                self._shm.close()
+                self._shm = None
+                raise RuntimeError('Shared memory {} exists with another layout'.format(self.name))
+        _published.add(self.name)
+        self._seq = 0
+        TELEMETRY_HEADER.pack_into(self._shm.buf, 0, TELEMETRY_MAGIC, TELEMETRY_VERSION, 0, self._seq)
+        self._alive = True
+        self.arm.register_report_position_callback(callback=self._on_position, with_timestamp=True)
+        self.arm.register_power_callback(callback=self._on_change, with_timestamp=True)
+        self.arm.register_limit_switch_callback(callback=self._on_change, with_timestamp=True)
+        self.publish()
+        self._thread = threading.Thread(target=self._loop, name='uarm-telemetry', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, unlink=True):
+        """
+        Stop publishing
+        :param unlink: remove the block, readers that are still attached keep their mapping
+        :return: self
+        """
+        self._alive = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.interval * 2 + 1)
+        self._thread = None
+        self.arm.release_report_position_callback(callback=self._on_position)
+        self.arm.release_power_callback(callback=self._on_change)
+        self.arm.release_limit_switch_callback(callback=self._on_change)
+        with self._lock:
+            shm, self._shm = self._shm, None
+        if shm is not None:
+            shm.close()
+            if unlink:
+                shm.unlink()
+                _published.discard(self.name)
+        return self
+
+
+class TelemetryReader(object):
+    def __init__(self, name='uarm', retries=1000):
+        """
+        Read the state published by a TelemetryPublisher in another process, without any serial traffic
+        :param name: name of the arm given to the publisher
+        :param retries: maximum attempts of one read while the publisher is writing
+        """
+        _require_shared_memory()
+        self.name = TELEMETRY_NAME.format(name)
+        self.retries = retries
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, track=False)
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+            # only the publisher may remove the block, not the resource tracker of this process
+            if self.name not in _published:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+        magic, version, _, _ = TELEMETRY_HEADER.unpack_from(self._shm.buf, 0)
+        if magic != TELEMETRY_MAGIC or version != TELEMETRY_VERSION:
+            self._shm.close()
+            raise RuntimeError('Shared memory {} is not uArm telemetry version {}'.format(self.name, TELEMETRY_VERSION))
+
+    @property
+    def seq(self):
+        """
+        Sequence of the latest publish, it increases by 2 with each publish
+        """
+        return struct.unpack_from('<Q', self._shm.buf, TELEMETRY_SEQ_OFFSET)[0]
+
+    def read(self):
+        """
+        Consistent snapshot of the published state
+        :return: dict of TELEMETRY_FIELDS, plus 'seq' and 'position' ([x, y, z, wrist])
+        """
+        buf = self._shm.buf
+        for _ in range(self.retries):
+            seq = struct.unpack_from('<Q', buf, TELEMETRY_SEQ_OFFSET)[0]
+            if seq & 1:
+                continue
+            values = TELEMETRY_BODY.unpack_from(buf, TELEMETRY_HEADER.size)
+            if struct.unpack_from('<Q', buf, TELEMETRY_SEQ_OFFSET)[0] == seq:
+                state = dict(zip(TELEMETRY_FIELDS, values))
+                state['seq'] = seq
+                state['position'] = [state['x'], state['y'], state['z'], state['wrist']]
+                return state
+        raise RuntimeError('Unable to read a consistent state from {}'.format(self.name))
+
+    def wait(self, seq, timeout=None, interval=0.001):
+        """
+        Wait for a publish newer than seq
+        :param seq: sequence of the last state seen
+        :param timeout: maximum time to wait, in seconds
+        :return: the new state, or None if timeout
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while self.seq <= seq:
+            if end is not None and time.monotonic() >= end:
+                return None
+            time.sleep(interval)
+        return self.read()
+
+    def close(self):
+        self._shm.close()
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+
+logger = logging.getLogger('uarm.tools.executor')
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_INLINE = 'inline'
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_INLINE)
+
+
+class CallbackExecutor(object):
+    def __init__(self, workers=0, max_queue_size=256, policy=POLICY_INLINE, name='callback'):
+        """
+        Runs callbacks on a fixed number of worker threads, from a bounded queue
+        :param workers: number of worker threads, 0 means every callback runs inline
+        :param max_queue_size: maximum number of callbacks waiting for a worker
+        :param policy: what submit() does when the queue is full
+            'block': wait until a worker takes a callback from the queue (stalls the caller)
+            'drop_oldest': drop the oldest waiting callback
+            'inline': run the callback in the calling thread (default, never waits or drops)
+        :param name: prefix of the worker thread names
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown callback queue policy: {}, must be one of {}'.format(policy, POLICIES))
+        self.workers = max(int(workers), 0)
+        self.max_queue_size = max(int(max_queue_size), 1)
+        self.policy = policy
+        self.name = name
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._alive = False
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self._submitted = 0
+        self._executed = 0
+        self._dropped = 0
+        self._inline = 0
+        self._errors = 0
+        self._high_water = 0
+        self._exec_time_total = 0.0
+        self._exec_time_max = 0.0
+
+    @property
+    def alive(self):
+        return self._alive
+
+    @property
+    def queue_size(self):
+        return len(self._queue)
+
+    def start(self):
+        with self._cond:
+            if self._alive or self.workers == 0:
+                return
+            self._alive = True
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name='{}-{}'.format(self.name, i), daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stop the workers, callbacks still waiting in the queue are run first
+        :param wait: wait for the workers to exit
+        :param timeout: maximum time to wait for each worker
+        """
+        with self._cond:
+            self._alive = False
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                if t is not threading.current_thread():
+                    t.join(timeout)
+        self._threads = []
+
+    def _run(self, callback, args):
+        start = time.monotonic()
+        try:
+            callback(*args)
+        except Exception as e:
+            with self._cond:
+                self._errors += 1
+            logger.error('callback {} raised: {}'.format(getattr(callback, '__name__', callback), e))
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._executed += 1
+            self._exec_time_total += elapsed
+            if elapsed > self._exec_time_max:
+                self._exec_time_max = elapsed
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._alive and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                callback, args = self._queue.popleft()
+                self._cond.notify_all()
+            self._run(callback, args)
+
+    def submit(self, callback, *args):
+        """
+        Run a callback on a worker, or inline if there are no workers
+        :param callback: callable
+        :param args: arguments of the callback
+        """
+        with self._cond:
+            self._submitted += 1
+            run_inline = not self._alive or threading.current_thread() in self._threads
+            if not run_inline and len(self._queue) >= self.max_queue_size:
+                if self.policy == POLICY_DROP_OLDEST:
+                    self._queue.popleft()
+                    self._dropped += 1
+                elif self.policy == POLICY_INLINE:
+                    run_inline = True
+                else:
+                    while self._alive and len(self._queue) >= self.max_queue_size:
+                        self._cond.wait(0.1)
+                    run_inline = not self._alive
+            if run_inline:
+                if self._alive:
+                    self._inline += 1
+            else:
+                self._queue.append((callback, args))
+                if len(self._queue) > self._high_water:
+                    self._high_water = len(self._queue)
+                self._cond.notify_all()
+                return
+        self._run(callback, args)
+
+    @property
+    def metrics(self):
+        """
+        Snapshot of the executor counters
+        :return: dict
+        """
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'policy': self.policy,
+                'queue_size': len(self._queue),
+                'max_queue_size': self.max_queue_size,
+                'high_water': self._high_water,
+                'submitted': self._submitted,
+                'executed': self._executed,
+                'dropped': self._dropped,
+                'inline': self._inline,
+                'errors': self._errors,
+                'exec_time_total': self._exec_time_total,
+                'exec_time_max': self._exec_time_max,
+                'exec_time_avg': self._exec_time_total / self._executed if self._executed else 0.0,
+            }
+
+    def reset_metrics(self):
+        with self._cond:
+            self._reset_metrics()
+
+
+class EventLoopRunner(object):
+    def __init__(self, loop=None, name='asyncio'):
+        """
+        Delivers callbacks on an asyncio event loop
+        The loop only wakes up when a callback is scheduled with call_soon_threadsafe
+        :param loop: a running loop owned by the user, default is None (start a private loop thread when first needed)
+        :param name: name of the private loop thread
+        """
+        self.name = name
+        self._loop = loop
+        self._private = loop is None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def external(self):
+        return not self._private
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None and (not self._private or self._thread is not None):
+                return self._loop
+            ready = threading.Event()
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, args=(self._loop, ready), name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            return self._loop
+
+    @staticmethod
+    def _run(loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    @staticmethod
+    def _log_exception(future):
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is not None:
+            logger.error('coroutine callback raised: {}'.format(e))
+
+    def submit(self, callback, *args):
+        """
+        Run a callback on the loop, coroutine functions are awaited as tasks
+        :param callback: callable or coroutine function
+        :param args: arguments of the callback
+        """
+        loop = self._ensure_loop()
+        if asyncio.iscoroutinefunction(callback):
+            future = asyncio.run_coroutine_threadsafe(callback(*args), loop)
+            future.add_done_callback(self._log_exception)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stop the private loop thread, a loop owned by the user is left running
+        """
+        with self._lock:
+            if not self._private or self._thread is None:
+                return
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        try:
+            loop.call_soon_threadsafe(loop.stop)
+        except RuntimeError:
+            pass
+        if wait and thread is not threading.current_thread():
+            thread.join(timeout)
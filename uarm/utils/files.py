@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import os
+
+
+def _read_umask():
+    # Linux reports the umask without changing it
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (IOError, OSError, ValueError):
+        pass
+    # elsewhere it can only be read by setting it, done once while importing
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+UMASK = _read_umask()
+
+
+def replacement_file_mode(file_path):
+    """
+    Permissions for a file replacing file_path, mkstemp() only allows the owner
+    :param file_path: path of the file being replaced
+    :return: permissions of the existing file, or what open() gives a new file
+    """
+    try:
+        return os.stat(file_path).st_mode & 0o777
+    except OSError:
+        return 0o666 & ~UMASK
@@ -0,0 +1,90 @@
+import logging
+import time
+from collections import deque
+
+
+logger = logging.getLogger('uarm.wrapper.actuation')
+
+
+UARM_ACTUATION_POLL_START = 0.01 # seconds between the first status queries
+UARM_ACTUATION_POLL_CAP = 0.1 # seconds, longest wait between status queries
+UARM_ACTUATION_POLL_GROWTH = 1.5
+UARM_ACTUATION_HISTORY = 20 # actuations remembered per tool and state
+UARM_ACTUATION_EARLY = 0.8 # first query at this part of the usual duration
+
+
+class ActuationProfile(object):
+
+  def __init__(self, history=UARM_ACTUATION_HISTORY):
+    '''
+    Durations of past actuations of one tool to one state, to know when to start asking for the state
+    '''
+    self._durations = deque(maxlen=history)
+    self.timeouts = 0
+
+  @property
+  def count(self):
+    return len(self._durations)
+
+  @property
+  def typical(self):
+    '''
+    Median duration in seconds, or None before the first confirmed actuation
+    '''
+    if not self._durations:
+      return None
+    durations = sorted(self._durations)
+    return durations[len(durations) // 2]
+
+  @property
+  def shortest(self):
+    return min(self._durations) if self._durations else None
+
+  def add(self, duration):
+    self._durations.append(duration)
+    return self
+
+  def to_dict(self):
+    return {
+      'count': self.count,
+      'typical': self.typical,
+      'shortest': self.shortest,
+      'timeouts': self.timeouts
+    }
+
+
+def wait_for_state(read, targets, timeout, profile=None, settled=(), settle_time=0):
+  '''
+  Query a tool's state until it is one of targets, with adaptive polling
+  Queries start after most of the shortest duration seen before, then come
+  quickly and slow down, up to UARM_ACTUATION_POLL_CAP between queries
+  :param read: function returning the current state
+  :param targets: states that end the wait
+  :param timeout: maximum seconds to wait
+  :param profile: ActuationProfile, updated with the duration when a target is reached
+  :param settled: states that also end the wait, once settle_time has passed (like a pump with nothing to hold)
+  :param settle_time: seconds before a settled state ends the wait
+  :return: the state reached, or None if timeout
+  '''
+  start = time.time()
+  if profile is not None and profile.shortest:
+    time.sleep(min(profile.shortest * UARM_ACTUATION_EARLY, timeout))
+  interval = UARM_ACTUATION_POLL_START
+  while True:
+    state = read()
+    elapsed = time.time() - start
+    if state in targets:
+      if profile is not None:
+        profile.add(elapsed)
+      return state
+    if state in settled and elapsed >= settle_time:
+      return state
+    if elapsed >= timeout:
+      break
+    time.sleep(min(interval, max(timeout - elapsed, 0)))
+    interval = min(interval * UARM_ACTUATION_POLL_GROWTH, UARM_ACTUATION_POLL_CAP)
+  if profile is not None:
+    profile.timeouts += 1
+  logger.debug('State not in {0} after {1} seconds: {2}'.format(
+    targets, timeout, state))
+  return None
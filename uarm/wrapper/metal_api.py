@@ -23,7 +23,7 @@ class MetalAPI(object):
     def __init__(self, port=None, baudrate=115200, timeout=None, **kwargs):
         """
         The API wrapper of Metal
-        :param port: default is select the first port
+        :param port: default is select the first port, or a pyserial URL of a remote arm, like 'socket://host:8700' (see uarm.comm.bridge)
         :param baudrate: default is 115200
         :param timeout: tiemout of serial read, default is None
         :param filters: like {'hwid': 'USB VID:PID=2341:0042'}
@@ -34,11 +34,26 @@ class MetalAPI(object):
             filters: like {'hwid': 'USB VID:PID=0403:6001'}
             do_not_open: default is False
             cmd_pend_size: cmd cache size, default is 2
-            cmd_timeout: cmd wait response timeout, default is 2
+            stream_bytes: True/False, default is False (True for a network URL port), if True commands are streamed by character counting:
+                bytes in flight are kept within rx_buffer_size and commands within planner_buffer_size (cmd_pend_size is not used)
+            rx_buffer_size: serial receive buffer of the firmware in bytes, default is 128
+            planner_buffer_size: commands the firmware can queue, default is 16
+            cmd_timeout: cmd wait response timeout, default is 2 (5 for a network URL port)
+            detect_lost_acks: True/False, default is True, if True an ack arriving before the ack of an earlier cmd
+                marks the earlier cmd as lost, queries are sent again and other cmds return TIMEOUT at once
+            cmd_retries: times a query is sent again when its ack is lost, default is 2
+            adaptive_timeout: True/False, default is True, if True the default timeouts of queries follow the measured
+                round trip, and the default timeout of set_position follows the distance and speed of the queued moves
             callback_thread_pool_size: callback thread poll size, default is 0 (not use thread)
                 ==0: not use thread
-                ==1: use asyncio if asyncio exist else not use thread
-                >2: use thread pool
+                >=1: number of callback worker threads
+            callback_queue_size: max callbacks waiting for a worker thread, default is 256
+            callback_queue_policy: what to do when the callback queue is full, default is 'inline'
+                'block': wait for a worker thread, stalling the serial handle thread meanwhile
+                'drop_oldest': drop the oldest waiting callback
+                'inline': run the callback in the serial handle thread
+            asyncio_loop: a running asyncio loop to deliver all callbacks on, default is None
+                coroutine function callbacks are always awaited on an event loop, without it a private loop thread is started when first needed
             enable_handle_thread: True/False, default is True
             enable_write_thread: True/False, default is False
             enable_handle_report_thread: True/False, default is False
@@ -165,7 +180,7 @@ class MetalAPI(object):
         """
         return self._arm.get_position(wait=wait, timeout=timeout, callback=callback)
 
-    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=10, callback=None, cmd='G0'):
+    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=None, callback=None, cmd='G0'):
         """
         Set the position
         :param x: (mm) location X, default is the last x in use or 150
@@ -174,7 +189,7 @@ class MetalAPI(object):
         :param speed: (mm/min) speed of move, default is the last speed in use or 1000
         :param relative: True/False, dafaule is False
         :param wait: True/False, deault is False
-        :param timeout: timeout, default is 10s
+        :param timeout: timeout, default is estimated from the distance and speed of the queued moves (10s if adaptive_timeout is False)
         :param callback: callback, deault is None 
         :param cmd: 'GO' or 'G1', default is 'G0'
         :return: 'OK' or 'TIMEOUT' if wait is True else None
@@ -0,0 +1,270 @@
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger('uarm.wrapper.monitor')
+
+
+UARM_MONITOR_THRESHOLD = 1.5 # millimeters, same as UARM_SKIPPED_DISTANCE_THRESHOLD
+UARM_MONITOR_SAMPLES = 2 # reports in a row over the threshold before an event
+UARM_MONITOR_AXES = ('x', 'y', 'z')
+UARM_MONITOR_JOINT_STEP = 2.0 # degrees between points of a move's expected path
+
+
+def _closest_on_segment(point, start, end):
+  '''
+  Closest point to point on the segment start->end, all are [x, y, z]
+  '''
+  d = [e - s for s, e in zip(start, end)]
+  length_sq = sum(v * v for v in d)
+  if not length_sq:
+    return list(start)
+  t = sum((p - s) * v for p, s, v in zip(point, start, d)) / length_sq
+  t = min(max(t, 0.0), 1.0)
+  return [s + v * t for s, v in zip(start, d)]
+
+
+def _joint_path(kinematics, start, end):
+  '''
+  Points a single G0 passes through from start to end, without start
+  The firmware moves each joint linearly, so the path arches (see QUIRKS.md),
+  it is followed in steps of UARM_MONITOR_JOINT_STEP at the joint that turns most
+  '''
+  first = kinematics.coordinate_to_angles(*start)
+  last = kinematics.coordinate_to_angles(*end)
+  if first is None or last is None:
+    return [list(end)] # the firmware refuses it, or the model is wrong
+  steps = max(1, int(math.ceil(
+    max(abs(b - a) for a, b in zip(first, last)) / UARM_MONITOR_JOINT_STEP)))
+  points = [
+    kinematics.angles_to_coordinate(
+      *[a + (b - a) * i / steps for a, b in zip(first, last)])
+    for i in range(1, steps)]
+  points.append(list(end))
+  return points
+
+
+class SkippedStepMonitor(object):
+
+  def __init__(self,
+               robot,
+               threshold=UARM_MONITOR_THRESHOLD,
+               samples=UARM_MONITOR_SAMPLES,
+               halt=True,
+               callback=None):
+    '''
+    Compare the uArm's position reports against the path of the moves sent to it, while they are in flight
+    The expected path goes through every queued target, in device coordinates, arched the way the
+    firmware's joint interpolation arches each move, so a report is on track as long as it is near
+    that path, whatever the speed and acceleration of each move
+    :param robot: instance of SwiftAPIWrapper
+    :param threshold: millimeters a report may be away from the path
+    :param samples: number of reports in a row over the threshold before an event
+    :param halt: If True, further moves raise an error after an event, until clear() is called
+    :param callback: called with the event dictionary, from the thread reading the serial port
+    '''
+    self._robot = robot
+    self.threshold = threshold
+    self.samples = samples
+    self.halt = halt
+    self.callback = callback
+    self._lock = threading.Lock()
+    self._path = None # None while the path is not known
+    self._over = 0
+    self._halted = None
+    self._events = []
+    self._started = False
+    self._owns_reports = False
+    self.reset_stats()
+
+  @property
+  def running(self):
+    return self._started
+
+  @property
+  def halted(self):
+    '''
+    The event that halted the moves, or None
+    '''
+    return self._halted
+
+  @property
+  def events(self):
+    return list(self._events)
+
+  @property
+  def stats(self):
+    '''
+    Per axis deviation from the path, in millimeters
+    :return: Dictionary with "samples", "max" distance, and for each axis its "max" and "avg" absolute deviation
+    '''
+    with self._lock:
+      count = self._stats['samples']
+      stats = {
+        'samples': count,
+        'max': self._stats['max'],
+        'events': len(self._events)
+      }
+      for axis in UARM_MONITOR_AXES:
+        stats[axis] = {
+          'max': self._stats['axes'][axis]['max'],
+          'avg': self._stats['axes'][axis]['sum'] / count if count else 0.0
+        }
+      return stats
+
+  def reset_stats(self):
+    self._stats = {
+      'samples': 0,
+      'max': 0.0,
+      'axes': {a: {'max': 0.0, 'sum': 0.0} for a in UARM_MONITOR_AXES}
+    }
+    return self
+
+  def start(self):
+    '''
+    Start listening to position reports, turning them on if live position is not already enabled
+    :return: self
+    '''
+    if self._started:
+      return self
+    if not self._robot.is_live_position():
+      self._robot.live_position()
+      self._owns_reports = True
+    self._robot.register_report_position_callback(
+      callback=self._on_report, with_timestamp=True)
+    self._started = True
+    return self
+
+  def stop(self):
+    '''
+    Stop listening to position reports, and turn them off if start() turned them on
+    :return: self
+    '''
+    if not self._started:
+      return self
+    self._started = False
+    self._robot.release_report_position_callback(callback=self._on_report)
+    if self._owns_reports and self._robot.connected:
+      self._robot.live_position(False)
+    self._owns_reports = False
+    return self
+
+  def reset(self, position):
+    '''
+    The arm is known to be at position, in device coordinates [x, y, z]
+    Ignored while moves are in flight, their path is still expected
+    '''
+    with self._lock:
+      if self._path is not None and len(self._path) > 1:
+        return self
+      self._path = [list(position[:3])]
+      self._over = 0
+    return self
+
+  def expect(self, target):
+    '''
+    A move to target, in device coordinates [x, y, z], was queued
+    '''
+    kinematics = self._robot.kinematics
+    with self._lock:
+      if self._path is not None:
+        self._path.extend(
+          _joint_path(kinematics, self._path[-1], list(target[:3])))
+    return self
+
+  def arrived(self):
+    '''
+    All queued moves finished, the arm should now be at the last target
+    '''
+    with self._lock:
+      if self._path is not None:
+        self._path = self._path[-1:]
+    return self
+
+  def lose_track(self):
+    '''
+    The arm moves in a way the monitor cannot follow (servo angles, touched by hand),
+    reports are ignored until the next reset()
+    '''
+    with self._lock:
+      self._path = None
+      self._over = 0
+    return self
+
+  def check(self):
+    '''
+    Raise an error if the moves have been halted
+    '''
+    event = self._halted
+    if event is not None:
+      raise RuntimeError(
+        'Detected {0}mm skipped: expected={1} - actual={2}'.format(
+          round(event['distance'], 1), event['expected'], event['position']))
+    return self
+
+  def clear(self):
+    '''
+    Allow moves again after an event, the path is unknown until the next reset()
+    '''
+    self._halted = None
+    return self.lose_track()
+
+  def _on_report(self, value, timestamp):
+    if not isinstance(value, list) or len(value) < 3:
+      return
+    if not self._robot._enabled:
+      return # moved by hand
+    position = value[:3]
+    with self._lock:
+      path = self._path
+      if path is None:
+        return
+      if len(path) == 1:
+        index, closest = 0, path[0]
+      else:
+        # the closest segment is how far along the path the arm is
+        best = None
+        for i in range(len(path) - 1):
+          point = _closest_on_segment(position, path[i], path[i + 1])
+          distance = math.sqrt(
+            sum((p - c) ** 2 for p, c in zip(position, point)))
+          if best is None or distance < best[0]:
+            best = (distance, i, point)
+        _, index, closest = best
+        if index:
+          del path[:index]
+      deviation = [p - c for p, c in zip(position, closest)]
+      distance = math.sqrt(sum(d * d for d in deviation))
+      self._stats['samples'] += 1
+      self._stats['max'] = max(self._stats['max'], distance)
+      for axis, d in zip(UARM_MONITOR_AXES, deviation):
+        axis_stats = self._stats['axes'][axis]
+        axis_stats['max'] = max(axis_stats['max'], abs(d))
+        axis_stats['sum'] += abs(d)
+      if distance <= self.threshold:
+        self._over = 0
+        return
+      self._over += 1
+      if self._over != self.samples:
+        return # only one event while it stays over the threshold
+      event = {
+        'time': time.time(),
+        'timestamp': timestamp,
+        'distance': round(distance, 2),
+        'deviation': {
+          a: round(d, 2) for a, d in zip(UARM_MONITOR_AXES, deviation)},
+        'position': [round(p, 2) for p in position],
+        'expected': [round(c, 2) for c in closest]
+      }
+      self._events.append(event)
+      if self.halt and self._halted is None:
+        self._halted = event
+    logger.warning('Detected {0}mm skipped: expected={1} - actual={2}'.format(
+      event['distance'], event['expected'], event['position']))
+    if self.callback:
+      try:
+        self.callback(event)
+      except Exception as e:
+        logger.error('Skipped step callback failed: {0}'.format(e))
@@ -0,0 +1,178 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+from uarm.utils.files import replacement_file_mode
+
+
+logger = logging.getLogger('uarm.wrapper.settings')
+
+
+UARM_SETTINGS_DEBOUNCE = 0.5  # seconds
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class SettingsStore(object):
+
+  def __init__(self, file_path, defaults=None, debounce=UARM_SETTINGS_DEBOUNCE):
+    '''
+    Settings of every uArm (keyed by hardware ID) saved in one JSON file
+    The file is read once, changes are applied in memory and written in the
+    background after debounce seconds without changes, with a temporary
+    file and a rename, so readers never see a partially written file
+    :param file_path: path of the JSON file
+    :param defaults: settings saved under "simulate" when the file is created
+    :param debounce: seconds to wait for more changes before writing
+    '''
+    self._file_path = os.path.abspath(file_path)
+    self._defaults = copy.deepcopy(defaults or {})
+    self._debounce = debounce
+    self._lock = threading.RLock()
+    self._data = None
+    self._dirty = set()
+    self._timer = None
+
+  @property
+  def file_path(self):
+    return self._file_path
+
+  @property
+  def dirty(self):
+    return bool(self._dirty)
+
+  def _read_file(self):
+    try:
+      with open(self._file_path, 'r') as f:
+        data = json.load(f)
+      if isinstance(data, dict):
+        return data
+      logger.warning('Ignoring settings file without an object: {0}'.format(
+        self._file_path))
+    except (IOError, OSError):
+      pass
+    except ValueError as e:
+      logger.warning('Ignoring unreadable settings file {0}: {1}'.format(
+        self._file_path, e))
+    return None
+
+  def load(self):
+    '''
+    Read the file, only the first call touches the disk
+    :return: self
+    '''
+    with self._lock:
+      if self._data is not None:
+        return self
+      directory = os.path.dirname(self._file_path)
+      if not os.path.isdir(directory):
+        os.makedirs(directory)
+      data = self._read_file()
+      if data is None:
+        data = {'simulate': copy.deepcopy(self._defaults)}
+        self._dirty.add('simulate')
+      self._data = data
+    return self
+
+  def get(self, hw_id):
+    '''
+    :return: a copy of the settings saved for a hardware ID, or None
+    '''
+    self.load()
+    with self._lock:
+      settings = self._data.get(hw_id)
+      return dict(settings) if isinstance(settings, dict) else None
+
+  def set(self, hw_id, settings):
+    '''
+    Replace the settings of a hardware ID, and schedule a write
+    '''
+    self.load()
+    with self._lock:
+      self._data[hw_id] = dict(settings)
+      self._dirty.add(hw_id)
+      self._schedule()
+    return self
+
+  def _schedule(self):
+    if self._timer is not None:
+      self._timer.cancel()
+    self._timer = threading.Timer(self._debounce, self.flush)
+    self._timer.daemon = True
+    self._timer.start()
+
+  def flush(self):
+    '''
+    Write pending changes now, merged into the current content of the file,
+    so settings saved by other processes for other hardware IDs are kept
+    :return: self
+    '''
+    with self._lock:
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+      if not self._dirty:
+        return self
+      lock_file = None
+      try:
+        if fcntl is not None:
+          lock_path = os.path.join(
+            os.path.dirname(self._file_path),
+            '.{0}.lock'.format(os.path.basename(self._file_path)))
+          lock_file = open(lock_path, 'w')
+          fcntl.flock(lock_file, fcntl.LOCK_EX)
+        data = self._read_file() or {}
+        for hw_id in self._dirty:
+          data[hw_id] = self._data[hw_id]
+        directory = os.path.dirname(self._file_path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+        try:
+          with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps(data, indent=4))
+          os.chmod(temp_path, replacement_file_mode(self._file_path))
+          os.replace(temp_path, self._file_path)
+        except Exception:
+          os.remove(temp_path)
+          raise
+        self._dirty.clear()
+        # pick up what other processes saved
+        self._data.update(
+          {k: v for k, v in data.items() if k not in self._data})
+      except (IOError, OSError) as e:
+        logger.warning('Unable to save settings to {0}: {1}'.format(
+          self._file_path, e))
+      finally:
+        if lock_file is not None:
+          lock_file.close()
+    return self
+
+
+def get_settings_store(file_path, defaults=None):
+  '''
+  One SettingsStore per file in this process, so every instance sees the same settings
+  '''
+  file_path = os.path.abspath(file_path)
+  with _stores_lock:
+    store = _stores.get(file_path)
+    if store is None:
+      store = SettingsStore(file_path, defaults=defaults)
+      _stores[file_path] = store
+    return store
+
+
+@atexit.register
+def _flush_all():
+  with _stores_lock:
+    stores = list(_stores.values())
+  for store in stores:
+    store.flush()
@@ -7,13 +7,15 @@
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
 from ..swift import Swift
+from ..swift.sampler import Sampler
+from ..swift.telemetry import TelemetryPublisher
 
 
 class SwiftAPI(object):
     def __init__(self, port=None, baudrate=115200, timeout=None, **kwargs):
         """
         The API wrapper of Swift and SwiftPro
-        :param port: default is to select the first port
+        :param port: default is to select the first port, or a pyserial URL of a remote arm, like 'socket://host:8700' (see uarm.comm.bridge)
         :param baudrate: default is 115200
         :param timeout: tiemout of serial read, default is None
         :param filters: like {'hwid': 'USB VID:PID=2341:0042'}
@@ -24,11 +26,26 @@ class SwiftAPI(object):
             filters: like {'hwid': 'USB VID:PID=2341:0042'}
             do_not_open: default is False
             cmd_pend_size: cmd cache size, default is 2
-            cmd_timeout: cmd wait response timeout, default is 2
+            stream_bytes: True/False, default is False (True for a network URL port), if True commands are streamed by character counting:
+                bytes in flight are kept within rx_buffer_size and commands within planner_buffer_size (cmd_pend_size is not used)
+            rx_buffer_size: serial receive buffer of the firmware in bytes, default is 128
+            planner_buffer_size: commands the firmware can queue, default is 16
+            cmd_timeout: cmd wait response timeout, default is 2 (5 for a network URL port)
+            detect_lost_acks: True/False, default is True, if True an ack arriving before the ack of an earlier cmd
+                marks the earlier cmd as lost, queries are sent again and other cmds return TIMEOUT at once
+            cmd_retries: times a query is sent again when its ack is lost, default is 2
+            adaptive_timeout: True/False, default is True, if True the default timeouts of queries follow the measured
+                round trip, and the default timeout of set_position follows the distance and speed of the queued moves
             callback_thread_pool_size: callback thread poll size, default is 0 (not use thread)
                 ==0: not use thread
-                ==1: use asyncio if asyncio exist else not use thread
-                >2: use thread pool
+                >=1: number of callback worker threads
+            callback_queue_size: max callbacks waiting for a worker thread, default is 256
+            callback_queue_policy: what to do when the callback queue is full, default is 'inline'
+                'block': wait for a worker thread, stalling the serial handle thread meanwhile
+                'drop_oldest': drop the oldest waiting callback
+                'inline': run the callback in the serial handle thread
+            asyncio_loop: a running asyncio loop to deliver all callbacks on, default is None
+                coroutine function callbacks are always awaited on an event loop, without it a private loop thread is started when first needed
             enable_handle_thread: True/False, default is True
             enable_write_thread: True/False, default is False
             enable_handle_report_thread: True/False, default is False
@@ -91,6 +108,38 @@ class SwiftAPI(object):
     def firmware_version(self):
         return self._arm.firmware_version
 
+    @property
+    def callback_metrics(self):
+        """
+        Counters of the callback executor: queue size, high water, submitted, executed, dropped, inline, errors and execution time
+        :return: dict
+        """
+        return self._arm.callback_executor.metrics
+
+    @property
+    def latency_stats(self):
+        """
+        Command round trip in seconds, measured from the monotonic write time to the monotonic read time of the reply
+        :return: dict with count, last, min, max, avg and ewma
+        """
+        return self._arm.latency_stats
+
+    @property
+    def ack_stats(self):
+        """
+        Acks detected as lost (a later ack arrived first), queries sent again after a lost ack, and timeouts
+        :return: dict with lost, retried and timeouts
+        """
+        return self._arm.ack_stats
+
+    @property
+    def stream_stats(self):
+        """
+        Counters of the command stream: bytes and commands in flight, their high water, number and time of waits for room
+        :return: dict
+        """
+        return self._arm.stream_stats
+
     def set_property(self, key, value):
         self._arm.set_property(key, value)
 
@@ -214,7 +263,7 @@ class SwiftAPI(object):
         """
         return self._arm.get_position(wait=wait, timeout=timeout, callback=callback)
 
-    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=10, callback=None, cmd='G0'):
+    def set_position(self, x=None, y=None, z=None, speed=None, relative=False, wait=False, timeout=None, callback=None, cmd='G0'):
         """
         Set the position
         :param x: (mm) location X, default is the last x in use or 150
@@ -223,7 +272,7 @@ class SwiftAPI(object):
         :param speed: (mm/min) speed of move, default is the last speed in use or 1000
         :param relative: True/False, dafaule is False
         :param wait: True/False, deault is False
-        :param timeout: timeout, default is 10s
+        :param timeout: timeout, default is estimated from the distance and speed of the queued moves (10s if adaptive_timeout is False)
         :param callback: callback, deault is None
         :param cmd: 'GO' or 'G1', default is 'G0'
         :return: 'OK' or 'TIMEOUT' if wait is True else None
@@ -345,7 +394,7 @@ class SwiftAPI(object):
         Control the pump
         :param on: True/False, default is False (Off)
         :param wait: True/False, deault is True
-        :param check: True/False, default is False, check the pump status or not if wait is True
+        :param check: True/False, default is False, wait until the pump status is 2 (on) or 0 (off) if wait is True
         :param timeout: timeout, default is use the default cmd timeout
         :param callback: callback, deault is None
         :return: 'OK' or 'TIMEOUT' if wait is True else None
@@ -357,7 +406,7 @@ class SwiftAPI(object):
         Control the gripper
         :param catch: True/False, default is False (Open)
         :param wait: True/False, deault is True
-        :param check: True/False, default is False, check the catch status or not if wait is True
+        :param check: True/False, default is False, wait until the catch status is 2 (on) or 0 (off) if wait is True
         :param timeout: timeout, default is use the default cmd timeout
         :param callback: callback, deault is None
         :return: 'OK' or 'TIMEOUT' if wait is True else None
@@ -410,6 +459,40 @@ class SwiftAPI(object):
         """
         return self._arm.get_digital(pin=pin, wait=wait, timeout=timeout, callback=callback)
 
+    def create_sampler(self, analog=None, digital=None, grove=None, rate=10, capacity=1000, timeout=None):
+        """
+        Create a sampler of analog pins, digital pins and Grove ports, call start() on it to begin sampling
+        Analog and digital queries are pipelined once per period, Grove ports use report mode
+        Example:
+            sampler = api.create_sampler(analog=[0, 1, 2], grove=[3], rate=20).start()
+            times, values = sampler.read('analog', 1, count=100)
+            sampler.stop()
+        :param analog: list of analog pins
+        :param digital: list of digital pins
+        :param grove: list of Grove ports, they must be set up with grove_init() first
+        :param rate: target samples per second of each channel, default is 10
+        :param capacity: number of samples kept for each channel, default is 1000
+        :param timeout: timeout of each query, default is one period
+        :return: instance of Sampler
+        """
+        return Sampler(self._arm, analog=analog, digital=digital, grove=grove,
+                       rate=rate, capacity=capacity, timeout=timeout)
+
+    def create_telemetry_publisher(self, name='uarm', interval=0.05):
+        """
+        Create a publisher of the arm state into shared memory, call start() on it to begin publishing
+        Other local processes read it with TelemetryReader, without any serial traffic
+        Example:
+            publisher = api.create_telemetry_publisher(name='left').start()
+            # in another process
+            reader = TelemetryReader(name='left')
+            state = reader.read()
+        :param name: name of the arm, readers attach with the same name
+        :param interval: seconds between publishes of the moving state and cmd statistics, default is 0.05
+        :return: instance of TelemetryPublisher
+        """
+        return TelemetryPublisher(self._arm, name=name, interval=interval)
+
     def get_rom_data(self, address, data_type=None, wait=True, timeout=None, callback=None):
         """
         Get data from eeprom
@@ -449,6 +532,19 @@ class SwiftAPI(object):
         """
         return self._arm.set_rom_data(address, data, data_type=data_type, wait=wait, timeout=timeout, callback=callback)
 
+    @property
+    def rom_cache(self):
+        """
+        Write-back cache of the eeprom, reads are pipelined and cached, writes are sent on rom_cache.sync()
+        Example:
+            record = EEPROMRecord([('z_offset', EEPROM_DATA_TYPE_FLOAT), ('mode', EEPROM_DATA_TYPE_BYTE)])
+            settings = api.rom_cache.read_record(100, record)
+            api.rom_cache.write_record(100, record, {'z_offset': 1.5})
+            api.rom_cache.sync()
+        :return: instance of EEPROMCache
+        """
+        return self._arm.rom_cache
+
     def get_limit_switch(self, wait=True, timeout=None, callback=None):
         """
         Get the status of the limit switch
@@ -539,13 +635,14 @@ class SwiftAPI(object):
         """
         return self._arm.set_report_grove(pin=pin, interval=interval, wait=wait, timeout=timeout, callback=callback)
 
-    def register_power_callback(self, callback=None):
+    def register_power_callback(self, callback=None, with_timestamp=False):
         """
         Set the callback to handle power status change
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_power_callback(callback=callback)
+        return self._arm.register_power_callback(callback=callback, with_timestamp=with_timestamp)
 
     def release_power_callback(self, callback=None):
         """
@@ -555,13 +652,14 @@ class SwiftAPI(object):
         """
         return self._arm.release_power_callback(callback=callback)
 
-    def register_report_position_callback(self, callback=None):
+    def register_report_position_callback(self, callback=None, with_timestamp=False):
         """
         Set the callback to handle postiton report
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_report_position_callback(callback=callback)
+        return self._arm.register_report_position_callback(callback=callback, with_timestamp=with_timestamp)
 
     def release_report_position_callback(self, callback=None):
         """
@@ -571,13 +669,14 @@ class SwiftAPI(object):
                 """
         return self._arm.release_report_position_callback(callback=callback)
 
-    def register_key0_callback(self, callback=None):
+    def register_key0_callback(self, callback=None, with_timestamp=False):
         """
         Set the callback to handle key0 (BUTTON MENU) event
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_key0_callback(callback=callback)
+        return self._arm.register_key0_callback(callback=callback, with_timestamp=with_timestamp)
 
     def release_key0_callback(self, callback=None):
         """
@@ -587,13 +686,14 @@ class SwiftAPI(object):
         """
         return self._arm.release_key0_callback(callback=callback)
 
-    def register_key1_callback(self, callback=None):
+    def register_key1_callback(self, callback=None, with_timestamp=False):
         """
         Set the callback to handle key1 (BUTTON PLAY) event
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_key1_callback(callback=callback)
+        return self._arm.register_key1_callback(callback=callback, with_timestamp=with_timestamp)
 
     def release_key1_callback(self, callback=None):
         """
@@ -603,13 +703,14 @@ class SwiftAPI(object):
         """
         return self._arm.release_key1_callback(callback=callback)
 
-    def register_limit_switch_callback(self, callback=None):
+    def register_limit_switch_callback(self, callback=None, with_timestamp=False):
         """
         Set the callback to handle limit switch status change
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_limit_switch_callback(callback=callback)
+        return self._arm.register_limit_switch_callback(callback=callback, with_timestamp=with_timestamp)
 
     def release_limit_switch_callback(self, callback=None):
         """
@@ -619,14 +720,15 @@ class SwiftAPI(object):
         """
         return self._arm.release_limit_switch_callback(callback=callback)
 
-    def register_grove_callback(self, pin=None, callback=None):
+    def register_grove_callback(self, pin=None, callback=None, with_timestamp=False):
         """
         Set the callback to handle grove report
         :param pin: pin/port, defualt is None, you must set it
         :param callback: callback, deault is None
+        :param with_timestamp: if True, the callback also gets the time.monotonic_ns() when the report was read
         :return: True/False
         """
-        return self._arm.register_grove_callback(pin=pin, callback=callback)
+        return self._arm.register_grove_callback(pin=pin, callback=callback, with_timestamp=with_timestamp)
 
     def release_grove_callback(self, pin=None, callback=None):
         """
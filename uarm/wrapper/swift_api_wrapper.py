@@ -3,16 +3,35 @@ import json
 import logging
 import math
 import os
+import threading
 import time
+from collections import OrderedDict
+from types import MappingProxyType
 
 from serial.tools.list_ports import comports
 
+from uarm.kinematics import Kinematics
+from uarm.kinematics import ReachabilityOracle
+from uarm.motion import ArcPlanner
+from uarm.motion import CompiledProgram
+from uarm.motion import LinearPlanner
+from uarm.motion import VirtualClock
+from uarm.motion import move_duration
+from uarm.motion import segment_length
+from uarm.motion.linear import UARM_LINEAR_TOLERANCE
+import uarm.motion.program as PROGRAM
+from uarm.motion.timing import UARM_TIMING_ACCELERATION_FACTOR
+from uarm.motion.timing import path_length
 from uarm.offset.helpers import cartesian_to_polar
 from uarm.offset.helpers import round_position
 from uarm.offset.helpers import subtract_positions
 from uarm.record import Recorder
 import uarm.swift.protocol as PROTOCOL
 from uarm.wrapper import SwiftAPI
+from uarm.wrapper.actuation import ActuationProfile
+from uarm.wrapper.actuation import wait_for_state
+from uarm.wrapper.monitor import SkippedStepMonitor
+from uarm.wrapper.settings import get_settings_store
 
 
 logger = logging.getLogger('uarm.swiftapi.wrapper')
@@ -64,11 +83,26 @@ UARM_MIN_WRIST_ANGLE = 0
 UARM_MAX_WRIST_ANGLE = 180
 UARM_DEFAULT_WRIST_ANGLE = 90
 UARM_DEFAULT_WRIST_SLEEP = 0.25
+# seconds the servo takes per degree, estimated from UARM_DEFAULT_WRIST_SLEEP
+# being enough for a quarter turn
+UARM_WRIST_SETTLE_PER_DEGREE = UARM_DEFAULT_WRIST_SLEEP / 90
 
 # PUMP & GRIP
 UARM_DEFAULT_PUMP_SLEEP = {True: 0.2, False: 0.2}
 UARM_DEFAULT_GRIP_SLEEP = {True: 0, False: 2.0}
 UARM_HOLDING_CODES = ['off', 'empty', 'holding']
+# states confirming an actuation, indexes of UARM_HOLDING_CODES
+UARM_CONFIRM_PUMP_STATES = {True: (2,), False: (0,)}
+UARM_CONFIRM_GRIP_STATES = {True: (2,), False: (0,)}
+# also confirming, once the tool had time to settle (nothing was picked up)
+UARM_CONFIRM_PUMP_SETTLED = {True: (1,), False: ()}
+UARM_CONFIRM_GRIP_SETTLED = {True: (0,), False: ()}
+# seconds to settle, until the usual time of the tool is learned
+UARM_CONFIRM_PUMP_SETTLE = 0.2
+UARM_CONFIRM_GRIP_SETTLE = 1.0
+UARM_CONFIRM_SETTLE_MARGIN = 1.5 # times the learned time of the tool, once known
+UARM_CONFIRM_PUMP_TIMEOUT = {True: 1.0, False: 1.0}
+UARM_CONFIRM_GRIP_TIMEOUT = {True: 3.0, False: 3.0}
 
 # HOMING
 UARM_HOME_SPEED = 200
@@ -86,6 +120,10 @@ UARM_DEFAULT_PROBE_STEP = 1
 # TOUCH DETECT
 UARM_DEFAULT_TOUCH_THRESH_MM = 0.25
 
+# live position, kept from the uArm's position reports
+UARM_LIVE_POSITION_INTERVAL = 0.05 # seconds between reports
+UARM_LIVE_POSITION_MAX_AGE = 0.15 # seconds, older reports are not trusted
+
 # SAVED HARDWARE SETTINGS
 UARM_HARDWARE_SETTINGS_FILE_NAME = 'uarm_hardware_settings.json'
 UARM_HARDWARE_SETTINGS_DIRECTORY = '.hardware_settings'
@@ -101,6 +139,9 @@ UARM_DEFAULT_HARDWARE_SETTINGS = {
 # SAVED RECORDINGS
 UARM_HARDWARE_RECORDINGS_FILE_NAME = 'uarm_recordings.json'
 
+# PROGRAMS
+UARM_PROGRAM_CACHE_SIZE = 64
+
 
 def _is_uarm_port(port_info):
   return (port_info.hwid and UARM_USB_HWID in port_info.hwid)
@@ -219,10 +260,39 @@ class SwiftAPIWrapper(SwiftAPI):
     self._pushed_speed = []
     self._pushed_acceleration = []
 
-    self._hardware_settings = copy.deepcopy(UARM_DEFAULT_HARDWARE_SETTINGS)
+    # read-only snapshot, replaced (never changed) when a setting is written
+    self._hardware_settings = MappingProxyType(
+      dict(UARM_DEFAULT_HARDWARE_SETTINGS))
     self._hardware_settings_dir = None
+    self._settings_directory = None  # resolved once, see settings_directory
+
+    self._live_position = False
+    self._live_interval = UARM_LIVE_POSITION_INTERVAL
+    self._live_max_age = UARM_LIVE_POSITION_MAX_AGE
+    self._live_condition = threading.Condition()
+    self._live_report = None # (time.monotonic_ns(), [x, y, z]) as reported
+    self._live_since_ns = 0 # reports read before this may show an old state
+    self._live_stats = {'reports': 0, 'queries': 0}
+    self._skip_monitor = None
+    self._confirm_actuation = False
+    self._learn_actuation = True
+    self._actuation_profiles = {} # (tool, enable) -> ActuationProfile
+    self._queue_wrist = False
+    self._wrist_settle = True
+    self._wrist_condition = threading.Condition()
+    self._wrist_rotation = 0 # number of the last queued rotation
+    self._wrist_pending_settle = 0 # seconds the last queued rotation needs after it runs
+    self._wrist_acked = None # time.monotonic() when the last queued rotation was acknowledged
 
     self._recorder = None
+    self._kinematics = {}
+    self._reachability = {}
+    self._linear_tolerance = None # None moves with one G0, arched
+    self._linear_planners = {}
+    self._arc_planner = ArcPlanner()
+    self._sim_clock = VirtualClock() # advanced only while simulating
+    self._program_cache = OrderedDict()
+    self._program_cache_stats = {'hits': 0, 'misses': 0}
 
     super().__init__(do_not_open=True, print_gcode=print_gcode, port=port, **kwargs)
     if settings_dir:
@@ -270,7 +340,11 @@ class SwiftAPIWrapper(SwiftAPI):
     if self.is_simulating():
       raise RuntimeError(
         'uArm is in \"simulate\" mode, cannot disconnect from device')
+    if self._skip_monitor:
+      self._skip_monitor.stop()
+    self._stop_live_position()
     super().disconnect(*args, **kwargs)
+    self.flush_hardware_settings()
     return self
 
   def is_simulating(self):
@@ -287,8 +361,9 @@ class SwiftAPIWrapper(SwiftAPI):
       self.waiting_ready()
       self._init_settings()
     self.set_speed_factor(UARM_DEFAULT_SPEED_FACTOR)
-    self.tool_mode(self.hardware_settings['mode'])
+    self.tool_mode(self._hardware_settings['mode'])
     self.rotate_to(UARM_DEFAULT_WRIST_ANGLE)
+    self._sim_clock.reset()
     return self
 
   '''
@@ -313,28 +388,42 @@ class SwiftAPIWrapper(SwiftAPI):
     hw_id = info.get('device_unique')
     if not hw_id:
       raise RuntimeError('Device HW ID not accessible')
-    self._hardware_settings['id'] = hw_id
+    self._replace_hardware_settings(id=hw_id)
     return self
 
   @property
   def hardware_settings(self):
-    return copy.deepcopy(self._hardware_settings)
+    """
+    Read-only view of the hardware settings, it does not change when settings are saved later
+    :return: mapping of id, z_offset, mode and wrist_offset
+    """
+    return self._hardware_settings
+
+  def _replace_hardware_settings(self, settings=None, **changes):
+    new_settings = dict(
+      self._hardware_settings if settings is None else settings)
+    new_settings.update(changes)
+    self._hardware_settings = MappingProxyType(new_settings)
+    return self
 
   @property
   def settings_directory(self):
+    if self._settings_directory:
+      return self._settings_directory
     settings_dir = self._hardware_settings_dir
-    if settings_dir:
-      return settings_dir
-    # default to using a locally saved settings file (if present)
-    local_file = os.path.join(os.getcwd(), UARM_HARDWARE_SETTINGS_FILE_NAME)
-    if os.path.isfile(local_file):
-      return os.getcwd()
-    # fallback to using pre-defined folder for storing hardware settings
-    # TODO: change to an OS-defined user-data folder
-    settings_dir = os.path.dirname(os.path.realpath(__file__))
-    settings_dir = os.path.join(
-      settings_dir, '..', UARM_HARDWARE_SETTINGS_DIRECTORY)
-    return os.path.abspath(settings_dir)
+    if not settings_dir:
+      # default to using a locally saved settings file (if present)
+      local_file = os.path.join(os.getcwd(), UARM_HARDWARE_SETTINGS_FILE_NAME)
+      if os.path.isfile(local_file):
+        settings_dir = os.getcwd()
+    if not settings_dir:
+      # fallback to using pre-defined folder for storing hardware settings
+      # TODO: change to an OS-defined user-data folder
+      settings_dir = os.path.dirname(os.path.realpath(__file__))
+      settings_dir = os.path.abspath(os.path.join(
+        settings_dir, '..', UARM_HARDWARE_SETTINGS_DIRECTORY))
+    self._settings_directory = settings_dir
+    return settings_dir
 
   def set_settings_directory(self, directory=None):
     if directory is None:
@@ -342,6 +431,7 @@ class SwiftAPIWrapper(SwiftAPI):
     if not os.path.isdir(directory):
       raise ValueError('Directory does not exist: {0}'.format(directory))
     self._hardware_settings_dir = os.path.abspath(directory)
+    self._settings_directory = None
 
   @property
   def hardware_settings_path(self):
@@ -354,56 +444,38 @@ class SwiftAPIWrapper(SwiftAPI):
       self.settings_directory, UARM_HARDWARE_RECORDINGS_FILE_NAME)
 
   def hardware_settings_default(self):
-    self._hardware_settings = copy.deepcopy(UARM_DEFAULT_HARDWARE_SETTINGS)
-    return self
-
-  def _init_hardware_settings_file(self):
-    file_path = self.hardware_settings_path
-    if not os.path.isdir(os.path.dirname(file_path)):
-      os.mkdir(os.path.dirname(file_path))
-    if not os.path.isfile(file_path):
-      init_data = {'simulate': UARM_DEFAULT_HARDWARE_SETTINGS}
-      if self._hardware_settings['id'] != 'simulate':
-        init_data[self._hardware_settings['id']] = self._hardware_settings
-      settings_json = json.dumps(init_data, indent=4)
-      with open(file_path, 'w') as f:
-        f.write(settings_json)
-    return self
-
-  def _read_hardware_settings(self, file_path):
-    read_data = None
-    with open(file_path, 'r') as f:
-      read_data = f.read()
-    try:
-      read_data = json.loads(read_data)
-    except:
-      read_data = copy.deepcopy(UARM_DEFAULT_HARDWARE_SETTINGS)
-    return read_data
+    return self._replace_hardware_settings(UARM_DEFAULT_HARDWARE_SETTINGS)
+
+  @property
+  def _settings_store(self):
+    return get_settings_store(
+      self.hardware_settings_path, defaults=UARM_DEFAULT_HARDWARE_SETTINGS)
 
   def save_hardware_settings(self, **kwargs):
-    for key, value in kwargs.items():
-      if key in self._hardware_settings:
-        self._hardware_settings[key] = value
-    self._init_hardware_settings_file()
-    file_path = self.hardware_settings_path
-    read_data = self._read_hardware_settings(file_path)
-    read_data[self._hardware_settings['id']] = self.hardware_settings
-    write_data = json.dumps(read_data, indent=4)
-    with open(file_path, 'w') as f:
-      f.write(write_data)
+    self._replace_hardware_settings(**{
+      key: value
+      for key, value in kwargs.items()
+      if key in self._hardware_settings
+    })
+    # written to disk in the background, see SettingsStore
+    self._settings_store.set(
+      self._hardware_settings['id'], self._hardware_settings)
+    return self
+
+  def flush_hardware_settings(self):
+    """
+    Write saved hardware settings to disk now, instead of in the background
+    :return: self
+    """
+    self._settings_store.flush()
     return self
 
   def _init_settings(self):
-    self._init_hardware_settings_file()
-    file_path = self.hardware_settings_path
-    read_data = self._read_hardware_settings(file_path)
     current_id = self._hardware_settings['id']
-    self._hardware_settings = read_data.get(
-      current_id, copy.deepcopy(UARM_DEFAULT_HARDWARE_SETTINGS))
-    self._hardware_settings['id'] = current_id
-    for key, item in UARM_DEFAULT_HARDWARE_SETTINGS.items():
-      if key not in self._hardware_settings:
-        self._hardware_settings[key] = copy.deepcopy(item)
+    settings = copy.deepcopy(UARM_DEFAULT_HARDWARE_SETTINGS)
+    settings.update(self._settings_store.get(current_id) or {})
+    settings['id'] = current_id
+    self._replace_hardware_settings(settings)
     self._recorder = Recorder(self.recordings_path)
     return self
 
@@ -447,6 +519,10 @@ class SwiftAPIWrapper(SwiftAPI):
     if self.flush_cmd(timeout=timeout, wait_stop=True) != PROTOCOL.OK:
       raise TimeoutError(
         'Unable to arrive within {1} seconds'.format(timeout))
+    self._live_position_changed()
+    self._wait_for_wrist()
+    if self._skip_monitor:
+      self._skip_monitor.arrived().check()
     self.update_position(check=check)
     return self
 
@@ -464,11 +540,12 @@ class SwiftAPIWrapper(SwiftAPI):
     self.save_hardware_settings(mode=new_mode)
     if not self.is_simulating():
       self.set_mode(UARM_MODE_TO_CODE[new_mode])
+      self._live_position_changed()
     self.update_position()
     return self
 
   def get_tool_mode(self):
-    return self.hardware_settings['mode']
+    return self._hardware_settings['mode']
 
   def speed(self, speed=UARM_DEFAULT_SPEED):
     """
@@ -503,27 +580,165 @@ class SwiftAPIWrapper(SwiftAPI):
     return self
 
   def _apply_z_offset(self, pos):
-    pos['z'] += self.hardware_settings['z_offset']
+    pos['z'] += self._hardware_settings['z_offset']
     return pos
 
   def _remove_z_offset(self, pos):
-    pos['z'] -= self.hardware_settings['z_offset']
+    pos['z'] -= self._hardware_settings['z_offset']
     return pos
 
-  def update_position(self, check=False):
+  def live_position(self, enable=True, interval=UARM_LIVE_POSITION_INTERVAL,
+                    max_age=UARM_LIVE_POSITION_MAX_AGE):
+    """
+    Keep a live position from the uArm's position reports, so position and update_position() are served without querying the device
+    Without a fresh report, update_position() waits for the next one only if it is due sooner than a query would take
+    :param enable: If True the position reports are turned on, else if False they are turned off and update_position() queries the device again
+    :param interval: number of seconds between position reports
+    :param max_age: oldest report in seconds that position and update_position() will use
+    :return: self
+    """
+    logger.debug('live_position: {0}'.format(enable))
+    if not enable:
+      self._stop_live_position()
+      if not self.is_simulating():
+        self.set_report_position(interval=0)
+      return self
+    if max_age < interval:
+      raise ValueError(
+        'max_age ({0}) must be at least the interval ({1})'.format(
+          max_age, interval))
+    self._live_interval = interval
+    self._live_max_age = max_age
+    if self.is_simulating():
+      return self
+    if not self._live_position:
+      self.register_report_position_callback(
+        callback=self._on_report_position, with_timestamp=True)
+      self._live_position = True
+    self._live_position_changed()
+    self.set_report_position(interval=interval)
+    return self
+
+  def is_live_position(self):
+    """
+    Check whether update_position() is served from the uArm's position reports
+    :return: True if live position is enabled, else False
+    """
+    return self._live_position
+
+  def _stop_live_position(self):
+    if not self._live_position:
+      return
+    self._live_position = False
+    self.release_report_position_callback(callback=self._on_report_position)
+    with self._live_condition:
+      self._live_report = None
+      self._live_condition.notify_all()
+
+  def _on_report_position(self, value, timestamp):
+    if not isinstance(value, list) or len(value) < 3:
+      return
+    with self._live_condition:
+      self._live_report = (timestamp, value[:3])
+      self._live_stats['reports'] += 1
+      self._live_condition.notify_all()
+
+  def _live_position_changed(self):
+    # reports read before now may show where the arm was, not where it is
+    self._live_since_ns = time.monotonic_ns()
+
+  def _fresh_live_report(self):
+    # a report read after the last change, and not older than max_age
+    oldest = max(
+      self._live_since_ns,
+      time.monotonic_ns() - int(self._live_max_age * 1e9))
+    report = self._live_report
+    if report is None or report[0] < oldest:
+      return None
+    return report
+
+  def _next_live_report_wait(self):
+    # seconds until the next fresh report is due, or None if a query is quicker
+    report = self._live_report
+    round_trip = self.latency_stats.get('ewma')
+    now = time.monotonic_ns()
+    if report is None or round_trip is None:
+      return None
+    if now - report[0] > self._live_max_age * 1e9:
+      # reports stopped coming
+      return None
+    interval = int(self._live_interval * 1e9)
+    after = max(now, self._live_since_ns)
+    periods = max(1, -(-(after - report[0]) // interval))
+    wait = (report[0] + periods * interval - now) / 1e9
+    if wait > round_trip:
+      return None
+    return wait + round_trip
+
+  def _read_live_position(self):
+    report = self._fresh_live_report()
+    if report is None:
+      wait = self._next_live_report_wait()
+      if wait is not None:
+        with self._live_condition:
+          self._live_condition.wait_for(
+            lambda: self._fresh_live_report() is not None, wait)
+        report = self._fresh_live_report()
+    if report is None:
+      logger.debug('No fresh position report, querying the device')
+      return None
+    return list(report[1])
+
+  def _report_to_position(self, report):
+    return round_position(self._apply_z_offset({
+      'x': report[1][0],
+      'y': report[1][1],
+      'z': report[1][2]
+    }))
+
+  @property
+  def reported_position(self):
+    """
+    Get the XYZ coordinate of the latest position report, while live position is enabled
+    :return: Dictionary with keys "x", "y", and "z", or None if no report was received
+    """
+    report = self._live_report
+    if not self._live_position or report is None:
+      return None
+    return self._report_to_position(report)
+
+  @property
+  def live_position_stats(self):
+    """
+    Get how update_position() was served while live position is enabled
+    :return: Dictionary with the number of "reports" received and "queries" sent to the device
+    """
+    return dict(self._live_stats)
+
+  def update_position(self, check=False, force=False):
     """
     Retrieve the current XYZ coordinate position from the connected uArm device
+    :param check: If True, raise an error if the position is too far from the target position
+    :param force: If True, query the device even if live position is enabled
     :return: self
     """
     logger.debug('update_position')
     if self.is_simulating():
       return self
-    pos = self.get_position(wait=True)
+    pos = None
+    if self._live_position and not force:
+      pos = self._read_live_position()
+    if pos is None:
+      if self._live_position:
+        self._live_stats['queries'] += 1
+      pos = self.get_position(wait=True)
     is_n = pos is None
     is_l = isinstance(pos, list)
     if is_n or not is_l or not len(pos) or not isinstance(pos[0], float):
       logger.debug('Not able to read position, out of bounds')
       return self
+    if self._skip_monitor:
+      self._skip_monitor.reset(pos)
     new_pos = round_position(self._apply_z_offset({
       'x': pos[0],
       'y': pos[1],
@@ -543,15 +758,76 @@ class SwiftAPIWrapper(SwiftAPI):
     logger.debug('New Position: {0}'.format(self._pos))
     return self
 
-  def get_base_angle(self):
+  def monitor_skipped_steps(self,
+                            enable=True,
+                            threshold=UARM_SKIPPED_DISTANCE_THRESHOLD,
+                            halt=True,
+                            callback=None):
+    """
+    Watch the uArm's position reports in the background, and detect skipped steps while moves are in flight
+    :param enable: If True the monitor is started, else if False it is stopped
+    :param threshold: number of millimeters the uArm may be away from the path of its moves
+    :param halt: If True, the next move or wait_for_arrival() raises an error after skipped steps were detected
+    :param callback: (optional) called with a dictionary describing each detection
+    :return: self
+    """
+    logger.debug('monitor_skipped_steps: {0}'.format(enable))
+    if not enable:
+      if self._skip_monitor:
+        self._skip_monitor.stop()
+        self._skip_monitor = None
+      return self
+    if self._skip_monitor:
+      self._skip_monitor.stop()
+    self._skip_monitor = SkippedStepMonitor(
+      self, threshold=threshold, halt=halt, callback=callback)
+    if not self.is_simulating():
+      self._skip_monitor.start()
+      self.update_position()
+    return self
+
+  @property
+  def skipped_step_monitor(self):
+    """
+    Get the skipped step monitor, with its events and per axis statistics
+    :return: instance of SkippedStepMonitor, or None if not monitoring
+    """
+    return self._skip_monitor
+
+  @property
+  def kinematics(self):
+    """
+    Get the host-side kinematics model for the current tool mode
+    :return: instance of Kinematics
+    """
+    mode = self.get_tool_mode()
+    if mode not in self._kinematics:
+      self._kinematics[mode] = Kinematics(mode)
+    return self._kinematics[mode]
+
+  @property
+  def reachability(self):
+    """
+    Get the reachability oracle for the current tool mode
+    :return: instance of ReachabilityOracle
+    """
+    mode = self.get_tool_mode()
+    if mode not in self._reachability:
+      self._reachability[mode] = ReachabilityOracle(
+        mode, directory=self.settings_directory)
+    return self._reachability[mode]
+
+  def get_base_angle(self, local=False):
     """
     Retrieve the current angle in degrees of the base motor from the connected uArm device
+    :param local: If True, calculate the angle from the current position with the kinematics model, instead of asking the device
     :return: angle in degrees, 90 is center
     """
-    # this shouldn't be calculated but instead retrieved from device
-    # because there could be an offset applied to the endtool, which determines
-    # the cartesian coordinate position
-    degree = self.get_servo_angle(UARM_MOTOR_IDS['base'])
+    if local or self.is_simulating():
+      # end-tool offsets are along the arm, so they do not change the base angle
+      degree = self.kinematics.base_angle(self._pos['x'], self._pos['y'])
+    else:
+      degree = self.get_servo_angle(UARM_MOTOR_IDS['base'])
     # map angle to match Y cartesian behavior (center=0, +Y=+Angle, etc.)
     degree = (90 - degree) * -1
     radian = round((degree / 180) * math.pi, 3)
@@ -561,8 +837,14 @@ class SwiftAPIWrapper(SwiftAPI):
   def position(self):
     """
     Get the current XYZ coordinate position
+    While live position is enabled, this is the latest position report when it is fresh, even while moving
+    Else it is the position of the last update_position() or move command
     :return: Dictionary with keys "x", "y", and "z", and float values for millimeter positions
     """
+    if self._live_position:
+      report = self._fresh_live_report()
+      if report is not None:
+        return self._report_to_position(report)
     return copy.copy(self._pos)
 
   @property
@@ -574,9 +856,9 @@ class SwiftAPIWrapper(SwiftAPI):
     return copy.copy(self._wrist_angle)
 
   def _set_wrist_offset(self, wrist_offset=0):
-    real_angle = self.wrist_angle + self.hardware_settings['wrist_offset']
+    real_angle = self.wrist_angle + self._hardware_settings['wrist_offset']
     self.save_hardware_settings(wrist_offset=wrist_offset)
-    self._wrist_angle = real_angle - self.hardware_settings['wrist_offset']
+    self._wrist_angle = real_angle - self._hardware_settings['wrist_offset']
     return self
 
   def wrist_offset_reset(self):
@@ -584,7 +866,7 @@ class SwiftAPIWrapper(SwiftAPI):
     return self
 
   def wrist_is_centered(self):
-    real_angle = self.wrist_angle + self.hardware_settings['wrist_offset']
+    real_angle = self.wrist_angle + self._hardware_settings['wrist_offset']
     wrist_offset = real_angle - UARM_DEFAULT_WRIST_ANGLE
     self._set_wrist_offset(wrist_offset=wrist_offset)
     return self
@@ -595,8 +877,6 @@ class SwiftAPIWrapper(SwiftAPI):
 
   def can_move_to(self, x=None, y=None, z=None):
     logger.debug('can_move_to: x={0}, y={1}, z={2}'.format(x, y, z))
-    if self.is_simulating():
-      return True  # no way to test during simulation
     new_pos = self._pos.copy()
     if x is not None:
       new_pos['x'] = x
@@ -605,11 +885,19 @@ class SwiftAPIWrapper(SwiftAPI):
     if z is not None:
       new_pos['z'] = z
     new_pos = round_position(new_pos)
-    # Send coordinates to uArm to see if they are within the limit.
-    # This must be done on the device itself, because of it's weird
-    # coordinate system and load-carrying ability at different positions.
     new_pos = self._remove_z_offset(new_pos)
+    if self.is_simulating():
+      return self.reachability.estimate(**new_pos)
+    # Most coordinates are answered by the local reachability grid. Near the
+    # edge of the workspace, send coordinates to uArm to see if they are within
+    # the limit, because of it's weird coordinate system and load-carrying
+    # ability at different positions.
+    reachable = self.reachability.check(**new_pos)
+    if reachable is not None:
+      return reachable
     unreachable = self.check_pos_is_limit(list(new_pos.values()))
+    if isinstance(unreachable, bool):
+      self.reachability.remember(reachable=not unreachable, **new_pos)
     return not bool(unreachable)
 
   def can_move_relative(self, x=None, y=None, z=None):
@@ -645,23 +933,169 @@ class SwiftAPIWrapper(SwiftAPI):
       new_pos['z'] = z
     new_pos = round_position(new_pos)
     if translate:
-      real_pos = self._remove_z_offset(new_pos)
+      real_pos = self._remove_z_offset(new_pos.copy())
     else:
       real_pos = new_pos.copy()
     if not self.is_simulating():
       if check and not self.can_move_to(**real_pos):
         raise RuntimeError(
           'Coordinate not reachable by uArm: {0}'.format(new_pos))
-      speed_mm_per_min = self._speed * 60
-      self.set_position(relative=False, speed=speed_mm_per_min, **real_pos)
+      if self._skip_monitor:
+        self._skip_monitor.check()
+      target = [real_pos['x'], real_pos['y'], real_pos['z']]
+      if self._linear_tolerance is not None and translate:
+        start = self._remove_z_offset(self._pos.copy())
+        points = self.linear_planner.segments(
+          [start['x'], start['y'], start['z']], target,
+          min_length=segment_length(self._speed, self._acceleration))
+      else:
+        points = [target]
+      self._stream_points(points)
+    else:
+      self._simulate_move('move_to', [[new_pos['x'], new_pos['y'], new_pos['z']]])
+
+    self._pos = new_pos.copy()
+    return self
+
+  def _simulate_move(self, call, points):
+    start = [self._pos['x'], self._pos['y'], self._pos['z']]
+    self._sim_clock.advance(move_duration(
+      path_length(start, points), self._speed,
+      self._acceleration * UARM_TIMING_ACCELERATION_FACTOR), call)
+    return self
+
+  def _stream_points(self, points):
+    # every point is queued without waiting, the window keeps the pipe full
+    speed_mm_per_min = self._speed * 60
+    for point in points:
+      self.set_position(
+        x=point[0], y=point[1], z=point[2],
+        relative=False, speed=speed_mm_per_min)
+      if self._skip_monitor:
+        self._skip_monitor.expect(point)
+    return self
 
+  def arc_to(self, x=None, y=None, z=None, center_x=None, center_y=None,
+             clockwise=False, turns=0, tolerance=None):
+    """
+    Move along an arc in the XY plane, to an absolute cartesian coordinate
+    If the target's radius differs from the current one the arc is a spiral, and if Z changes it is a helix
+    :param x: Cartesian millimeter of the X axis, if None then uses current position
+    :param y: Cartesian millimeter of the Y axis, if None then uses current position
+    :param z: Cartesian millimeter of the Z axis, if None then uses current position
+    :param center_x: Cartesian millimeter of the X axis of the arc's center, if None then uses current position
+    :param center_y: Cartesian millimeter of the Y axis of the arc's center, if None then uses current position, at least one of center_x and center_y is required
+    :param clockwise: If True the arc turns clockwise (looking down), else counter-clockwise
+    :param turns: number of extra full turns before arriving at the target
+    :param tolerance: (optional) number of millimeters the chords of this arc may stray from it, default is the arc_planner's tolerance, 0.1 millimeters
+    :return: self
+    """
+    logger.debug('arc_to: x={0}, y={1}, z={2}, center=({3}, {4})'.format(
+      x, y, z, center_x, center_y))
+    if center_x is None and center_y is None:
+      raise ValueError('An arc needs a center_x or center_y')
+    if not self._enabled:
+      self.enable_all_motors()
+    new_pos = self._pos.copy()
+    if x is not None:
+      new_pos['x'] = x
+    if y is not None:
+      new_pos['y'] = y
+    if z is not None:
+      new_pos['z'] = z
+    new_pos = round_position(new_pos)
+    center = [
+      self._pos['x'] if center_x is None else center_x,
+      self._pos['y'] if center_y is None else center_y]
+    start = self._remove_z_offset(self._pos.copy())
+    end = self._remove_z_offset(new_pos.copy())
+    points = self._arc_planner.segments(
+      [start['x'], start['y'], start['z']],
+      [end['x'], end['y'], end['z']],
+      center, clockwise=clockwise, turns=turns,
+      min_length=segment_length(self._speed, self._acceleration),
+      tolerance=tolerance)
+    if not self.is_simulating():
+      if self._skip_monitor:
+        self._skip_monitor.check()
+      self._stream_points(points)
+    else:
+      offset = self._hardware_settings['z_offset']
+      self._simulate_move('arc_to', [[p[0], p[1], p[2] + offset] for p in points])
     self._pos = new_pos.copy()
     return self
 
+  def circle(self, center_x=None, center_y=None, turns=1, z=None,
+             clockwise=False, tolerance=None):
+    """
+    Move around a circle in the XY plane, starting and ending at the current position
+    :param center_x: Cartesian millimeter of the X axis of the circle's center, if None then uses current position
+    :param center_y: Cartesian millimeter of the Y axis of the circle's center, if None then uses current position, at least one of center_x and center_y is required
+    :param turns: number of full turns
+    :param z: (optional) Cartesian millimeter of the Z axis to end at, which makes the circle a helix
+    :param clockwise: If True the circle turns clockwise (looking down), else counter-clockwise
+    :param tolerance: (optional) number of millimeters the chords of this circle may stray from it, default is the arc_planner's tolerance, 0.1 millimeters
+    :return: self
+    """
+    if turns < 1:
+      raise ValueError('A circle needs at least 1 turn, not {0}'.format(turns))
+    return self.arc_to(
+      z=z, center_x=center_x, center_y=center_y, clockwise=clockwise,
+      turns=int(turns) - 1, tolerance=tolerance)
+
+  @property
+  def sim_clock(self):
+    """
+    Get the virtual clock of a simulating uArm, with the estimated duration of each call
+    Set its time_scale to make simulated calls take time, for example 0.1 runs ten times faster than real time
+    :return: instance of VirtualClock
+    """
+    return self._sim_clock
+
+  @property
+  def arc_planner(self):
+    """
+    Get the planner that splits arcs into chords, with its cache statistics
+    :return: instance of ArcPlanner
+    """
+    return self._arc_planner
+
+  def linear(self, enable=True, tolerance=UARM_LINEAR_TOLERANCE):
+    """
+    Move in straight lines, by splitting each move into segments that are streamed to the uArm
+    :param enable: If True moves are straight, else if False each move is a single command, which arches (see QUIRKS.md)
+    :param tolerance: number of millimeters the path may stray from the straight line
+    :return: self
+    """
+    logger.debug('linear: {0}'.format(enable))
+    self._linear_tolerance = tolerance if enable else None
+    return self
+
+  def is_linear(self):
+    """
+    Check whether moves are split into straight segments
+    :return: True if linear moves are enabled, else False
+    """
+    return self._linear_tolerance is not None
+
+  @property
+  def linear_planner(self):
+    """
+    Get the segment planner for the current tool mode, with its cache statistics
+    :return: instance of LinearPlanner
+    """
+    mode = self.get_tool_mode()
+    if mode not in self._linear_planners:
+      self._linear_planners[mode] = LinearPlanner(mode)
+    planner = self._linear_planners[mode]
+    if self._linear_tolerance is not None:
+      planner.tolerance = self._linear_tolerance
+    return planner
+
   def _set_z_offset(self, z_offset=0):
-    real_z = self.position['z'] + self.hardware_settings['z_offset']
+    real_z = self._pos['z'] + self._hardware_settings['z_offset']
     self.save_hardware_settings(z_offset=z_offset)
-    self._pos['z'] = real_z - self.hardware_settings['z_offset']
+    self._pos['z'] = real_z - self._hardware_settings['z_offset']
     return self
 
   def z_offset_reset(self):
@@ -670,7 +1104,7 @@ class SwiftAPIWrapper(SwiftAPI):
 
   def z_is_level(self):
     self.update_position()
-    real_z = self.position['z'] + self.hardware_settings['z_offset']
+    real_z = self.position['z'] + self._hardware_settings['z_offset']
     z_offset = -real_z
     self._set_z_offset(z_offset=z_offset)
     return self
@@ -698,13 +1132,61 @@ class SwiftAPIWrapper(SwiftAPI):
     self.move_to(check=check, **rel_pos)
     return self
 
+  def queue_wrist(self, enable=True, settle=True):
+    """
+    Send wrist rotations in order with the moves, so the wrist turns while the arm travels, instead of waiting for the arm to stop
+    :param enable: If True rotate_to() and rotate_relative() neither wait nor sleep by default, else if False they do
+    :param settle: If True wait_for_arrival() also waits for the last queued rotation, for a time calculated from its change in angle, counted from when the uArm acknowledged it
+    :return: self
+    """
+    logger.debug('queue_wrist: {0}'.format(enable))
+    self._queue_wrist = bool(enable)
+    self._wrist_settle = bool(settle)
+    return self
+
+  def is_queueing_wrist(self):
+    return self._queue_wrist
+
+  def _queue_rotation(self, real_angle, settle):
+    # the firmware acknowledges a queued rotation when it runs it, after the
+    # moves before it, so the settle is counted from the ack
+    with self._wrist_condition:
+      self._wrist_rotation += 1
+      rotation = self._wrist_rotation
+      self._wrist_pending_settle = settle
+      self._wrist_acked = None
+
+    def _acked(ret):
+      with self._wrist_condition:
+        if rotation == self._wrist_rotation:
+          self._wrist_acked = time.monotonic()
+          self._wrist_condition.notify_all()
+
+    self.set_wrist(angle=real_angle, wait=False, callback=_acked)
+
+  def _wait_for_wrist(self):
+    # called once flush_cmd() saw every command acknowledged, but the ack
+    # callback of the rotation may still be on its way
+    start = time.monotonic()
+    with self._wrist_condition:
+      settle = self._wrist_pending_settle
+      if not settle:
+        return
+      self._wrist_condition.wait_for(
+        lambda: self._wrist_acked is not None, settle)
+      acked = self._wrist_acked
+      self._wrist_pending_settle = 0
+    remaining = settle - (time.monotonic() - (start if acked is None else acked))
+    if remaining > 0:
+      time.sleep(remaining)
+
   def rotate_to(self, angle=UARM_DEFAULT_WRIST_ANGLE,
-                sleep=UARM_DEFAULT_WRIST_SLEEP, wait=True, translate=True):
+                sleep=None, wait=None, translate=True):
     """
     Rotate the wrist's servo motor to a angle, in degrees
     :param angle: The target servo angle in degrees, 90 is center
-    :param sleep: The number of seconds to wait after setting the angle, default is 0.25 seconds
-    :param wait: If True, will wait for the connected uArm device to finish processing the command
+    :param sleep: The number of seconds to wait after setting the angle, default is 0.25 seconds, or 0 with queue_wrist()
+    :param wait: If True, will wait for the connected uArm device to finish processing the command, default is True, or False with queue_wrist()
     :return: self
     """
     logger.debug('rotate_to')
@@ -714,6 +1196,10 @@ class SwiftAPIWrapper(SwiftAPI):
     if angle > UARM_MAX_WRIST_ANGLE:
       angle = UARM_MAX_WRIST_ANGLE
       logger.debug('angle changed to: {0}'.format(angle))
+    if wait is None:
+      wait = not self._queue_wrist
+    if sleep is None:
+      sleep = 0 if self._queue_wrist else UARM_DEFAULT_WRIST_SLEEP
     # previous move command will return before it has arrived at destination
     if wait:
       self.wait_for_arrival(check=False)
@@ -721,21 +1207,29 @@ class SwiftAPIWrapper(SwiftAPI):
     # so from the device's perspective, the change is instantaneous
     if not self.is_simulating():
       if translate:
-        real_angle = angle + self.hardware_settings['wrist_offset']
+        real_angle = angle + self._hardware_settings['wrist_offset']
       else:
         real_angle = angle
-      self.set_wrist(angle=real_angle)
-      time.sleep(sleep)
+      if self._queue_wrist:
+        settle = 0
+        if self._wrist_settle:
+          settle = abs(angle - self._wrist_angle) * UARM_WRIST_SETTLE_PER_DEGREE
+        self._queue_rotation(real_angle, settle)
+      else:
+        self.set_wrist(angle=real_angle)
+      if sleep:
+        time.sleep(sleep)
+    else:
+      self._sim_clock.advance(sleep, 'rotate_to')
     self._wrist_angle = angle
     return self
 
-  def rotate_relative(self, angle=0, sleep=UARM_DEFAULT_WRIST_SLEEP,
-                      wait=True):
+  def rotate_relative(self, angle=0, sleep=None, wait=None):
     """
     Rotate the wrist's servo motor by a relative angle, in degrees
     :param angle: The relative amount to rotate the servo angle in degrees
-    :param sleep: The number of seconds to wait after setting the angle, default is 0.25 seconds
-    :param wait: If True, will wait for the connected uArm device to finish processing the command
+    :param sleep: The number of seconds to wait after setting the angle, default is 0.25 seconds, or 0 with queue_wrist()
+    :param wait: If True, will wait for the connected uArm device to finish processing the command, default is True, or False with queue_wrist()
     :return: self
     """
     logger.debug('rotate_relative')
@@ -773,47 +1267,128 @@ class SwiftAPIWrapper(SwiftAPI):
     logger.debug('enable_all_motors')
     if not self.is_simulating():
       self.set_servo_attach(None, wait=True)
+      self._live_position_changed()
     self._enabled = True
     # update position, b/c no way to know where we are
     self.update_position()
     return self
 
-  def pump(self, enable=False, sleep=None):
+  def confirm_actuation(self, enable=True, learn=True):
+    """
+    Make pump() and grip() wait until the uArm reports the tool reached its state, instead of sleeping for a fixed time
+    :param enable: If True pump() and grip() confirm by default, else if False they sleep
+    :param learn: If True the time each tool takes is remembered, and status queries start shortly before it
+    :return: self
+    """
+    logger.debug('confirm_actuation: {0}'.format(enable))
+    self._confirm_actuation = bool(enable)
+    self._learn_actuation = bool(learn)
+    return self
+
+  def is_confirming_actuation(self):
+    return self._confirm_actuation
+
+  @property
+  def actuation_profiles(self):
+    """
+    Time taken by the pump and gripper to reach each state, learned by confirmed actuations
+    :return: Dictionary of "pump_on", "pump_off", "grip_on", "grip_off", each with "count", "typical" and "shortest" seconds, and "timeouts"
+    """
+    return {
+      '{0}_{1}'.format(tool, 'on' if enable else 'off'): profile.to_dict()
+      for (tool, enable), profile in sorted(self._actuation_profiles.items())}
+
+  def _actuation_profile(self, tool, enable):
+    if not self._learn_actuation:
+      return None
+    key = (tool, bool(enable))
+    if key not in self._actuation_profiles:
+      self._actuation_profiles[key] = ActuationProfile()
+    return self._actuation_profiles[key]
+
+  def _confirm_tool(self, tool, enable, read, states, timeout, settled=(),
+                    settle_time=0):
+    profile = self._actuation_profile(tool, enable)
+    if profile is not None and profile.typical is not None:
+      settle_time = profile.typical * UARM_CONFIRM_SETTLE_MARGIN
+    state = wait_for_state(
+      read, states, timeout, profile=profile, settled=settled,
+      settle_time=settle_time)
+    if state is not None and state not in states:
+      logger.debug('{0} settled as {1}'.format(tool, UARM_HOLDING_CODES[state]))
+    if state is None:
+      logger.warning('{0} did not report {1} within {2} seconds'.format(
+        tool, [UARM_HOLDING_CODES[s] for s in states], timeout))
+    return state
+
+  def pump(self, enable=False, sleep=None, confirm=None, timeout=None):
     """
     Turn on all the connected uArm's stepper motors
     :param enable: If True the pump turns on, else if False the pump turns off
-    :param sleep: (optional) number of seconds to wait after the sending the command, default is 0.2 seconds
+    :param sleep: (optional) number of seconds to wait after the sending the command, default is 0.2 seconds, or 0 when confirming
+    :param confirm: (optional) If True wait until the uArm reports holding (on) or off, or empty once the pump has settled, default is set by confirm_actuation()
+    :param timeout: (optional) most seconds to wait for confirmation, default is 1 second
     :return: self
     """
     logger.debug('pump: {0}'.format(enable))
-    if self.hardware_settings['mode'] != 'general':
+    if self._hardware_settings['mode'] != 'general':
       raise RuntimeError(
         'Must be in \"general\" to user pump')
+    if confirm is None:
+      confirm = self._confirm_actuation
+    if timeout is None:
+      timeout = UARM_CONFIRM_PUMP_TIMEOUT[enable]
+    if sleep is None:
+      sleep = 0 if confirm else UARM_DEFAULT_PUMP_SLEEP[enable]
     if self.is_simulating():
+      if confirm: # nothing to confirm, assume the usual time
+        sleep += UARM_DEFAULT_PUMP_SLEEP[enable]
+      self._sim_clock.advance(sleep, 'pump')
       return self
     ret = self.set_pump(enable)
-    if sleep is None:
-      sleep = UARM_DEFAULT_PUMP_SLEEP[enable]
-    time.sleep(sleep)
+    if confirm:
+      self._confirm_tool(
+        'pump', enable, self.get_pump_status,
+        UARM_CONFIRM_PUMP_STATES[enable], timeout,
+        settled=UARM_CONFIRM_PUMP_SETTLED[enable],
+        settle_time=UARM_CONFIRM_PUMP_SETTLE)
+    if sleep:
+      time.sleep(sleep)
     return self
 
-  def grip(self, enable=False, sleep=None):
+  def grip(self, enable=False, sleep=None, confirm=None, timeout=None):
     """
     Turn on all the connected uArm's stepper motors
     :param enable: If True the gripper turns on, else if False the gripper turns off
-    :param sleep: (optional) number of seconds to wait after the sending the command, default is 2 seconds
+    :param sleep: (optional) number of seconds to wait after the sending the command, default is 2 seconds, or 0 when confirming
+    :param confirm: (optional) If True wait until the uArm reports the gripper caught (on) or stopped (off), or stopped once a closing gripper has settled, default is set by confirm_actuation()
+    :param timeout: (optional) most seconds to wait for confirmation, default is 3 seconds
     :return: self
     """
     logger.debug('grip: {0}'.format(enable))
-    if self.hardware_settings['mode'] != 'pen_gripper':
+    if self._hardware_settings['mode'] != 'pen_gripper':
       raise RuntimeError(
         'Must be in \"pen_gripper\" to user gripper')
+    if confirm is None:
+      confirm = self._confirm_actuation
+    if timeout is None:
+      timeout = UARM_CONFIRM_GRIP_TIMEOUT[enable]
+    if sleep is None:
+      sleep = 0 if confirm else UARM_DEFAULT_GRIP_SLEEP[enable]
     if self.is_simulating():
+      if confirm: # nothing to confirm, assume the usual time
+        sleep += UARM_DEFAULT_GRIP_SLEEP[enable]
+      self._sim_clock.advance(sleep, 'grip')
       return self
     ret = self.set_gripper(enable)
-    if sleep is None:
-      sleep = UARM_DEFAULT_GRIP_SLEEP[enable]
-    time.sleep(sleep)
+    if confirm:
+      self._confirm_tool(
+        'grip', enable, self.get_gripper_catch,
+        UARM_CONFIRM_GRIP_STATES[enable], timeout,
+        settled=UARM_CONFIRM_GRIP_SETTLED[enable],
+        settle_time=UARM_CONFIRM_GRIP_SETTLE)
+    if sleep:
+      time.sleep(sleep)
     return self
 
   def is_gripping(self):
@@ -832,7 +1407,7 @@ class SwiftAPIWrapper(SwiftAPI):
     :return: True if the switch is pressed, else False
     """
     logger.debug('is_pressing')
-    if self.hardware_settings['mode'] != 'general':
+    if self._hardware_settings['mode'] != 'general':
       raise RuntimeError(
         'Must be in \"general\" mode to test if pressing something')
     if self.is_simulating():
@@ -861,6 +1436,8 @@ class SwiftAPIWrapper(SwiftAPI):
     if self.is_simulating():
       self.move_to(translate=False, **UARM_HOME_SIMULATE_POS)
     else:
+      if self._skip_monitor:
+        self._skip_monitor.lose_track()
       for m_id in UARM_HOME_ORDER:
         self.set_servo_angle(
           servo_id=m_id, angle=UARM_HOME_ANGLE[m_id], wait=True)
@@ -895,9 +1472,9 @@ class SwiftAPIWrapper(SwiftAPI):
     Home the connected uArm device, and then disable all motors
     :return: self
     """
-    if self.hardware_settings['mode'] == 'general':
+    if self._hardware_settings['mode'] == 'general':
       self.pump(False, sleep=0)
-    elif self.hardware_settings['mode'] == 'pen_gripper':
+    elif self._hardware_settings['mode'] == 'pen_gripper':
       self.grip(False, sleep=0)
     self.home().disable_all_motors()
 
@@ -958,3 +1535,248 @@ class SwiftAPIWrapper(SwiftAPI):
   def process_recording(self, name, filter=False, max_angle=None):
     self._recorder.process(name, filter=filter, max_angle=max_angle)
     return self
+
+  '''
+  PROGRAMS
+  '''
+
+  def _program_start(self, absolute=False):
+    # everything a compiled program depends on
+    return {
+      'mode': self._hardware_settings['mode'],
+      'z_offset': self._hardware_settings['z_offset'],
+      'wrist_offset': self._hardware_settings['wrist_offset'],
+      'position': None if absolute else self._pos.copy(),
+      'wrist_angle': self._wrist_angle,
+      'speed': self._speed,
+      'acceleration': self._acceleration,
+      'pushed': [list(p) for p in zip(
+        self._pushed_speed, self._pushed_acceleration)],
+      'linear': self._linear_tolerance,
+      'arc': self._arc_planner.tolerance
+    }
+
+  def compile_program(self, program, **params):
+    """
+    Compile a Program for the current state of this uArm, into a flat list of commands
+    Speeds, offsets and segments are calculated once, and state changes that change nothing are removed
+    Compiled programs are cached, so compiling the same program again with the same parameters is a lookup
+    A program whose first move is a move_to() with every axis does not depend on the current position, so that
+    first move is always a single command, which arches (see QUIRKS.md) even when linear() is enabled
+    :param program: instance of Program
+    :param params: values of the program's Params
+    :return: instance of CompiledProgram
+    """
+    start = self._program_start(absolute=program.absolute)
+    key = (
+      program.key,
+      json.dumps(params, sort_keys=True),
+      json.dumps(start, sort_keys=True))
+    compiled = self._program_cache.get(key)
+    if compiled is not None:
+      self._program_cache_stats['hits'] += 1
+      self._program_cache.move_to_end(key)
+      return compiled
+    self._program_cache_stats['misses'] += 1
+    compiled = self._compile_program(program, params, start)
+    self._program_cache[key] = compiled
+    while len(self._program_cache) > UARM_PROGRAM_CACHE_SIZE:
+      self._program_cache.popitem(last=False)
+    return compiled
+
+  def _compile_program(self, program, params, start):
+    logger.debug('compile_program: {0}'.format(program.name))
+    z_offset = start['z_offset']
+    pos = self._pos.copy()
+    wrist = start['wrist_angle']
+    speed = start['speed']
+    acceleration = start['acceleration']
+    device_acceleration = acceleration
+    pushed = [list(p) for p in start['pushed']]
+    tools = {} # last pump/grip state sent by this program
+    known_position = not program.absolute
+    moving = False
+    ops = []
+    duration = 0.0
+    for call, kwargs in program.steps:
+      kwargs = {k: PROGRAM.resolve(v, params) for k, v in kwargs.items()}
+      if call in ('move_to', 'move_relative', 'arc_to', 'circle'):
+        new_pos = pos.copy()
+        for axis in ('x', 'y', 'z'):
+          value = kwargs.get(axis)
+          if value is None:
+            continue
+          new_pos[axis] = value + pos[axis] if call == 'move_relative' else value
+        new_pos = round_position(new_pos)
+        if call in ('move_to', 'move_relative') and known_position and new_pos == pos:
+          continue
+        real_start = [pos['x'], pos['y'], pos['z'] - z_offset]
+        target = [new_pos['x'], new_pos['y'], new_pos['z'] - z_offset]
+        min_length = segment_length(speed, acceleration)
+        if call in ('arc_to', 'circle'):
+          if kwargs['center_x'] is None and kwargs['center_y'] is None:
+            raise ValueError('An arc needs a center_x or center_y')
+          center = [
+            pos['x'] if kwargs['center_x'] is None else kwargs['center_x'],
+            pos['y'] if kwargs['center_y'] is None else kwargs['center_y']]
+          turns = kwargs['turns'] - 1 if call == 'circle' else kwargs['turns']
+          if call == 'circle' and kwargs['turns'] < 1:
+            raise ValueError(
+              'A circle needs at least 1 turn, not {0}'.format(kwargs['turns']))
+          points = self._arc_planner.segments(
+            real_start, target, center, clockwise=kwargs['clockwise'],
+            turns=int(turns), min_length=min_length,
+            tolerance=kwargs['tolerance'])
+        elif start['linear'] is not None and known_position:
+          points = self.linear_planner.segments(
+            real_start, target, min_length=min_length)
+        else:
+          points = [target]
+        if acceleration != device_acceleration:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_CMD, PROTOCOL.SET_ACC.format(acceleration)))
+          device_acceleration = acceleration
+        for point in points:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_MOVE, point[0], point[1], point[2], speed * 60))
+        duration += move_duration(
+          path_length(real_start, points), speed,
+          acceleration * UARM_TIMING_ACCELERATION_FACTOR)
+        pos = new_pos
+        known_position = True
+        moving = True
+      elif call in ('rotate_to', 'rotate_relative'):
+        angle = kwargs['angle'] + (wrist if call == 'rotate_relative' else 0)
+        angle = min(max(angle, UARM_MIN_WRIST_ANGLE), UARM_MAX_WRIST_ANGLE)
+        if kwargs['wait'] and moving:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_WAIT,))
+          moving = False
+        if angle == wrist:
+          continue
+        ops.append((PROGRAM.UARM_PROGRAM_OP_WRIST, angle + start['wrist_offset']))
+        sleep = kwargs['sleep']
+        if sleep is None:
+          sleep = UARM_DEFAULT_WRIST_SLEEP
+        if sleep:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_SLEEP, sleep))
+          duration += sleep
+        wrist = angle
+      elif call in ('pump', 'grip'):
+        tool_mode = 'general' if call == 'pump' else 'pen_gripper'
+        if start['mode'] != tool_mode:
+          raise RuntimeError(
+            'Must be in \"{0}\" to use {1}'.format(tool_mode, call))
+        enable = bool(kwargs['enable'])
+        if tools.get(call) == enable:
+          continue
+        tools[call] = enable
+        if call == 'pump':
+          ops.append((PROGRAM.UARM_PROGRAM_OP_CMD, PROTOCOL.SET_PUMP.format(int(enable))))
+          default_sleep = UARM_DEFAULT_PUMP_SLEEP[enable]
+        else:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_CMD, PROTOCOL.SET_GRIPPER.format(int(enable))))
+          default_sleep = UARM_DEFAULT_GRIP_SLEEP[enable]
+        sleep = default_sleep if kwargs['sleep'] is None else kwargs['sleep']
+        if sleep:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_SLEEP, sleep))
+          duration += sleep
+      elif call == 'speed':
+        value = UARM_DEFAULT_SPEED if kwargs['speed'] is None else kwargs['speed']
+        speed = min(max(value, UARM_MIN_SPEED), UARM_MAX_SPEED)
+      elif call == 'acceleration':
+        value = kwargs['acceleration']
+        if value is None:
+          value = UARM_DEFAULT_ACCELERATION
+        acceleration = min(max(value, UARM_MIN_ACCELERATION), UARM_MAX_ACCELERATION)
+      elif call == 'push_settings':
+        pushed.append([float(speed), float(acceleration)])
+      elif call == 'pop_settings':
+        if not pushed:
+          raise RuntimeError('Cannot "pop" settings when none have been "pushed"')
+        speed, acceleration = pushed.pop()
+      elif call == 'wait_for_arrival':
+        if moving:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_WAIT,))
+          moving = False
+      elif call == 'dwell':
+        if kwargs['seconds'] > 0:
+          ops.append((PROGRAM.UARM_PROGRAM_OP_SLEEP, kwargs['seconds']))
+          duration += kwargs['seconds']
+    if acceleration != device_acceleration:
+      ops.append((PROGRAM.UARM_PROGRAM_OP_CMD, PROTOCOL.SET_ACC.format(acceleration)))
+    state = {
+      # a program without moves leaves the position where it was
+      'position': pos if known_position else None,
+      'wrist_angle': wrist,
+      'speed': speed,
+      'acceleration': acceleration,
+      'pushed': pushed
+    }
+    return CompiledProgram(
+      ops, start, state, duration=duration, name=program.name)
+
+  def run_program(self, program, wait=True, **params):
+    """
+    Run a Program, or a CompiledProgram, streaming its commands without waiting for each other
+    :param program: instance of Program, compiled with compile_program() first, or of CompiledProgram
+    :param wait: If True, wait for the uArm to arrive at the end of the program
+    :param params: values of the program's Params
+    :return: self
+    """
+    if not self._enabled:
+      self.enable_all_motors()
+    if isinstance(program, CompiledProgram):
+      compiled = program
+      absolute = compiled.start['position'] is None
+      if compiled.start != self._program_start(absolute=absolute):
+        raise RuntimeError(
+          'Program was compiled for another state of the uArm, compile it again')
+    else:
+      compiled = self.compile_program(program, **params)
+    logger.debug('run_program: {0}'.format(compiled.name))
+    if self.is_simulating():
+      self._sim_clock.advance(compiled.duration, 'run_program')
+    else:
+      if self._skip_monitor:
+        self._skip_monitor.check()
+      for op in compiled.ops:
+        kind = op[0]
+        if kind == PROGRAM.UARM_PROGRAM_OP_MOVE:
+          self.set_position(x=op[1], y=op[2], z=op[3], speed=op[4], relative=False)
+          if self._skip_monitor:
+            self._skip_monitor.expect(op[1:4])
+        elif kind == PROGRAM.UARM_PROGRAM_OP_CMD:
+          self.send_cmd_async(op[1])
+        elif kind == PROGRAM.UARM_PROGRAM_OP_WRIST:
+          self.set_wrist(angle=op[1])
+        elif kind == PROGRAM.UARM_PROGRAM_OP_WAIT:
+          if self.flush_cmd(wait_stop=True) != PROTOCOL.OK:
+            raise TimeoutError('Unable to arrive while running program')
+          self._live_position_changed()
+          if self._skip_monitor:
+            self._skip_monitor.arrived().check()
+        elif kind == PROGRAM.UARM_PROGRAM_OP_SLEEP:
+          self.flush_cmd()
+          time.sleep(op[1])
+    state = compiled.state
+    if state['position'] is not None:
+      self._pos = dict(state['position'])
+    self._wrist_angle = state['wrist_angle']
+    self._speed = state['speed']
+    self._acceleration = state['acceleration']
+    self._pushed_speed = [p[0] for p in state['pushed']]
+    self._pushed_acceleration = [p[1] for p in state['pushed']]
+    if wait:
+      self.wait_for_arrival()
+    return self
+
+  @property
+  def program_cache_info(self):
+    """
+    Get the statistics of the compiled program cache
+    :return: Dictionary with "hits", "misses", "size" and "max_size"
+    """
+    info = dict(self._program_cache_stats)
+    info.update({
+      'size': len(self._program_cache),
+      'max_size': UARM_PROGRAM_CACHE_SIZE
+    })
+    return info